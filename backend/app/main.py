@@ -1,10 +1,11 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import os
-import tempfile
 import uuid
 from pathlib import Path
 import sys
+from typing import Optional
 from redis import Redis
 from rq import Queue
 from pydantic import BaseModel
@@ -15,7 +16,15 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
-from worker.s3_client import get_transcription_from_s3
+from worker.admission import admit, estimate_audio_seconds, untrack
+from worker.config import PITCH_ESTIMATOR_NAMES, QUANTIZE_GRID_NAMES
+from worker.metrics import collect_metrics, to_prometheus
+from worker.profiling import recent_profiles, should_profile
+from worker.queues import get_queues
+from worker.retry import get_job_retry, on_job_failure
+from worker.s3_client import get_profile_prefix, get_transcription_from_s3, list_objects_in_s3
+from worker.scores import get_measure_range
+from worker.spool import SpoolFullError, get_spool
 
 from app.database import init_db, get_db, engine
 from app.models import Song
@@ -42,10 +51,16 @@ app.add_middleware(
 # Redis / RQ setup
 redis_conn = Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
 audio_q = Queue("audio", connection=redis_conn)
+# Re-render jobs only rebuild outputs from a stored note table; kept apart so they never wait behind analysis
+render_q = Queue("render", connection=redis_conn)
+# Job results are small artifact descriptors; this only bounds how long Redis keeps them
+RESULT_TTL = int(os.getenv("RQ_RESULT_TTL", "86400"))
 
-# Temporary file storage for local testing
-TEMP_UPLOAD_DIR = Path(tempfile.gettempdir()) / "audiogen_uploads"
-TEMP_UPLOAD_DIR.mkdir(exist_ok=True)
+# Queues reported by the metrics endpoints (RQ_QUEUES, same as the workers)
+metrics_queues = get_queues(redis_conn)
+
+# Uploads are spooled locally (quota + TTL + LRU, see worker/spool.py) and pinned until their job finishes
+spool = get_spool()
 
 
 @app.get("/health")
@@ -53,6 +68,29 @@ def health():
     return {"ok": True, "service": "audiogen-backend", "env": os.getenv("ENV", "development")}
 
 
+@app.get("/api/v1/spool")
+def spool_usage():
+    """Upload spool usage on this API node"""
+    return spool.usage()
+
+
+@app.get("/api/v1/metrics")
+def queue_metrics(window: int = 5):
+    """Queue depth, oldest job age, throughput and processing time for autoscaling.
+
+    Rates are averaged over the last `window` minutes.
+    """
+    if not 1 <= window <= 60:
+        raise HTTPException(status_code=400, detail="window must be between 1 and 60 minutes")
+    return collect_metrics(redis_conn, metrics_queues, window_minutes=window)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """The same metrics in Prometheus text format, for scraping"""
+    return to_prometheus(collect_metrics(redis_conn, metrics_queues))
+
+
 @app.get("/api/hello")
 def hello():
     return {"message": "Hello from FastAPI"}
@@ -61,10 +99,36 @@ class AudioJobRequest(BaseModel):
     audio_path: str
 
 
+class RenderRequest(BaseModel):
+    grid: Optional[str] = None
+    swing: Optional[float] = None
+
+
+def validate_job_options(pitch_estimator: Optional[str] = None, grid: Optional[str] = None,
+                         swing: Optional[float] = None):
+    """Reject unknown pitch estimators and grids, and swing outside [0, 1), with 400"""
+    if pitch_estimator is not None and pitch_estimator not in PITCH_ESTIMATOR_NAMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown pitchEstimator '{pitch_estimator}'. Available: {', '.join(PITCH_ESTIMATOR_NAMES)}"
+        )
+    if grid is not None and grid not in QUANTIZE_GRID_NAMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown grid '{grid}'. Available: {', '.join(QUANTIZE_GRID_NAMES)}"
+        )
+    if swing is not None and not 0 <= swing < 1:
+        raise HTTPException(status_code=400, detail="swing must be >= 0 and < 1")
+
+
 @app.post("/api/v1/jobs")
 async def create_job(
     file: UploadFile = File(...), 
     songName: str = Form(...),
+    pitchEstimator: Optional[str] = Form(None),
+    grid: Optional[str] = Form(None),
+    swing: Optional[float] = Form(None),
+    profile: Optional[bool] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Upload audio file and create processing job"""
@@ -78,9 +142,14 @@ async def create_job(
             status_code=400,
             detail=f"Invalid file format. Allowed: {', '.join(allowed_extensions)}"
         )
+    validate_job_options(pitchEstimator, grid, swing)
     # Save uploaded file to temporary directory
     file_id = str(uuid.uuid4())
-    file_path = TEMP_UPLOAD_DIR / f"{file_id}{file_ext}"
+    file_path = spool.path(f"{file_id}{file_ext}")
+    job_id = str(uuid.uuid4())
+    # Admission meta, released if the job is never enqueued
+    meta = None
+    job = None
     try:
         # Read and save file
         contents = await file.read()
@@ -89,8 +158,22 @@ async def create_job(
         max_size = 30 * 1024 * 1024  # 30MB
         if file_size > max_size:
             raise HTTPException(status_code=400, detail="File too large. Maximum size: 30MB")
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        # Admission control: refuse uploads while their size class is backed up (ADMISSION_MAX_QUEUED);
+        # admitted jobs are counted against their class until a worker starts them
+        audio_seconds = estimate_audio_seconds(contents, file_ext)
+        admission = admit(redis_conn, audio_q.name, job_id, audio_seconds)
+        meta = admission["meta"]
+        if not admission["admitted"]:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many {admission['duration_class']} uploads queued "
+                       f"({admission['depth']}/{admission['limit']}); try again later",
+                headers={"Retry-After": str(admission["retry_after"])}
+            )
+        try:
+            spool.write(file_path.name, contents, pin=True)
+        except SpoolFullError as e:
+            raise HTTPException(status_code=507, detail=f"Upload spool is full: {str(e)}")
         # Save song details to database first
         song = Song(
             name=songName,
@@ -100,13 +183,25 @@ async def create_job(
         db.commit()
         db.refresh(song)
 
+        # Profiled on request, otherwise sampled at PROFILE_SAMPLE_PERCENT
+        profiled = should_profile(profile)
         # Enqueue job with file path, song name, and song_id
         job = audio_q.enqueue(
             "worker.tasks.audio_to_musicxml",
             str(file_path),
             songName,
             str(song.id),
-            job_timeout=3600
+            pitch_estimator=pitchEstimator,
+            grid=grid,
+            swing=swing,
+            profile=profiled,
+            job_id=job_id,
+            meta=meta,
+            job_timeout=3600,
+            result_ttl=RESULT_TTL,
+            # Transient failures retry with backoff and resume from checkpoints
+            retry=get_job_retry(),
+            on_failure=on_job_failure
         )
         print(f"Job enqueued")
         # Update song with job_id
@@ -116,19 +211,24 @@ async def create_job(
         return {
             "id": job.get_id(),
             "status": "queued",
-            "estimated_seconds": 60,
-            "song_id": str(song.id)
+            # Queued audio ahead shared by the workers, then this file, at the workers' recent rate
+            "estimated_seconds": admission["estimated_seconds"],
+            "duration_class": admission["duration_class"],
+            "song_id": str(song.id),
+            "profiled": profiled
         }
     
     except HTTPException:
         # Clean up file on validation error
-        if file_path.exists():
-            file_path.unlink()
+        spool.release(file_path)
+        if job is None and meta:
+            untrack(redis_conn, meta)
         raise
     except Exception as e:
         # Clean up file on error
-        if file_path.exists():
-            file_path.unlink()
+        spool.release(file_path)
+        if job is None and meta:
+            untrack(redis_conn, meta)
         raise HTTPException(status_code=500, detail=f"Error processing upload: {str(e)}")
 
 
@@ -140,29 +240,47 @@ def get_job(job_id: str, db: Session = Depends(get_db)):
     try:
         job = Job.fetch(job_id, connection=redis_conn)
         status = job.get_status()
+        publish = job.meta.get("publish")
+        if status == "finished" and publish == "pending":
+            # Analysis is done; worker.publisher is still uploading and updating the song
+            status = "started"
+        elif status == "finished" and publish == "failed":
+            status = "failed"
         
         response = {
             "id": job_id,
             "status": status,
-            "progress": 0
+            "progress": 0,
+            # RQ lifecycle timestamps (UTC) so clients can split queue wait from processing time
+            "enqueued_at": job.enqueued_at.isoformat() if job.enqueued_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "ended_at": job.ended_at.isoformat() if job.ended_at else None,
         }
+        if publish == "pending":
+            response["stage"] = "publishing"
+            response["progress"] = 90
         
-        # Look up song by job_id to get transcription_url
+        # Look up song by job_id to get transcription_url; re-render jobs name their song in meta
         song = db.query(Song).filter(Song.job_id == job_id).first()
+        if song is None and job.meta.get("song_id"):
+            song = db.query(Song).filter(Song.id == uuid.UUID(job.meta["song_id"])).first()
         
         if status == "finished":
-            response["result"] = job.result
+            # Metadata only; content is fetched from /api/v1/tracks/{song_id} or the artifact URL
+            result = job.result
+            response["result"] = result if isinstance(result, dict) else None
             response["progress"] = 100
+            response["song_id"] = str(song.id) if song else None
             # Return MusicXML transcription URL from songs table
             transcription_url = song.transcription_url if song else None
-            response["artifacts"] = {
-                "musicxml": {
-                    "type": "musicxml",
-                    "url": transcription_url,  # S3/MinIO URL for the transcription
-                }
-            }
+            response["artifacts"] = dict(response["result"]["artifacts"]) if response["result"] else {}
+            response["artifacts"]["musicxml"] = dict(
+                response["artifacts"].get("musicxml", {}),
+                type="musicxml",
+                url=transcription_url,  # S3/MinIO URL for the transcription
+            )
         elif status == "failed":
-            response["error"] = str(job.exc_info) if job.exc_info else "Unknown error"
+            response["error"] = job.meta.get("publish_error") or (str(job.exc_info) if job.exc_info else "Unknown error")
         
         return response
     
@@ -181,22 +299,103 @@ def all_tracks(db: Session = Depends(get_db)):
     return [{"id": song.id, "name": song.name} for song in songs]
 
 
-@app.get("/api/v1/tracks/{track_id}")
-def get_track(track_id: str, db: Session = Depends(get_db)):
-    song = db.query(Song).filter(Song.id == track_id).first()
+def get_song_or_404(db: Session, track_id: str) -> Song:
+    """The track's song row; unknown and malformed ids are both 404s"""
+    try:
+        song_id = uuid.UUID(track_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Track not found")
+    song = db.query(Song).filter(Song.id == song_id).first()
     if not song:
         raise HTTPException(status_code=404, detail="Track not found")
-    transcription_text = None
-    try:
-        transcription_text = get_transcription_from_s3(song.id, song.name)
-    except Exception as exc:
-        raise HTTPException(status_code=502, detail=f"Failed to fetch transcription: {str(exc)}")
+    return song
 
-    return {
+
+@app.get("/api/v1/tracks/{track_id}")
+def get_track(track_id: str, transcription: bool = False, db: Session = Depends(get_db)):
+    """Track metadata; the whole score only with ?transcription=true (pages come from /measures)"""
+    song = get_song_or_404(db, track_id)
+    track = {
         "id": str(song.id),
         "name": song.name,
         "job_id": song.job_id,
-        "transcription": transcription_text,
+        "transcription_url": song.transcription_url,
         "created_at": song.created_at.isoformat() if song.created_at else None,
         "updated_at": song.updated_at.isoformat() if song.updated_at else None,
+    }
+    if transcription:
+        try:
+            track["transcription"] = get_transcription_from_s3(song.id, song.name)
+        except Exception as exc:
+            raise HTTPException(status_code=502, detail=f"Failed to fetch transcription: {str(exc)}")
+    return track
+
+
+@app.get("/api/v1/tracks/{track_id}/measures")
+def get_track_measures(track_id: str, start: int = 1, count: int = 16, db: Session = Depends(get_db)):
+    """A range of measures of a track's score as standalone MusicXML.
+
+    Served from ranged reads of the stored score, so the first page of a long
+    song costs the same as the first page of a short one.
+    """
+    if start < 1 or not 1 <= count <= 256:
+        raise HTTPException(status_code=400, detail="start must be >= 1 and count between 1 and 256")
+    song = get_song_or_404(db, track_id)
+    try:
+        excerpt = get_measure_range(str(song.id), song.name, start=start, count=count)
+    except ValueError as exc:
+        raise HTTPException(status_code=416, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"Failed to fetch transcription: {str(exc)}")
+    if excerpt is None:
+        raise HTTPException(status_code=404, detail="Track has no transcription yet")
+    return {"id": str(song.id), "name": song.name, **excerpt}
+
+
+@app.get("/api/v1/tracks/{track_id}/profiles")
+def list_track_profiles(track_id: str, db: Session = Depends(get_db)):
+    """Profiles of a track's profiled jobs, oldest first (see worker/profiling.py)"""
+    song = get_song_or_404(db, track_id)
+    try:
+        objects = list_objects_in_s3(get_profile_prefix(str(song.id)))
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"Failed to list profiles: {str(exc)}")
+    profiles = {}
+    for obj in objects:
+        profile_id, _, suffix = obj["key"].rsplit("/", 1)[-1].rpartition(".")
+        entry = profiles.setdefault(profile_id, {"profile_id": profile_id, "last_modified": obj["last_modified"]})
+        entry["summary" if suffix == "txt" else "profile"] = obj
+    return {"id": str(song.id), "name": song.name, "profiles": [profiles[key] for key in sorted(profiles)]}
+
+
+@app.get("/api/v1/profiles")
+def list_recent_profiles(limit: int = 50):
+    """The most recent job profiles across all tracks, newest first"""
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    return {"profiles": recent_profiles(redis_conn, limit)}
+
+
+@app.post("/api/v1/tracks/{track_id}/render")
+def render_track(track_id: str, request: RenderRequest, db: Session = Depends(get_db)):
+    """Re-render a track's outputs from its stored note table (no audio analysis)"""
+    song = get_song_or_404(db, track_id)
+    validate_job_options(grid=request.grid, swing=request.swing)
+
+    job = render_q.enqueue(
+        "worker.tasks.rerender_musicxml",
+        song.name,
+        str(song.id),
+        grid=request.grid,
+        swing=request.swing,
+        job_timeout=60,
+        result_ttl=RESULT_TTL,
+        # Songs keep their analysis job id; /api/v1/jobs/{id} finds the song through meta
+        meta={"song_id": str(song.id)}
+    )
+    return {
+        "id": job.get_id(),
+        "status": "queued",
+        "estimated_seconds": 1,
+        "song_id": str(song.id)
     }
\ No newline at end of file
@@ -1,5 +1,4 @@
-from sqlalchemy import Column, String, DateTime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Uuid
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 import uuid
@@ -10,7 +9,8 @@ Base = declarative_base()
 class Song(Base):
     __tablename__ = "songs"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Generic Uuid: native UUID on Postgres, CHAR(32) on SQLite (used by load_test.py)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False)  # Song name provided by user
     job_id = Column(String(100), nullable=True, unique=True)  # RQ job ID for tracking
     transcription_url = Column(String(512), nullable=True)  # URL/path to transcription file in MinIO
@@ -1,4 +1,4 @@
-import { Song } from "../types";
+import { MeasureRange, Song } from "../types";
 
 const fetchAllTracks = async (): Promise<{ id: string; name: string }[]> => {
   const response = await fetch(
@@ -21,4 +21,21 @@ const fetchTrackById = async (id: string): Promise<Song> => {
   return data as Song;
 };
 
-export { fetchAllTracks, fetchTrackById };
+const fetchTrackMeasures = async (
+  id: string,
+  start = 1,
+  count = 16
+): Promise<MeasureRange> => {
+  const response = await fetch(
+    `${import.meta.env.VITE_API_URL}/api/v1/tracks/${id}/measures?start=${start}&count=${count}`
+  );
+
+  if (!response.ok) {
+    throw new Error(`Failed to fetch measures ${start}+${count} of track ${id}`);
+  }
+
+  const data = await response.json();
+  return data as MeasureRange;
+};
+
+export { fetchAllTracks, fetchTrackById, fetchTrackMeasures };
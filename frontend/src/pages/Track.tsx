@@ -2,9 +2,8 @@ import { useEffect, useMemo, useRef, useState } from "react";
 import { useParams } from "react-router-dom";
 import { OpenSheetMusicDisplay } from "opensheetmusicdisplay";
 import * as Tone from "tone";
-import { fetchTrackById } from "../api/songs";
-import { Song } from "../types";
-import { defaultMusicXml } from "./constants";
+import { fetchTrackById, fetchTrackMeasures } from "../api/songs";
+import { MeasureRange, Song } from "../types";
 // Import sample files
 import kickSample from "../instruments/kick.mp3";
 import snareSample from "../instruments/snare.mp3";
@@ -13,6 +12,9 @@ import hihatOpenSample from "../instruments/hihatopen.mp3";
 import crashSample from "../instruments/crash.mp3";
 import rideSample from "../instruments/ride.mp3";
 
+// Measures fetched per page (GET /api/v1/tracks/{id}/measures)
+const MEASURES_PER_PAGE = 16;
+
 type PlaybackEvent = {
   startSeconds: number;
   durationSeconds: number;
@@ -167,6 +169,8 @@ const Track = () => {
   const { id } = useParams();
   const [track, setTrack] = useState<Song | null>(null);
   const [musicXml, setMusicXml] = useState<string | null>(null);
+  const [measureRange, setMeasureRange] = useState<MeasureRange | null>(null);
+  const [loadingMeasures, setLoadingMeasures] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
   const [renderError, setRenderError] = useState<string | null>(null);
   const [loading, setLoading] = useState<boolean>(false);
@@ -237,28 +241,66 @@ const Track = () => {
       setLoading(true);
       setError(null);
       setMusicXml(null);
+      setMeasureRange(null);
       setRenderError(null);
 
-      try {
-        const data = await fetchTrackById(id);
-        setTrack(data);
-        setMusicXml(defaultMusicXml);
-        // setMusicXml(data.transcription ?? null);
-      } catch (err) {
+      // Metadata and the first page of the score in parallel; later pages are fetched on demand
+      const [trackResult, pageResult] = await Promise.allSettled([
+        fetchTrackById(id),
+        fetchTrackMeasures(id, 1, MEASURES_PER_PAGE),
+      ]);
+
+      if (trackResult.status === "fulfilled") {
+        setTrack(trackResult.value);
+      } else {
+        const err = trackResult.reason;
         console.error(err);
         if (err instanceof Error) {
           setError(err.message);
         } else {
           setError("An unexpected error occurred while loading the track.");
         }
-      } finally {
-        setLoading(false);
       }
+
+      if (pageResult.status === "fulfilled") {
+        setMeasureRange(pageResult.value);
+        setMusicXml(pageResult.value.musicxml);
+      } else {
+        // No transcription yet
+        console.error(pageResult.reason);
+      }
+      setLoading(false);
     };
 
     loadTrack();
   }, [id]);
 
+  const loadMeasures = async (start: number) => {
+    if (!id) {
+      return;
+    }
+
+    setLoadingMeasures(true);
+    setError(null);
+    try {
+      const page = await fetchTrackMeasures(id, start, MEASURES_PER_PAGE);
+      Tone.Transport.stop();
+      Tone.Transport.seconds = 0;
+      setPlaybackState("stopped");
+      setMeasureRange(page);
+      setMusicXml(page.musicxml);
+    } catch (err) {
+      console.error(err);
+      if (err instanceof Error) {
+        setError(err.message);
+      } else {
+        setError("An unexpected error occurred while loading the measures.");
+      }
+    } finally {
+      setLoadingMeasures(false);
+    }
+  };
+
   useEffect(() => {
     const osmd = osmdRef.current;
 
@@ -448,6 +490,32 @@ const Track = () => {
           </button>
           <div className="text-sm text-slate-600">Tempo: {tempo} BPM</div>
         </div>
+        {measureRange && (
+          <div className="mt-2 flex items-center gap-2">
+            <button
+              className="rounded bg-slate-200 px-3 py-1 disabled:opacity-50"
+              onClick={() =>
+                loadMeasures(Math.max(1, measureRange.start - MEASURES_PER_PAGE))
+              }
+              disabled={loadingMeasures || measureRange.start <= 1}
+            >
+              Previous
+            </button>
+            <button
+              className="rounded bg-slate-200 px-3 py-1 disabled:opacity-50"
+              onClick={() => loadMeasures(measureRange.end + 1)}
+              disabled={
+                loadingMeasures || measureRange.end >= measureRange.measures
+              }
+            >
+              Next
+            </button>
+            <div className="text-sm text-slate-600">
+              Measures {measureRange.start}–{measureRange.end} of{" "}
+              {measureRange.measures}
+            </div>
+          </div>
+        )}
         {!musicXml && !loading && (
           <p>Transcription is not available yet for this track.</p>
         )}
@@ -8,4 +8,13 @@ type Song = {
   updated_at: string;
 };
 
-export type { Song };
+type MeasureRange = {
+  id: string;
+  name: string;
+  measures: number;
+  start: number;
+  end: number;
+  musicxml: string;
+};
+
+export type { MeasureRange, Song };
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the upload -> queue -> status flow.
+
+Submits uploads at a fixed (Poisson) arrival rate, polls every job until it
+reaches a terminal state and reports upload latency, queue wait, processing
+time and end-to-end latency percentiles.
+
+By default it targets an already running stack. With --spawn-stack it starts
+the real FastAPI app and RQ workers itself, backed by local stand-ins:
+
+    Postgres -> SQLite file in a temp directory
+    Redis    -> redis-server on a free port, or --redis-url (e.g. the compose container)
+    MinIO    -> moto S3 server
+
+Usage:
+    python load_test.py <audio_file> [options]
+
+Examples:
+    # 2 uploads/s for 50 jobs against a stack on localhost:4000
+    python load_test.py sample.mp3 --rate 2 --count 50
+
+    # Throughput curve for 1, 2 and 4 workers on a self-contained stack
+    python load_test.py sample.mp3 --spawn-stack --workers 1,2,4 \\
+        --rate 4 --count 40 --report load_report.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+TERMINAL_STATUSES = {"finished", "failed", "stopped", "canceled"}
+
+
+def percentile(values: list, q: float):
+    """Linear-interpolated percentile (q in [0, 100]) of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * q / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: list) -> dict:
+    """Count, mean and p50/p95/p99 of a list of durations in seconds."""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def run_job(base_url: str, file_name: str, payload: bytes, index: int, poll_interval: float, max_wait: float) -> dict:
+    """Upload one file, poll it to completion and return its timing record."""
+    record = {"index": index, "status": "error", "error": None}
+    submitted = time.perf_counter()
+    try:
+        response = requests.post(
+            f"{base_url}/api/v1/jobs",
+            files={"file": (file_name, payload)},
+            data={"songName": f"loadtest-{index}"},
+            timeout=300,
+        )
+        record["upload_latency"] = time.perf_counter() - submitted
+        if response.status_code == 429:
+            # Refused by admission control; not a failure
+            record["status"] = "rejected"
+            record["retry_after"] = response.headers.get("Retry-After")
+            return record
+        response.raise_for_status()
+        job_id = response.json()["id"]
+        record["job_id"] = job_id
+        record["estimated_seconds"] = response.json().get("estimated_seconds")
+    except requests.exceptions.RequestException as e:
+        record["error"] = f"upload failed: {e}"
+        return record
+
+    deadline = submitted + max_wait
+    data = {}
+    while time.perf_counter() < deadline:
+        try:
+            response = requests.get(f"{base_url}/api/v1/jobs/{job_id}", timeout=30)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            record["error"] = f"poll failed: {e}"
+            return record
+        if data.get("status") in TERMINAL_STATUSES:
+            break
+        time.sleep(poll_interval)
+    else:
+        record["status"] = "timeout"
+        return record
+
+    record["end_to_end"] = time.perf_counter() - submitted
+    record["status"] = data["status"]
+    if record.get("estimated_seconds") is not None:
+        # Positive = the job took longer than the API predicted
+        record["eta_error"] = record["end_to_end"] - record["estimated_seconds"]
+    if data["status"] != "finished":
+        record["error"] = data.get("error")
+
+    # Queue wait and processing time come from the RQ timestamps (same clock)
+    enqueued_at = _parse_ts(data.get("enqueued_at"))
+    started_at = _parse_ts(data.get("started_at"))
+    ended_at = _parse_ts(data.get("ended_at"))
+    if enqueued_at and started_at:
+        record["queue_wait"] = (started_at - enqueued_at).total_seconds()
+    if started_at and ended_at:
+        record["processing"] = (ended_at - started_at).total_seconds()
+    return record
+
+
+def run_load(base_url: str, audio_file: Path, rate: float, count: int, concurrency: int,
+             poll_interval: float, max_wait: float, seed: int) -> dict:
+    """Submit `count` jobs with exponential inter-arrival times and collect results."""
+    payload = audio_file.read_bytes()
+    rng = random.Random(seed)
+    records = []
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        next_arrival = started
+        for index in range(count):
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(
+                run_job, base_url, audio_file.name, payload, index, poll_interval, max_wait
+            ))
+            next_arrival += rng.expovariate(rate)
+        for future in futures:
+            records.append(future.result())
+
+    wall = time.perf_counter() - started
+    finished = [r for r in records if r["status"] == "finished"]
+    return {
+        "submitted": count,
+        "finished": len(finished),
+        "failed": sum(1 for r in records if r["status"] not in ("finished", "rejected")),
+        "rejected": sum(1 for r in records if r["status"] == "rejected"),
+        "wall_seconds": wall,
+        "throughput_jobs_per_s": len(finished) / wall if wall > 0 else None,
+        "metrics": {
+            name: summarize([r[name] for r in finished if name in r])
+            for name in ("upload_latency", "queue_wait", "processing", "end_to_end", "eta_error")
+        },
+        "errors": [r["error"] for r in records if r.get("error")][:20],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+class LocalStack:
+    """The real API and workers, wired to SQLite, a local Redis and a moto S3 server."""
+
+    def __init__(self, workdir: Path, redis_url: str = None):
+        self.workdir = workdir
+        self.redis_url = redis_url
+        self.processes = []
+        self.workers = []
+        self._servers = []
+
+    def start(self) -> None:
+        """Start Redis, S3, the API and the publisher; call close() even if this raises."""
+        if not self.redis_url:
+            if not shutil.which("redis-server"):
+                # RQ workers need a real server (CLIENT LIST, blocking pops), so no fakeredis here
+                raise RuntimeError(
+                    "redis-server not found on PATH; install it or pass --redis-url "
+                    "(e.g. docker-compose up -d redis)"
+                )
+            redis_port = _free_port()
+            self.processes.append(subprocess.Popen(
+                ["redis-server", "--port", str(redis_port), "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL,
+            ))
+            self.redis_url = f"redis://127.0.0.1:{redis_port}/0"
+
+        from moto.server import ThreadedMotoServer
+
+        s3_port = _free_port()
+        s3_server = ThreadedMotoServer(ip_address="127.0.0.1", port=s3_port)
+        s3_server.start()
+        self._servers.append(s3_server)
+
+        self.api_port = _free_port()
+        self.env = dict(
+            os.environ,
+            REDIS_URL=self.redis_url,
+            DATABASE_URL=f"sqlite:///{self.workdir / 'loadtest.db'}",
+            S3_ENDPOINT=f"http://127.0.0.1:{s3_port}",
+            S3_ACCESS_KEY="testing",
+            S3_SECRET_KEY="testing",
+            S3_BUCKET="audiogen-artifacts",
+            PYTHONPATH=os.pathsep.join([str(PROJECT_ROOT), str(PROJECT_ROOT / "backend")]),
+        )
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(self.api_port), "--log-level", "warning"],
+            cwd=PROJECT_ROOT / "backend", env=self.env,
+        ))
+        # Finished jobs stay "started" until the publisher has stored their transcription
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "worker.publisher"],
+            cwd=PROJECT_ROOT, env=self.env, stdout=open(self.workdir / "publisher.log", "ab"),
+            stderr=subprocess.STDOUT,
+        ))
+        _wait_for(f"{self.base_url}/health")
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.api_port}"
+
+    def scale_workers(self, count: int) -> None:
+        while len(self.workers) > count:
+            self._stop(self.workers.pop())
+        while len(self.workers) < count:
+            log = open(self.workdir / f"worker-{len(self.workers)}.log", "ab")
+            self.workers.append(subprocess.Popen(
+                [sys.executable, "-m", "worker.worker"],
+                cwd=PROJECT_ROOT, env=self.env, stdout=log, stderr=subprocess.STDOUT,
+            ))
+
+    @staticmethod
+    def _stop(process: subprocess.Popen) -> None:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def close(self) -> None:
+        for process in self.workers + self.processes:
+            self._stop(process)
+        for server in self._servers:
+            if hasattr(server, "shutdown"):
+                server.shutdown()
+            else:
+                server.stop()
+
+
+def environment_info(audio_file: Path) -> dict:
+    """Facts needed to reproduce a report."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "audio_file": audio_file.name,
+        "audio_bytes": audio_file.stat().st_size,
+    }
+
+
+def print_run(run: dict) -> None:
+    label = f"{run['workers']} worker(s)" if run.get("workers") is not None else "external stack"
+    print(f"\n📊 {label}: {run['finished']}/{run['submitted']} finished, "
+          f"{run['failed']} failed, {run.get('rejected', 0)} rejected (429), {run['wall_seconds']:.1f}s wall, "
+          f"{run['throughput_jobs_per_s'] or 0:.2f} jobs/s")
+    print(f"   {'metric':<16}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, stats in run["metrics"].items():
+        cells = "".join(f"{stats[q]:>10.3f}" if stats[q] is not None else f"{'-':>10}" for q in ("p50", "p95", "p99"))
+        print(f"   {name:<16}{cells}")
+    for error in run["errors"][:3]:
+        print(f"   ⚠️  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent upload/queue/status load generator")
+    parser.add_argument("audio_file", help="Audio file to upload for every job")
+    parser.add_argument("--base-url", default="http://localhost:4000", help="API base URL (ignored with --spawn-stack)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Mean arrival rate in uploads per second")
+    parser.add_argument("--count", type=int, default=20, help="Number of uploads per run")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max in-flight client requests")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between status polls")
+    parser.add_argument("--max-wait", type=float, default=600.0, help="Per-job timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the arrival process")
+    parser.add_argument("--spawn-stack", action="store_true", help="Start API and workers with local stand-ins")
+    parser.add_argument("--redis-url", help="Use this Redis instead of spawning redis-server (with --spawn-stack)")
+    parser.add_argument("--workers", default="1", help="Comma-separated worker counts to sweep (with --spawn-stack)")
+    parser.add_argument("--report", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    audio_file = Path(args.audio_file)
+    if not audio_file.exists():
+        print(f"❌ Error: File not found: {audio_file}")
+        sys.exit(1)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "report"},
+        "environment": environment_info(audio_file),
+        "runs": [],
+    }
+
+    load_args = (args.rate, args.count, args.concurrency, args.poll_interval, args.max_wait, args.seed)
+    if args.spawn_stack:
+        workdir = Path(tempfile.mkdtemp(prefix="audiogen_loadtest_"))
+        print(f"🚀 Starting local stack in {workdir}")
+        stack = LocalStack(workdir, redis_url=args.redis_url)
+        try:
+            stack.start()
+            for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+                stack.scale_workers(workers)
+                run = run_load(stack.base_url, audio_file, *load_args)
+                run["workers"] = workers
+                print_run(run)
+                report["runs"].append(run)
+        finally:
+            stack.close()
+    else:
+        run = run_load(args.base_url.rstrip("/"), audio_file, *load_args)
+        run["workers"] = None
+        print_run(run)
+        report["runs"].append(run)
+
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+        print(f"\n📄 Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
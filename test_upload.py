@@ -102,16 +102,13 @@ def display_results(data: dict):
         artifacts = data.get("artifacts", {})
         musicxml = artifacts.get("musicxml", {})
         
-        if musicxml.get("content"):
+        if musicxml.get("url") and data.get("song_id"):
+            # Status responses only carry metadata; the content comes from the track endpoint
+            print(f"\n🔗 MusicXML: {musicxml['url']} ({musicxml.get('size')} bytes)")
+            track = requests.get(f"http://localhost:4000/api/v1/tracks/{data['song_id']}").json()
+            content = track.get("transcription") or ""
             print(f"\n🎵 MusicXML String (first 200 chars):")
-            print(f"   {musicxml['content'][:200]}...")
-            print(f"\n📄 Full MusicXML:")
-            print(musicxml['content'])
-        elif data.get("result"):
-            print(f"\n🎵 MusicXML String (first 200 chars):")
-            print(f"   {data['result'][:200]}...")
-            print(f"\n📄 Full MusicXML:")
-            print(data['result'])
+            print(f"   {content[:200]}...")
         else:
             print("\n⚠️  No MusicXML content found in response")
     else:
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+
+from worker.admission import _class_key, admit, untrack
+
+QUEUE = "audio"
+
+
+def test_rejected_uploads_are_not_counted():
+    connection = fakeredis.FakeRedis()
+    decisions = [admit(connection, QUEUE, f"job-{i}", 30.0, limits={"short": 2}) for i in range(3)]
+
+    assert [decision["admitted"] for decision in decisions] == [True, True, False]
+    assert [decision["depth"] for decision in decisions] == [0, 1, 2]
+    assert decisions[2]["meta"] is None and decisions[2]["retry_after"] >= 1
+    assert connection.zcard(_class_key(QUEUE, "short")) == 2
+
+    # A job that starts (or is never enqueued) frees its slot
+    untrack(connection, decisions[0]["meta"])
+    assert admit(connection, QUEUE, "job-3", 30.0, limits={"short": 2})["admitted"]
+
+
+def test_concurrent_uploads_cannot_overshoot_the_limit():
+    connection = fakeredis.FakeRedis()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        decisions = list(executor.map(
+            lambda i: admit(connection, QUEUE, f"job-{i}", 30.0, limits={"short": 3}), range(20)
+        ))
+    assert sum(decision["admitted"] for decision in decisions) == 3
+    assert connection.zcard(_class_key(QUEUE, "short")) == 3
+
+
+def test_unlimited_classes_are_still_tracked():
+    connection = fakeredis.FakeRedis()
+    decision = admit(connection, QUEUE, "job-0", 30.0, limits={})
+    assert decision["admitted"] and decision["limit"] is None
+    assert connection.zcard(_class_key(QUEUE, "short")) == 1
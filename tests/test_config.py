@@ -0,0 +1,8 @@
+from worker.config import PITCH_ESTIMATOR_NAMES, QUANTIZE_GRID_NAMES
+from worker.pitch import PITCH_ESTIMATORS
+from worker.quantize import GRIDS
+
+
+def test_api_option_names_match_the_registries():
+    assert sorted(PITCH_ESTIMATOR_NAMES) == sorted(PITCH_ESTIMATORS)
+    assert sorted(QUANTIZE_GRID_NAMES) == sorted(GRIDS)
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+soundfile = pytest.importorskip("soundfile")
+
+from worker.decode import decode_audio, probe_audio  # noqa: E402
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample.mp3"
+
+
+def test_probe_reads_the_header():
+    info = probe_audio(str(SAMPLE))
+    assert info["sample_rate"] == 44100 and info["channels"] == 2
+    assert info["duration"] == pytest.approx(10.03, abs=0.01)
+
+
+def test_decode_returns_float32_mono_at_the_target_rate():
+    samples, sample_rate = decode_audio(str(SAMPLE), sample_rate=22050, resample="polyphase")
+    assert sample_rate == 22050
+    assert samples.dtype == np.float32 and samples.ndim == 1
+    assert len(samples) / sample_rate == pytest.approx(probe_audio(str(SAMPLE))["duration"], abs=0.01)
+    assert 0 < np.abs(samples).max() <= 1.0
+
+
+def test_native_rate_decode_is_the_channel_average():
+    samples, sample_rate = decode_audio(str(SAMPLE), sample_rate=None)
+    stereo, native_sr = soundfile.read(str(SAMPLE), dtype="float32", always_2d=True)
+    assert sample_rate == native_sr
+    np.testing.assert_allclose(samples, stereo.mean(axis=1), atol=1e-6)
@@ -0,0 +1,19 @@
+import fakeredis
+from rq import Queue
+
+from worker.metrics import BUCKET_SECONDS, collect_metrics, record_event
+
+
+def test_rates_ignore_the_partial_current_minute():
+    connection = fakeredis.FakeRedis()
+    queue = Queue("audio", connection=connection)
+    minute = 1000 * BUCKET_SECONDS
+    for _ in range(6):
+        record_event(connection, queue.name, "finished", now=minute - 30)
+    # Just after the boundary: one event in the new bucket must not read as 60/minute
+    record_event(connection, queue.name, "finished", now=minute + 1)
+
+    stats = collect_metrics(connection, [queue], window_minutes=1, now=minute + 1)["queues"]["audio"]
+    assert stats["finished_per_minute"] == 6.0
+    stats = collect_metrics(connection, [queue], window_minutes=3, now=minute + 1)["queues"]["audio"]
+    assert stats["finished_per_minute"] == 2.0
@@ -0,0 +1,64 @@
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from worker.musicxml import notes_to_musicxml
+from worker.notetable import NoteTable
+from worker.quantize import get_divisions, quantize_notes
+
+BPM = 120.0
+BEAT = 60.0 / BPM
+
+
+def _render(starts, ends, grid, swing=0.0):
+    starts = np.asarray(starts, dtype=np.float64) * BEAT
+    ends = np.asarray(ends, dtype=np.float64) * BEAT
+    notes = NoteTable(starts, ends, np.full(len(starts), 60), np.full(len(starts), 80))
+    beats = np.arange(64) * BEAT
+    quantized = quantize_notes(notes, beats, BPM, grid=grid, swing=swing)
+    return notes_to_musicxml(quantized, "test", qpm=BPM, grid=grid, swing=swing)
+
+
+def _notes(xml):
+    """(duration, type, triplet, rest) of every note of the first part."""
+    part = ET.fromstring(re.sub(r"<!DOCTYPE[^>]*>", "", xml).split("?>", 1)[1]).find("part")
+    for measure in part.iter("measure"):
+        divisions = part.find("measure/attributes/divisions").text
+        total = sum(int(note.find("duration").text) for note in measure.iter("note") if note.find("chord") is None)
+        assert total == 4 * int(divisions)
+    return [
+        (int(note.find("duration").text), note.find("type").text, note.find("time-modification") is not None,
+         note.find("rest") is not None)
+        for note in part.iter("note")
+    ]
+
+
+@pytest.mark.parametrize("grid, swing, divisions", [
+    ("1/16", 0.0, 4), ("1/32", 0.0, 8), ("1/8", 1 / 3, 6), ("1/16", 0.5, 8), ("1/16", 0.3, 12),
+])
+def test_divisions_follow_the_grid(grid, swing, divisions):
+    assert get_divisions(grid, swing) == divisions
+
+
+def test_thirty_second_grid_is_kept():
+    notes = _notes(_render([0, 0.125, 0.25], [0.125, 0.25, 0.5], "1/32"))
+    assert '<divisions>8</divisions>' in _render([0], [1], "1/32")
+    assert notes[:3] == [(1, "32nd", False, False), (1, "32nd", False, False), (2, "16th", False, False)]
+
+
+def test_triplet_swing_is_notated_as_triplets():
+    # Swung eighth pairs: the off-beat lands two thirds of the way through the beat
+    starts = [0, 2 / 3, 1, 1 + 2 / 3]
+    ends = [2 / 3, 1, 1 + 2 / 3, 2]
+    notes = _notes(_render(starts, ends, "1/8", swing=1 / 3))
+    assert notes[:4] == [
+        (4, "quarter", True, False), (2, "eighth", True, False),
+        (4, "quarter", True, False), (2, "eighth", True, False),
+    ]
+
+
+def test_straight_swing_positions_are_unchanged():
+    notes = _notes(_render([0, 0.5], [0.5, 1], "1/8"))
+    assert notes[:2] == [(1, "eighth", False, False), (1, "eighth", False, False)]
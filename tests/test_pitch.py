@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+librosa = pytest.importorskip("librosa")
+
+from worker.benchmark import FRAME_LENGTH, HOP_LENGTH, agreement  # noqa: E402
+from worker.pitch import track_pitch  # noqa: E402
+
+SR = 22050
+FMIN, FMAX = 65.0, 2093.0
+
+
+def _signal(seconds=3.0):
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SR)) / SR
+    # A gliding tone with harmonics and some noise; loud right up to both ends
+    freq = 220.0 * 2 ** (t / seconds)
+    phase = 2 * np.pi * np.cumsum(freq) / SR
+    y = np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.05 * rng.standard_normal(len(t))
+    return y.astype(np.float32)
+
+
+def _piptrack(y, **kwargs):
+    pitches, magnitudes = librosa.piptrack(
+        y=y, sr=SR, threshold=0.1, fmin=FMIN, fmax=FMAX, hop_length=HOP_LENGTH, n_fft=FRAME_LENGTH, **kwargs
+    )
+    masked = np.where(pitches > 0, magnitudes, -np.inf)
+    best = np.argmax(masked, axis=0)
+    cols = np.arange(pitches.shape[1])
+    return np.where(pitches[best, cols] > 0, pitches[best, cols], 0.0)
+
+
+def test_track_pitch_matches_reflect_padded_piptrack():
+    y = _signal()
+    pitch, _ = track_pitch(y, SR, FMIN, FMAX, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH)
+    voicing, overall = agreement(pitch, _piptrack(y, pad_mode="reflect"), cents=1.0)
+    assert voicing == overall == 1.0
+
+
+def test_padding_only_changes_the_edge_frames():
+    # Deliberate: the estimators keep reflect padding whatever librosa's default is
+    y = _signal()
+    pitch, _ = track_pitch(y, SR, FMIN, FMAX, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH)
+    reference = _piptrack(y, pad_mode="constant")
+    edge = FRAME_LENGTH // (2 * HOP_LENGTH)
+    inner = slice(edge, len(pitch) - edge)
+    assert agreement(pitch[inner], reference[inner], cents=1.0) == (1.0, 1.0)
@@ -0,0 +1,59 @@
+import json
+
+import boto3
+import fakeredis
+import pytest
+from moto import mock_aws
+from rq.job import Job
+
+from worker import profiling
+from worker.spool import Spool
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("S3_ENDPOINT", "https://s3.amazonaws.com")
+    monkeypatch.setenv("S3_BUCKET", "profiles-test")
+    with mock_aws():
+        yield boto3.client("s3", region_name="us-east-1")
+
+
+def _work(n):
+    return {"total": sum(range(n)), "artifacts": {}}
+
+
+def test_run_profiled_stores_the_profile_and_records_it(s3, tmp_path, monkeypatch):
+    connection = fakeredis.FakeRedis()
+    job = Job.create(_work, args=(10,), connection=connection)
+    monkeypatch.setattr(profiling, "get_current_job", lambda: job)
+    monkeypatch.setattr(profiling, "get_spool", lambda: Spool(tmp_path, quota_bytes=1 << 20, ttl_seconds=60))
+
+    result = profiling.run_profiled(_work, "song-1", 10)
+
+    assert result["total"] == 45
+    descriptor = result["artifacts"]["profile"]
+    assert descriptor["format"] == "pstats" and descriptor["size"] > 0
+    assert descriptor["key"].startswith("transcriptions/song-1/profiles/") and descriptor["key"].endswith(f"-{job.id}.prof")
+    summary_key = descriptor["key"][:-len(".prof")] + ".txt"
+    summary = s3.get_object(Bucket="profiles-test", Key=summary_key)["Body"].read().decode()
+    assert summary.startswith("_work for song song-1: finished")
+
+    [entry] = profiling.recent_profiles(connection)
+    assert entry["job_id"] == job.id and entry["outcome"] == "finished"
+    assert entry["key"] == descriptor["key"]
+    assert json.loads(connection.lindex(profiling.RECENT_PROFILES_KEY, 0)) == entry
+    # Temporaries are released from the spool
+    assert list(tmp_path.iterdir()) == [tmp_path / ".pins"]
+
+
+def test_failed_jobs_are_profiled_too(s3, tmp_path, monkeypatch):
+    connection = fakeredis.FakeRedis()
+    job = Job.create(_work, args=(10,), connection=connection)
+    monkeypatch.setattr(profiling, "get_current_job", lambda: job)
+    monkeypatch.setattr(profiling, "get_spool", lambda: Spool(tmp_path, quota_bytes=1 << 20, ttl_seconds=60))
+
+    with pytest.raises(TypeError):
+        profiling.run_profiled(_work, "song-1", None)
+    [entry] = profiling.recent_profiles(connection)
+    assert entry["outcome"] == "failed"
+    s3.head_object(Bucket="profiles-test", Key=entry["key"])
@@ -0,0 +1,127 @@
+import json
+import os
+
+import fakeredis
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from worker import publisher  # noqa: E402
+
+
+@pytest.fixture
+def connection():
+    return fakeredis.FakeRedis()
+
+
+def _submit(connection, *song_ids):
+    for song_id in song_ids:
+        item = {"job_id": f"job-{song_id}", "song_id": song_id, "song_name": song_id, "render": None,
+                "url": f"s3://{song_id}", "attempts": 0}
+        connection.rpush(publisher.PUBLISH_QUEUE_KEY, json.dumps(item))
+
+
+def _queued(connection):
+    return [json.loads(raw)["song_id"] for raw in connection.lrange(publisher.PUBLISH_QUEUE_KEY, 0, -1)]
+
+
+def test_items_stay_on_the_processing_list_until_acked(connection):
+    _submit(connection, "a", "b", "c")
+    processing = publisher.PROCESSING_KEY_PREFIX + "p1"
+
+    items = publisher.take_batch(connection, processing, batch_size=2, timeout=1)
+    assert [item["song_id"] for item in items] == ["a", "b"]
+    assert connection.llen(processing) == 2 and _queued(connection) == ["c"]
+
+    publisher.ack_batch(connection, processing)
+    assert connection.llen(processing) == 0
+
+
+def test_items_of_a_dead_publisher_are_recovered(connection):
+    _submit(connection, "a", "b", "c")
+    publisher.heartbeat(connection, "dead")
+    publisher.take_batch(connection, publisher.PROCESSING_KEY_PREFIX + "dead", batch_size=2, timeout=1)
+
+    # Still alive: nothing to recover
+    assert publisher.recover_items(connection, "p2") == 0
+
+    connection.delete(publisher.ALIVE_KEY_PREFIX + "dead")
+    assert publisher.recover_items(connection, "p2") == 2
+    assert _queued(connection) == ["a", "b", "c"]
+    assert connection.smembers(publisher.PUBLISHERS_KEY) == set()
+
+
+def test_restart_under_the_same_name_recovers_its_own_items(connection):
+    _submit(connection, "a")
+    publisher.heartbeat(connection, "p1")
+    publisher.take_batch(connection, publisher.PROCESSING_KEY_PREFIX + "p1", batch_size=5, timeout=1)
+
+    assert publisher.recover_items(connection, "p1") == 1
+    assert _queued(connection) == ["a"]
+
+
+def test_due_retries_are_taken_again(connection):
+    item = {"job_id": "job-a", "song_id": "a", "song_name": "a", "render": None, "url": "s3://a", "attempts": 1}
+    connection.zadd(publisher.PUBLISH_DELAYED_KEY, {json.dumps(item): 0})
+
+    items = publisher.take_batch(connection, publisher.PROCESSING_KEY_PREFIX + "p1", batch_size=5, timeout=1)
+    assert items == [item]
+    assert connection.zcard(publisher.PUBLISH_DELAYED_KEY) == 0
+
+
+@pytest.fixture
+def songs(tmp_path, monkeypatch):
+    from contextlib import contextmanager
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from backend.app.models import Base, Song
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'songs.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_db_session():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    monkeypatch.setattr(publisher, "get_db_session", get_db_session)
+    with get_db_session() as db:
+        db.add_all([Song(name="a"), Song(name="b")])
+    with get_db_session() as db:
+        yield Session, [str(song.id) for song in db.query(Song).order_by(Song.name)]
+
+
+def test_a_deleted_song_only_fails_its_own_item(songs):
+    from backend.app.models import Song
+
+    Session, song_ids = songs
+    deleted = "00000000-0000-0000-0000-000000000000"
+    missing = publisher.update_transcription_urls([
+        {"song_id": song_ids[0], "transcription_url": "s3://a"},
+        {"song_id": deleted, "transcription_url": "s3://gone"},
+        {"song_id": song_ids[1], "transcription_url": "s3://b"},
+    ])
+    assert missing == [deleted]
+    db = Session()
+    assert [song.transcription_url for song in db.query(Song).order_by(Song.name)] == ["s3://a", "s3://b"]
+    db.close()
+
+
+def test_publish_batch_dead_letters_deleted_songs(connection, songs, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    _, song_ids = songs
+    _submit(connection, song_ids[0], "00000000-0000-0000-0000-000000000000")
+    items = publisher.take_batch(connection, publisher.PROCESSING_KEY_PREFIX + "p1", batch_size=5, timeout=1)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert publisher.publish_batch(connection, items, executor) == 1
+    assert connection.zcard(publisher.PUBLISH_DELAYED_KEY) == 0
+    [entry] = [json.loads(raw) for raw in connection.lrange(publisher.DEAD_LETTER_KEY, 0, -1)]
+    assert "no longer exists" in entry["error"]
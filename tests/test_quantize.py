@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from worker.notetable import NoteTable
+from worker.quantize import estimate_beats, get_divisions, quantize_notes, quantize_times
+
+SR = 22050
+HOP = 512
+BEATS = np.arange(0, 8) * 0.5  # 120 bpm
+
+
+def test_notes_snap_to_the_nearest_grid_point():
+    notes = NoteTable.from_tuples([(0.13, 0.26, 60, 90), (0.49, 0.51, 62, 90), (1.3, 1.9, 64, 90)])
+    quantized = quantize_notes(notes, BEATS, 120.0, grid="1/16")
+
+    np.testing.assert_allclose(quantized.start, [0.125, 0.5, 1.25])
+    # A note shorter than a step still lasts one step
+    np.testing.assert_allclose(quantized.end, [0.25, 0.625, 1.875])
+    np.testing.assert_array_equal(quantized.pitch, notes.pitch)
+
+
+def test_drifting_beats_are_retimed_onto_the_global_tempo():
+    drifting = np.arange(0, 8) * 0.55
+    starts, ends = quantize_times([0.55, 1.1 + 0.275], [1.1, 1.65], drifting, 120.0, grid="1/8")
+    np.testing.assert_allclose(starts, [0.5, 1.25])
+    np.testing.assert_allclose(ends, [1.0, 1.5])
+
+
+def test_swing_delays_off_beat_subdivisions():
+    starts, ends = quantize_times([0.0, 0.32, 0.5], [0.3, 0.49, 0.8], BEATS, 120.0, grid="1/8", swing=1 / 3)
+    np.testing.assert_allclose(starts, [0.0, 1 / 3, 0.5])
+    np.testing.assert_allclose(ends, [1 / 3, 0.5, 1.0 - 1 / 6])
+    # Triplet swing needs three divisions per eighth note
+    assert get_divisions("1/8", 1 / 3) == 6
+
+
+def test_empty_table_and_unknown_grid():
+    assert len(quantize_notes(NoteTable(), BEATS, 120.0)) == 0
+    with pytest.raises(ValueError, match="Unknown quantization grid"):
+        quantize_notes(NoteTable(), BEATS, 120.0, grid="1/64")
+
+
+def test_estimate_beats_follows_a_steady_pulse():
+    period = 60.0 / 120.0 * SR / HOP
+    frames = np.arange(int(20 * period))
+    onsets = 7 + period * np.arange(19)
+    # Onsets a couple of frames wide, like a real flux envelope
+    envelope = np.exp(-0.5 * ((frames[:, None] - onsets[None, :]) / 1.5) ** 2).sum(axis=1)
+
+    bpm, beats = estimate_beats(envelope, SR, HOP)
+    assert bpm == pytest.approx(120.0, rel=0.02)
+    np.testing.assert_allclose(beats[:19], onsets * HOP / SR, atol=HOP / SR)
+
+
+def test_estimate_beats_without_onsets_falls_back_to_a_regular_grid():
+    bpm, beats = estimate_beats(np.zeros(200), SR, HOP, bpm=100.0)
+    assert bpm == 100.0 and beats[0] == 0.0
+    np.testing.assert_allclose(np.diff(beats), 0.6)
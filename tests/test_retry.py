@@ -0,0 +1,50 @@
+import json
+
+import fakeredis
+from rq import Queue, Retry
+from rq.job import JobStatus
+
+from worker import retry
+from worker.spool import Spool
+from worker.worker import MetricsWorker
+
+KILLED = "Work-horse terminated unexpectedly; waitpid returned 9 (signal 9); "
+
+
+def _start(connection, queue, path, retries):
+    job = queue.enqueue("worker.tasks.audio_to_musicxml", str(path), retry=Retry(max=retries) if retries else None)
+    job.set_status(JobStatus.STARTED)
+    return job
+
+
+def test_killed_work_horse_on_last_attempt_is_dead_lettered(tmp_path, monkeypatch):
+    connection = fakeredis.FakeRedis()
+    queue = Queue("audio", connection=connection)
+    worker = MetricsWorker([queue], connection=connection)
+    spool = Spool(tmp_path, quota_bytes=100, ttl_seconds=60)
+    monkeypatch.setattr(retry, "get_spool", lambda: spool)
+
+    # Retries left: the upload stays pinned for the next attempt
+    upload = spool.write("song.mp3", b"x" * 10, pin=True)
+    job = _start(connection, queue, upload, retries=1)
+    worker.handle_job_failure(job, queue, exc_string=KILLED)
+    assert connection.llen(retry.DEAD_LETTER_KEY) == 0
+    assert upload.exists()
+
+    # Last attempt: no exception handler runs for a killed work-horse
+    worker.handle_job_failure(job, queue, exc_string=KILLED)
+    entry = json.loads(connection.lindex(retry.DEAD_LETTER_KEY, 0))
+    assert entry["job_id"] == job.id and entry["error"].startswith("Work-horse terminated")
+    assert not upload.exists() and spool.pinned() == set()
+
+
+def test_raised_errors_record_the_exception_line(tmp_path, monkeypatch):
+    connection = fakeredis.FakeRedis()
+    queue = Queue("audio", connection=connection)
+    spool = Spool(tmp_path, quota_bytes=100, ttl_seconds=60)
+    monkeypatch.setattr(retry, "get_spool", lambda: spool)
+
+    job = _start(connection, queue, spool.write("song.mp3", b"x", pin=True), retries=0)
+    traceback = 'Traceback (most recent call last):\n  File "tasks.py", line 1\nValueError: bad audio\n'
+    MetricsWorker([queue], connection=connection).handle_job_failure(job, queue, exc_string=traceback)
+    assert json.loads(connection.lindex(retry.DEAD_LETTER_KEY, 0))["error"] == "ValueError: bad audio"
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from worker import scores
+from worker.musicxml import notes_to_musicxml
+from worker.notetable import NoteTable
+from worker.score_index import measure_index, part_byte_range, score_excerpt
+
+QPM = 120.0
+BAR_SECONDS = 2.0  # 4/4 at 120 qpm
+
+
+def _notes(bars, pitch, instrument=0):
+    starts = np.arange(bars * 4) * BAR_SECONDS / 4
+    return NoteTable(starts, starts + 0.4, np.full(len(starts), pitch), np.full(len(starts), 80), instrument)
+
+
+def _uneven_score(drum_bars, melody_bars):
+    return notes_to_musicxml(_notes(melody_bars, 60), "uneven", qpm=QPM, drums=_notes(drum_bars, 38, 9))
+
+
+def _measure_count(xml, part_id):
+    part = xml.split(f'<part id="{part_id}">')[1].split("</part>")[0]
+    return part.count("<measure ")
+
+
+def _excerpt(xml, start, end):
+    index = measure_index(xml)
+    data = xml.encode("utf-8")
+    chunks = []
+    for part in index["parts"]:
+        byte_range = part_byte_range(part, start, end)
+        chunks.append(data[byte_range[0]:byte_range[1]] if byte_range else b"")
+    return score_excerpt(index, chunks, start, end)
+
+
+def _unpadded(first_bars, second_bars):
+    """A score whose parts have different lengths, as stored before parts were padded."""
+    def part(part_id, bars):
+        measures = "\n    ".join(
+            f'<measure number="{n}">{"<attributes/>" if n == 1 else ""}<note>{part_id}-{n}</note></measure>'
+            for n in range(1, bars + 1)
+        )
+        return f'  <part id="{part_id}">\n    {measures}\n  </part>'
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<score-partwise version="3.1">\n'
+        f"{part('P1', first_bars)}\n{part('P2', second_bars)}\n</score-partwise>\n"
+    )
+
+
+def test_parts_are_padded_to_the_longest():
+    xml = _uneven_score(drum_bars=2, melody_bars=16)
+    assert _measure_count(xml, "P1") == _measure_count(xml, "P2") == 16
+    assert measure_index(xml)["measures"] == 16
+
+    excerpt = _excerpt(xml, 5, 8)
+    for part_id in ("P1", "P2"):
+        assert _measure_count(excerpt, part_id) == 4
+        assert '<measure number="5">' in excerpt.split(f'<part id="{part_id}">')[1]
+
+
+def test_full_range_excerpt_is_the_original():
+    xml = _uneven_score(drum_bars=3, melody_bars=7)
+    assert _excerpt(xml, 1, measure_index(xml)["measures"]) == xml
+
+
+@pytest.mark.parametrize("first_bars, second_bars", [(2, 16), (16, 2)])
+def test_unpadded_scores_index_the_longest_part(first_bars, second_bars):
+    xml = _unpadded(first_bars, second_bars)
+    assert measure_index(xml)["measures"] == 16
+
+    excerpt = _excerpt(xml, 5, 8)
+    long_id, short_id = ("P2", "P1") if second_bars > first_bars else ("P1", "P2")
+    assert f"<note>{long_id}-8</note>" in excerpt
+    # The short part is filled with whole-measure rests (and still gets its prelude)
+    short_part = excerpt.split(f'<part id="{short_id}">')[1].split("</part>")[0]
+    assert short_part.count("<measure ") == short_part.count("<rest/>") == 4
+    assert "<attributes/>" in short_part and f"<note>{short_id}-" not in short_part
+
+
+class FakeStore:
+    """The S3 calls of worker.scores over an in-memory bucket."""
+
+    def __init__(self, monkeypatch, xml, etag='"v1"'):
+        self.objects = {}
+        self.score = (xml.encode("utf-8"), etag)
+        monkeypatch.setattr(scores, "get_json_from_s3", self.objects.get)
+        monkeypatch.setattr(scores, "put_json_to_s3", self.objects.__setitem__)
+        monkeypatch.setattr(scores, "get_object_from_s3", lambda key: self.score)
+        monkeypatch.setattr(scores, "get_range_from_s3", self.get_range)
+        self.ranged_reads = 0
+
+    def get_range(self, key, first, last):
+        self.ranged_reads += 1
+        data, etag = self.score
+        return data[first:last + 1], etag
+
+
+def test_get_measure_range_with_uneven_parts(monkeypatch):
+    store = FakeStore(monkeypatch, _unpadded(2, 16))
+
+    # No index yet: built from the document, then served with ranged reads
+    first = scores.get_measure_range("song", "uneven", start=5, count=4)
+    assert store.objects and store.ranged_reads == 0
+    second = scores.get_measure_range("song", "uneven", start=5, count=4)
+    assert store.ranged_reads == 1
+    assert first == second
+    assert (second["measures"], second["start"], second["end"]) == (16, 5, 8)
+
+    last = scores.get_measure_range("song", "uneven", start=15, count=10)
+    assert (last["start"], last["end"]) == (15, 16)
+    with pytest.raises(ValueError):
+        scores.get_measure_range("song", "uneven", start=17, count=1)
+
+
+def test_a_replaced_score_of_the_same_size_is_reindexed(monkeypatch):
+    old, new = _unpadded(4, 4), _unpadded(4, 4).replace("P1-", "Q1-")
+    assert len(old) == len(new)
+    store = FakeStore(monkeypatch, old)
+    scores.get_measure_range("song", "s", start=1, count=4)
+
+    # Replaced without (or before) its new index: the ETag no longer matches
+    store.score = (new.encode("utf-8"), '"v2"')
+    excerpt = scores.get_measure_range("song", "s", start=1, count=4)["musicxml"]
+    assert "<note>Q1-1</note>" in excerpt and "P1-" not in excerpt
+    assert next(iter(store.objects.values()))["etag"] == '"v2"'
+
+
+def test_filler_measures_hold_a_rest(monkeypatch):
+    xml = _uneven_score(drum_bars=2, melody_bars=6)
+    index = measure_index(xml)
+    chunks = [b"", xml.encode("utf-8")[slice(*part_byte_range(index["parts"][1], 3, 4))]]
+    index["parts"][0]["offsets"] = index["parts"][0]["offsets"][:3]
+    drums = score_excerpt(index, chunks, 3, 4).split('<part id="P1">')[1].split("</part>")[0]
+    assert drums.count("<rest/>") == 2
+    assert drums.count("<duration>16</duration>") == 2
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from worker.spool import Spool, SpoolFullError
+
+
+def _age(path, seconds):
+    mtime = os.path.getmtime(path) - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_pinned_inputs_survive_eviction_until_ttl(tmp_path):
+    spool = Spool(tmp_path, quota_bytes=100, ttl_seconds=60)
+    queued = spool.write("queued.wav", b"x" * 40, pin=True)
+    recent = spool.write("recent.wav", b"x" * 40)
+    _age(queued, 30)
+
+    # The pinned entry is the least recently used, but only unpinned entries are evicted
+    spool.write("new.wav", b"x" * 40)
+    assert queued.exists() and not recent.exists()
+    assert spool.usage()["pinned_files"] == 1
+
+    # Released once the job is done
+    assert spool.release(queued)
+    assert not queued.exists() and spool.pinned() == set()
+
+
+def test_pins_expire_with_the_ttl(tmp_path):
+    spool = Spool(tmp_path, quota_bytes=100, ttl_seconds=60)
+    # Input of a job whose work-horse was killed: nobody will release it
+    abandoned = spool.write("abandoned.wav", b"x" * 40, pin=True)
+    _age(abandoned, 3600)
+    # Pin marker left behind after its entry was deleted by hand
+    orphan = spool.pin_directory / "gone.wav"
+    orphan.touch()
+    _age(orphan, 3600)
+
+    assert spool.cleanup()["expired"] == 1
+    assert not abandoned.exists() and spool.pinned() == set()
+
+
+def test_reserve_raises_when_pinned_entries_fill_the_quota(tmp_path):
+    spool = Spool(tmp_path, quota_bytes=100, ttl_seconds=60)
+    queued = spool.write("queued.wav", b"x" * 70, pin=True)
+    spare = spool.write("spare.wav", b"x" * 20)
+
+    with pytest.raises(SpoolFullError):
+        spool.reserve(40)
+    assert queued.exists() and not spare.exists()
+    spool.reserve(30)
+
+
+def test_failed_removal_does_not_count_as_freed(tmp_path, monkeypatch):
+    spool = Spool(tmp_path, quota_bytes=100, ttl_seconds=0)
+    first = spool.write("first.wav", b"x" * 60)
+    second = spool.write("second.wav", b"x" * 30)
+    _age(first, 20)
+    _age(second, 10)
+
+    # Another process already deleted the oldest entry: the next one must still go
+    monkeypatch.setattr(spool, "_remove", lambda path, size, reason: path != first and os.unlink(path) is None)
+    spool.cleanup(reserve_bytes=60)
+    assert not second.exists()
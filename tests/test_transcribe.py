@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+from worker.transcribe import is_up_to_date, output_paths
+
+OPTIONS = {"pitch_estimator": "piptrack", "grid": "1/16", "swing": 0.0}
+
+
+@pytest.fixture
+def transcribed(tmp_path):
+    audio = tmp_path / "song.wav"
+    audio.write_bytes(b"RIFF")
+    outputs = output_paths(str(audio))
+    with open(outputs["midi"], "wb") as f:
+        f.write(b"MThd")
+    with open(outputs["notes"], "w") as f:
+        json.dump({**OPTIONS, "bpm": 120.0, "notes": {}}, f)
+    mtime = os.path.getmtime(audio) + 10
+    for path in outputs.values():
+        os.utime(path, (mtime, mtime))
+    return str(audio)
+
+
+def test_outputs_with_the_same_options_are_up_to_date(transcribed):
+    assert is_up_to_date(transcribed, OPTIONS)
+    assert is_up_to_date(transcribed)
+
+
+@pytest.mark.parametrize("changed", [{"pitch_estimator": "yin"}, {"grid": "1/32"}, {"swing": 0.33}])
+def test_outputs_with_other_options_are_stale(transcribed, changed):
+    assert not is_up_to_date(transcribed, {**OPTIONS, **changed})
+
+
+def test_newer_input_or_missing_outputs_are_stale(transcribed):
+    os.utime(transcribed)
+    os.utime(output_paths(transcribed)["midi"], (0, 0))
+    assert not is_up_to_date(transcribed, OPTIONS)
+    os.remove(output_paths(transcribed)["midi"])
+    assert not is_up_to_date(transcribed, OPTIONS)
@@ -1,5 +1,3 @@
-from . import tasks
-
-__all__ = ["tasks"]
-
-
+# Submodules are imported explicitly (RQ imports worker.tasks by name). The API
+# imports worker.* without the analysis stack (numpy, librosa, note_seq), so the
+# package itself must not pull in worker.tasks.
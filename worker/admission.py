@@ -0,0 +1,159 @@
+"""Admission control and queue-aware ETAs for uploads.
+
+The API sorts every upload into a duration class of worker.metrics by its
+(estimated) audio length and refuses it with 429 when that class already has
+ADMISSION_MAX_QUEUED jobs waiting. Admitted jobs are tracked until a worker
+starts them (see MetricsWorker), so the depth of a class is a ZCARD rather
+than a scan of the queue. The limit check and the tracking ZADD run as one
+script, so concurrent uploads cannot overshoot the limit.
+
+ETAs combine the audio queued ahead, the workers on the queue and the
+rolling processing rate (seconds of processing per second of audio) that
+workers record in worker.metrics.
+
+Redis keys:
+    audiogen:admission:<queue>:<class>   queued "<job_id>:<audio seconds>" members by enqueue time
+"""
+import io
+import math
+import time
+import wave
+
+from rq.worker_registration import WORKERS_BY_QUEUE_KEY
+
+from worker.config import get_admission_limits
+from worker.metrics import DURATION_CLASSES, PROCESSING_RATE_KEY, duration_class
+
+ADMISSION_PREFIX = "audiogen:admission"
+# Tracked jobs that never started (deleted, or lost with Redis data) stop counting after this
+STALE_SECONDS = 24 * 3600
+# Processing seconds per second of audio until workers have recorded any
+DEFAULT_RATE = 1.0
+
+# KEYS[1] class set; ARGV: stale cutoff, now, member, limit (0 = unlimited).
+# Returns {admitted, jobs already queued in the class}
+_ADMIT_SCRIPT = """
+redis.call("ZREMRANGEBYSCORE", KEYS[1], 0, ARGV[1])
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[3])
+local depth = redis.call("ZCARD", KEYS[1]) - 1
+local limit = tonumber(ARGV[4])
+if limit > 0 and depth >= limit then
+    redis.call("ZREM", KEYS[1], ARGV[3])
+    return {0, depth}
+end
+return {1, depth}
+"""
+
+# Typical compressed bitrates, for formats whose length is not read from the header
+AUDIO_BYTES_PER_SECOND = {
+    ".mp3": 16000,   # 128 kbit/s
+    ".m4a": 16000,   # 128 kbit/s
+    ".ogg": 14000,   # ~112 kbit/s
+    ".flac": 88000,  # ~700 kbit/s
+    ".wav": 176400,  # 16-bit stereo 44.1 kHz
+}
+
+
+def estimate_audio_seconds(contents: bytes, extension: str) -> float:
+    """Audio length of an upload: exact for WAV, from typical bitrates otherwise.
+
+    The API image has no audio libraries; the worker records the real length.
+    """
+    if extension == ".wav":
+        try:
+            with wave.open(io.BytesIO(contents)) as f:
+                return f.getnframes() / f.getframerate()
+        except (wave.Error, EOFError, ZeroDivisionError):
+            pass
+    return len(contents) / AUDIO_BYTES_PER_SECOND.get(extension, AUDIO_BYTES_PER_SECOND[".mp3"])
+
+
+def _class_key(queue_name, name):
+    return f"{ADMISSION_PREFIX}:{queue_name}:{name}"
+
+
+def queue_snapshot(connection, queue_name: str, now=None) -> dict:
+    """Tracked depth and queued audio per class, workers and processing rate (one round trip)."""
+    now = time.time() if now is None else now
+    classes = list(DURATION_CLASSES)
+    with connection.pipeline(transaction=False) as pipeline:
+        for name in classes:
+            pipeline.zremrangebyscore(_class_key(queue_name, name), 0, now - STALE_SECONDS)
+            pipeline.zrange(_class_key(queue_name, name), 0, -1)
+        pipeline.scard(WORKERS_BY_QUEUE_KEY % queue_name)
+        pipeline.lrange(PROCESSING_RATE_KEY, 0, -1)
+        replies = pipeline.execute()
+
+    queued = {}
+    for i, name in enumerate(classes):
+        members = [m.decode() if isinstance(m, bytes) else m for m in replies[2 * i + 1]]
+        queued[name] = {
+            "depth": len(members),
+            "audio_seconds": sum(float(member.rsplit(":", 1)[1]) for member in members),
+        }
+    samples = [float(value) for value in replies[-1]]
+    return {
+        "queued": queued,
+        "workers": replies[-2],
+        "rate": sum(samples) / len(samples) if samples else DEFAULT_RATE,
+        "rate_samples": len(samples),
+    }
+
+
+def estimate_seconds(snapshot: dict, audio_seconds: float) -> int:
+    """Seconds until a new job of `audio_seconds` is done: the queue ahead shared by the workers, then the job."""
+    backlog = sum(queued["audio_seconds"] for queued in snapshot["queued"].values())
+    workers = max(snapshot["workers"], 1)
+    return int(math.ceil((backlog / workers + audio_seconds) * snapshot["rate"]))
+
+
+def admit(connection, queue_name: str, job_id: str, audio_seconds: float, limits=None) -> dict:
+    """Decide whether a new upload may be queued, and if so count it against its class.
+
+    An admitted job stays counted until a worker starts it; call untrack()
+    with its meta if it is never enqueued.
+
+    Args:
+        connection: Redis connection
+        queue_name: Queue the job would go to
+        job_id: ID the job will be enqueued with
+        audio_seconds: Audio length of the upload
+        limits: Max queued jobs per duration class (None = ADMISSION_MAX_QUEUED; missing = unlimited)
+
+    Returns:
+        Dict with admitted, duration_class, depth (queued in the class), limit,
+        estimated_seconds, retry_after (seconds, when not admitted) and meta
+        (for the job, when admitted)
+    """
+    limits = get_admission_limits() if limits is None else limits
+    name = duration_class(audio_seconds)
+    limit = limits.get(name)
+    snapshot = queue_snapshot(connection, queue_name)
+    member = f"{job_id}:{audio_seconds:.1f}"
+    now = time.time()
+    admitted, depth = connection.eval(
+        _ADMIT_SCRIPT, 1, _class_key(queue_name, name), now - STALE_SECONDS, now, member, limit or 0
+    )
+    decision = {
+        "admitted": bool(admitted),
+        "duration_class": name,
+        "depth": depth,
+        "limit": limit,
+        "estimated_seconds": estimate_seconds(snapshot, audio_seconds),
+        "retry_after": None,
+        "meta": {"admission": [queue_name, name, member]} if admitted else None,
+    }
+    if not admitted:
+        # Time for the workers to drain the class back under its limit
+        queued = snapshot["queued"][name]
+        per_audio = queued["audio_seconds"] / queued["depth"] if queued["depth"] else audio_seconds
+        per_job = per_audio * snapshot["rate"] / max(snapshot["workers"], 1)
+        decision["retry_after"] = max(1, int(math.ceil(per_job * (depth - limit + 1))))
+    return decision
+
+
+def untrack(connection, meta: dict) -> None:
+    """Stop counting a job (it started, or was never enqueued)."""
+    if meta.get("admission"):
+        queue_name, name, member = meta["admission"]
+        connection.zrem(_class_key(queue_name, name), member)
@@ -0,0 +1,230 @@
+"""Re-transcribe the song catalog, e.g. after an analysis change.
+
+Walks the songs table in primary-key order (keyset pagination, so each batch
+is an index range scan however far along the walk is), re-runs every song
+from its source audio in S3 (see worker.tasks.backfill_transcription) and
+writes the new transcription URLs back in one transaction per batch.
+
+Jobs are either enqueued on an RQ queue (default: the lowest-priority
+"default" queue, so uploads are never starved) or run in a local process
+pool. Either way at most --concurrency songs are in flight and at most --rate
+are started per second. The cursor is saved to --state after every batch, so
+an interrupted backfill resumes where it stopped.
+
+Usage:
+    python -m worker.backfill [--mode enqueue|local] [--concurrency 4] [--rate 2]
+                              [--batch-size 100] [--state backfill_state.json]
+                              [--pitch-estimator yin] [--grid 1/16] [--swing 0]
+                              [--limit 1000] [--dry-run]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from uuid import UUID
+
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+backend_dir = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, os.path.abspath(root_dir))
+sys.path.insert(0, os.path.abspath(backend_dir))
+
+from rq import Queue
+from rq.job import Job, JobStatus
+from sqlalchemy import func, select
+
+from backend.app.database import get_db_session
+from backend.app.models import Song
+from worker.checkpoints import find_source_audio_key
+from worker.publisher import update_transcription_urls
+from worker.queues import get_redis_connection
+from worker.retry import get_job_retry, on_job_failure
+from worker.tasks import backfill_transcription
+
+POLL_SECONDS = 2.0
+TERMINAL_FAILURES = (JobStatus.FAILED, JobStatus.STOPPED, JobStatus.CANCELED)
+
+
+class RateLimiter:
+    """Spaces calls to wait() at least 1/rate seconds apart (None = unlimited)."""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_at = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def load_state(path: str) -> dict:
+    """Progress saved by an earlier run, or a fresh state."""
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"cursor": None, "done": 0, "failed": []}
+
+
+def save_state(path: str, state: dict) -> None:
+    # Written atomically so a crash never leaves a truncated state file
+    partial = f"{path}.partial"
+    with open(partial, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(partial, path)
+
+
+def fetch_batch(cursor, batch_size: int):
+    """Next `batch_size` (id, name) rows after `cursor` in primary-key order."""
+    query = select(Song.id, Song.name).order_by(Song.id).limit(batch_size)
+    if cursor is not None:
+        query = query.where(Song.id > UUID(cursor))
+    with get_db_session() as db:
+        return [(str(song_id), name) for song_id, name in db.execute(query)]
+
+
+def count_remaining(cursor) -> int:
+    query = select(func.count()).select_from(Song)
+    if cursor is not None:
+        query = query.where(Song.id > UUID(cursor))
+    with get_db_session() as db:
+        return db.execute(query).scalar_one()
+
+
+def run_batch_local(executor, rows, options, concurrency, limiter):
+    """Run one batch in the process pool. Returns (results, failures)."""
+    pending = list(rows)
+    in_flight = {}
+    results, failures = [], []
+    while pending or in_flight:
+        while pending and len(in_flight) < concurrency:
+            limiter.wait()
+            song_id, name = pending.pop(0)
+            in_flight[executor.submit(backfill_transcription, name, song_id, **options)] = song_id
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            song_id = in_flight.pop(future)
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failures.append({"song_id": song_id, "error": f"{type(e).__name__}: {e}"})
+    return results, failures
+
+
+def run_batch_enqueued(queue, rows, options, concurrency, limiter):
+    """Enqueue one batch as RQ jobs and wait for them. Returns (results, failures).
+
+    Jobs get the normal retry policy, so a failure here has already used up
+    its retries (or was poison).
+    """
+    pending = list(rows)
+    in_flight = {}
+    results, failures = [], []
+    while pending or in_flight:
+        while pending and len(in_flight) < concurrency:
+            limiter.wait()
+            song_id, name = pending.pop(0)
+            job = queue.enqueue(
+                backfill_transcription, name, song_id, **options,
+                job_timeout=3600,
+                retry=get_job_retry(),
+                on_failure=on_job_failure,
+                description=f"backfill {song_id}",
+            )
+            in_flight[job.id] = song_id
+        time.sleep(POLL_SECONDS)
+        job_ids = list(in_flight)
+        for job_id, job in zip(job_ids, Job.fetch_many(job_ids, connection=queue.connection)):
+            status = job.get_status(refresh=False) if job is not None else None
+            if status == JobStatus.FINISHED:
+                results.append(job.return_value())
+            elif job is None or status in TERMINAL_FAILURES:
+                error = (job.exc_info or "").strip().splitlines()[-1:] if job is not None else ["job expired"]
+                failures.append({"song_id": in_flight[job_id], "error": error[0] if error else str(status)})
+            else:
+                continue
+            del in_flight[job_id]
+    return results, failures
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-transcribe every song from its source audio in S3")
+    parser.add_argument("--mode", choices=("enqueue", "local"), default="enqueue",
+                        help="Enqueue RQ jobs for the workers, or run them in a local process pool")
+    parser.add_argument("--queue", default="default", help="RQ queue for enqueue mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="Songs in flight at once")
+    parser.add_argument("--rate", type=float, help="Maximum songs started per second")
+    parser.add_argument("--batch-size", type=int, default=100, help="Rows per keyset page and UPDATE")
+    parser.add_argument("--state", default="backfill_state.json", help="Cursor file to resume from")
+    parser.add_argument("--pitch-estimator", help="Pitch estimator (default: worker PITCH_ESTIMATOR)")
+    parser.add_argument("--grid", help="Quantization grid (default: worker QUANTIZE_GRID)")
+    parser.add_argument("--swing", type=float, help="Swing amount (default: worker QUANTIZE_SWING)")
+    parser.add_argument("--limit", type=int, help="Stop after this many songs")
+    parser.add_argument("--dry-run", action="store_true", help="Only count songs and locate their source audio")
+    args = parser.parse_args()
+
+    state = load_state(args.state)
+    if state["cursor"]:
+        print(f"Resuming after song {state['cursor']} ({state['done']} done, {len(state['failed'])} failed)")
+    total = count_remaining(state["cursor"])
+    if args.limit:
+        total = min(total, args.limit)
+    print(f"{total} songs to backfill ({args.mode} mode, concurrency {args.concurrency})")
+
+    options = {"pitch_estimator": args.pitch_estimator, "grid": args.grid, "swing": args.swing}
+    limiter = RateLimiter(args.rate)
+    executor = ProcessPoolExecutor(max_workers=args.concurrency) if args.mode == "local" and not args.dry_run else None
+    queue = Queue(args.queue, connection=get_redis_connection()) if args.mode == "enqueue" else None
+
+    cursor = state["cursor"]
+    processed = 0
+    started = time.monotonic()
+    try:
+        while processed < total:
+            rows = fetch_batch(cursor, min(args.batch_size, total - processed))
+            if not rows:
+                break
+            if args.dry_run:
+                missing = [song_id for song_id, _ in rows if find_source_audio_key(song_id) is None]
+                results, failures = [], [{"song_id": song_id, "error": "no source audio"} for song_id in missing]
+            elif executor is not None:
+                results, failures = run_batch_local(executor, rows, options, args.concurrency, limiter)
+            else:
+                results, failures = run_batch_enqueued(queue, rows, options, args.concurrency, limiter)
+
+            cursor = rows[-1][0]
+            processed += len(rows)
+            if not args.dry_run:
+                deleted = set(update_transcription_urls(results))
+                # Songs deleted while they were re-transcribed
+                failures.extend({"song_id": song_id, "error": "song was deleted"} for song_id in deleted)
+                results = [result for result in results if result["song_id"] not in deleted]
+                state["cursor"] = cursor
+                state["done"] += len(results)
+                state["failed"].extend(failures)
+                save_state(args.state, state)
+            for failure in failures:
+                print(f"  {failure['song_id']}: {failure['error']}")
+
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            eta = format_duration((total - processed) / rate) if rate > 0 else "?"
+            print(f"{processed}/{total} songs, {len(results)} ok / {len(failures)} failed in this batch, "
+                  f"{rate * 60:.1f} songs/min, ETA {eta}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"Backfill {'dry run ' if args.dry_run else ''}finished: {processed} songs in "
+          f"{format_duration(time.monotonic() - started)}")
+
+
+if __name__ == "__main__":
+    main()
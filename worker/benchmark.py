@@ -0,0 +1,269 @@
+"""Micro-benchmarks for the worker's analysis stages.
+
+Usage:
+    python -m worker.benchmark pitch [audio_file] [--estimators yin,autocorr] [--json out.json]
+    python -m worker.benchmark drums [audio_file] [--seconds 600] [--json out.json]
+    python -m worker.benchmark decode [audio_file] [--json out.json]
+    python -m worker.benchmark quantize [--notes 100000] [--grid 1/16] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.abspath(root_dir))
+
+from worker.decode import RESAMPLE_MODES, decode_audio, probe_audio
+from worker.drums import DRUM_BANDS, transcribe_drums
+from worker.musicxml import notes_to_musicxml
+from worker.notetable import NoteTable
+from worker.pitch import PITCH_ESTIMATORS, get_pitch_estimator
+from worker.quantize import quantize_notes
+
+SAMPLE_RATE = 22050
+HOP_LENGTH = 512
+FRAME_LENGTH = 2048
+
+
+def _measure(fn, repeat):
+    """Best wall time over `repeat` runs and traced peak memory of one run."""
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best, peak
+
+
+def piptrack_reference(y, sr, fmin, fmax, threshold):
+    """The original transcription path: dense piptrack matrices, then argmax per frame.
+
+    Runs with the installed librosa's default padding, as the original code
+    did. From librosa 0.10 that is zero padding, while the estimators keep
+    reflect padding (see worker.pitch.frame_signal), so a few frames at each
+    end can disagree.
+    """
+    import librosa
+
+    pitches, magnitudes = librosa.piptrack(
+        y=y, sr=sr, threshold=threshold, fmin=fmin, fmax=fmax,
+        hop_length=HOP_LENGTH, n_fft=FRAME_LENGTH
+    )
+    masked = np.where(pitches > 0, magnitudes, -np.inf)
+    best = np.argmax(masked, axis=0)
+    cols = np.arange(pitches.shape[1])
+    return np.where(pitches[best, cols] > 0, pitches[best, cols], 0.0)
+
+
+def agreement(pitch, reference, cents=50.0):
+    """Voicing agreement and pitch agreement against a reference track.
+
+    Returns:
+        (voicing, overall) fractions of frames: `voicing` counts frames where
+        both tracks agree on voiced/unvoiced, `overall` additionally requires
+        voiced pitches to be within `cents` of the reference
+    """
+    if not len(pitch):
+        return 1.0, 1.0
+    voiced = (pitch > 0) & (reference > 0)
+    same_voicing = (pitch > 0) == (reference > 0)
+    close = np.ones_like(same_voicing)
+    close[voiced] = np.abs(1200 * np.log2(pitch[voiced] / reference[voiced])) <= cents
+    return float(np.mean(same_voicing)), float(np.mean(same_voicing & close))
+
+
+def bench_pitch(audio_file, repeat, estimators=None, cents=50.0):
+    """Runtime, peak memory and agreement with the dense piptrack path for each backend."""
+    import librosa
+
+    y, sr = librosa.load(audio_file, sr=SAMPLE_RATE)
+    fmin, fmax = librosa.note_to_hz('C2'), librosa.note_to_hz('C7')
+    duration = len(y) / sr
+
+    reference, ref_time, ref_peak = _measure(
+        lambda: piptrack_reference(y, sr, fmin, fmax, 0.1), repeat
+    )
+    results = [{
+        "name": "piptrack (dense reference)", "seconds": ref_time, "peak_bytes": ref_peak,
+        "voicing_agreement": 1.0, "agreement": 1.0,
+    }]
+    for name in estimators or sorted(PITCH_ESTIMATORS):
+        estimate = get_pitch_estimator(name)
+        pitch, seconds, peak = _measure(
+            lambda: estimate(y, sr, fmin, fmax, n_fft=FRAME_LENGTH, hop_length=HOP_LENGTH)[0],
+            repeat
+        )
+        voicing, overall = agreement(pitch, reference, cents=cents)
+        results.append({
+            "name": name, "seconds": seconds, "peak_bytes": peak,
+            "voicing_agreement": voicing, "agreement": overall,
+        })
+    return {
+        "audio_file": audio_file,
+        "duration_seconds": duration,
+        "frames": int(len(reference)),
+        "cents_tolerance": cents,
+        "results": results,
+    }
+
+
+def bench_drums(audio_file, repeat, seconds=None):
+    """Drum transcription throughput, optionally on audio looped to `seconds` long."""
+    import librosa
+
+    y, sr = librosa.load(audio_file, sr=SAMPLE_RATE)
+    if seconds:
+        y = np.resize(y, int(seconds * sr))
+    duration = len(y) / sr
+
+    hits, elapsed, peak = _measure(lambda: transcribe_drums(y, sr), repeat)
+    counts = {name: int(np.sum(hits.pitch == pitch)) for name, pitch, _, _ in DRUM_BANDS}
+    return {
+        "audio_file": audio_file,
+        "duration_seconds": duration,
+        "seconds": elapsed,
+        "x_realtime": duration / elapsed if elapsed > 0 else None,
+        "peak_bytes": peak,
+        "hits": counts,
+    }
+
+
+def bench_decode(audio_file, repeat):
+    """Decode + resample time per mode against librosa.load, plus header probe time."""
+    import librosa
+
+    reference, ref_time, ref_peak = _measure(lambda: librosa.load(audio_file, sr=SAMPLE_RATE)[0], repeat)
+    info, probe_time, _ = _measure(lambda: probe_audio(audio_file), repeat)
+    results = [
+        {"name": "librosa.load", "seconds": ref_time, "peak_bytes": ref_peak, "max_abs_diff": 0.0},
+        {"name": "probe_audio", "seconds": probe_time, "peak_bytes": 0, "max_abs_diff": None},
+    ]
+    for mode in sorted(RESAMPLE_MODES):
+        y, seconds, peak = _measure(lambda: decode_audio(audio_file, SAMPLE_RATE, resample=mode)[0], repeat)
+        n = min(len(y), len(reference))
+        results.append({
+            "name": f"decode_audio ({mode})", "seconds": seconds, "peak_bytes": peak,
+            "max_abs_diff": float(np.max(np.abs(y[:n] - reference[:n]))) if n else 0.0,
+        })
+    return {"audio_file": audio_file, "probe": info, "results": results}
+
+
+def print_decode_report(report):
+    probe = report["probe"]
+    print(f"Audio: {report['audio_file']} ({probe['duration']:.1f}s, {probe['sample_rate']} Hz, "
+          f"{probe['channels']} ch, {probe['format']})")
+    print(f"{'stage':<28}{'seconds':>10}{'x realtime':>12}{'peak MB':>10}{'max diff':>10}")
+    for row in report["results"]:
+        speed = probe["duration"] / row["seconds"] if row["seconds"] > 0 else float("inf")
+        diff = f"{row['max_abs_diff']:.4f}" if row["max_abs_diff"] is not None else "-"
+        print(f"{row['name']:<28}{row['seconds']:>10.4f}{speed:>12.1f}{row['peak_bytes'] / 1e6:>10.1f}{diff:>10}")
+
+
+def bench_quantize(n_notes, repeat, grid="1/16", swing=0.0, bpm=100.0, seed=0):
+    """Quantization and rendering time for `n_notes` random notes over a drifting beat map."""
+    rng = np.random.default_rng(seed)
+    duration = max(60.0, n_notes / 20.0)
+    starts = np.sort(rng.uniform(0, duration, n_notes))
+    ends = starts + rng.uniform(0.05, 1.0, n_notes)
+    notes = NoteTable(starts, ends, rng.integers(40, 90, n_notes), np.full(n_notes, 80))
+    period = 60.0 / bpm
+    beats = np.cumsum(np.full(int(duration / period) + 2, period) + rng.normal(0, 0.005, int(duration / period) + 2))
+
+    _, quantize_time, quantize_peak = _measure(lambda: quantize_notes(notes, beats, bpm, grid=grid, swing=swing), repeat)
+    quantized = quantize_notes(notes, beats, bpm, grid=grid, swing=swing)
+    _, render_time, render_peak = _measure(lambda: notes_to_musicxml(quantized, "benchmark", qpm=bpm, grid=grid, swing=swing), 1)
+    return {
+        "notes": n_notes,
+        "beats": int(len(beats)),
+        "grid": grid,
+        "swing": swing,
+        "results": [
+            {"name": "quantize_notes", "seconds": quantize_time, "peak_bytes": quantize_peak},
+            {"name": "notes_to_musicxml", "seconds": render_time, "peak_bytes": render_peak},
+        ],
+    }
+
+
+def print_quantize_report(report):
+    print(f"{report['notes']} notes, {report['beats']} beats, grid {report['grid']}, swing {report['swing']:g}")
+    for row in report["results"]:
+        print(f"{row['name']:<28}{row['seconds'] * 1000:>10.2f} ms{row['peak_bytes'] / 1e6:>10.1f} MB")
+
+
+def print_drum_report(report):
+    print(f"Audio: {report['audio_file']} ({report['duration_seconds']:.1f}s)")
+    print(f"Drum transcription: {report['seconds']:.4f}s, {report['x_realtime']:.0f}x realtime, "
+          f"peak {report['peak_bytes'] / 1e6:.1f} MB")
+    print("Hits: " + ", ".join(f"{name}={count}" for name, count in report["hits"].items()))
+
+
+def print_report(report):
+    print(f"Audio: {report['audio_file']} ({report['duration_seconds']:.1f}s, {report['frames']} frames)")
+    print(f"{'backend':<28}{'seconds':>10}{'x realtime':>12}{'peak MB':>10}{'voicing':>10}{'agreement':>11}")
+    for row in report["results"]:
+        speed = report["duration_seconds"] / row["seconds"] if row["seconds"] > 0 else float("inf")
+        print(f"{row['name']:<28}{row['seconds']:>10.4f}{speed:>12.1f}{row['peak_bytes'] / 1e6:>10.1f}"
+              f"{row['voicing_agreement']:>10.3f}{row['agreement']:>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker analysis stages")
+    sub = parser.add_subparsers(dest="stage", required=True)
+
+    pitch = sub.add_parser("pitch", help="Pitch estimator runtime, memory and agreement with piptrack")
+    pitch.add_argument("audio_file", nargs="?", default=os.path.join(root_dir, "sample.mp3"))
+    pitch.add_argument("--repeat", type=int, default=3)
+    pitch.add_argument("--estimators", help="Comma-separated backends (default: all registered)")
+    pitch.add_argument("--cents", type=float, default=50.0, help="Pitch agreement tolerance")
+    pitch.add_argument("--json", help="Also write the report to this path")
+
+    drums = sub.add_parser("drums", help="Drum transcription throughput (single process)")
+    drums.add_argument("audio_file", nargs="?", default=os.path.join(root_dir, "sample.mp3"))
+    drums.add_argument("--repeat", type=int, default=3)
+    drums.add_argument("--seconds", type=float, help="Loop the audio to this length first")
+    drums.add_argument("--json", help="Also write the report to this path")
+
+    decode = sub.add_parser("decode", help="Decode/resample time per mode and header probe time")
+    decode.add_argument("audio_file", nargs="?", default=os.path.join(root_dir, "sample.mp3"))
+    decode.add_argument("--repeat", type=int, default=3)
+    decode.add_argument("--json", help="Also write the report to this path")
+
+    quantize = sub.add_parser("quantize", help="Quantization and MusicXML rendering time on synthetic notes")
+    quantize.add_argument("--notes", type=int, default=100000)
+    quantize.add_argument("--repeat", type=int, default=5)
+    quantize.add_argument("--grid", default="1/16")
+    quantize.add_argument("--swing", type=float, default=0.0)
+    quantize.add_argument("--json", help="Also write the report to this path")
+
+    args = parser.parse_args()
+    if args.stage == "pitch":
+        estimators = args.estimators.split(",") if args.estimators else None
+        report = bench_pitch(args.audio_file, args.repeat, estimators=estimators, cents=args.cents)
+        print_report(report)
+    elif args.stage == "drums":
+        report = bench_drums(args.audio_file, args.repeat, seconds=args.seconds)
+        print_drum_report(report)
+    elif args.stage == "decode":
+        report = bench_decode(args.audio_file, args.repeat)
+        print_decode_report(report)
+    elif args.stage == "quantize":
+        report = bench_quantize(args.notes, args.repeat, grid=args.grid, swing=args.swing)
+        print_quantize_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Per-job stage checkpoints for resumable transcription.
+
+Each transcription job keeps a small JSON manifest in S3 recording which
+stages have completed and where their outputs live. A retried job (after a
+crash, eviction or transient S3/DB error) reads the manifest and skips every
+stage whose recorded inputs still match.
+
+Stages, in order:
+    source:   the uploaded audio copied to S3, so any worker can fetch it
+    analysis: the note table (see worker.tasks.NOTE_TABLE_VERSION)
+    render:   the MusicXML artifact
+"""
+from datetime import datetime
+
+from worker.s3_client import find_object_key, get_json_from_s3, put_json_to_s3
+
+
+def get_checkpoint_key(song_id: str) -> str:
+    return f"checkpoints/{song_id}/audio_to_musicxml.json"
+
+
+def get_source_audio_key(song_id: str, suffix: str) -> str:
+    return f"uploads/{song_id}/source{suffix}"
+
+
+def find_source_audio_key(song_id: str):
+    """Key of a song's stored source audio (whatever its suffix), or None."""
+    return find_object_key(get_source_audio_key(song_id, ""))
+
+
+def load_checkpoints(song_id: str) -> dict:
+    """Completed stages for a job: {stage: data}, empty for a fresh job."""
+    return get_json_from_s3(get_checkpoint_key(song_id)) or {}
+
+
+def save_checkpoint(checkpoints: dict, song_id: str, stage: str, **data) -> dict:
+    """Record `stage` as complete and persist the manifest.
+
+    Args:
+        checkpoints: Manifest as returned by load_checkpoints (updated in place)
+        song_id: UUID of the song the job belongs to
+        stage: Stage name
+        **data: JSON-serializable stage outputs and the inputs they depend on
+
+    Returns:
+        The updated manifest
+    """
+    checkpoints[stage] = dict(data, completed_at=datetime.utcnow().isoformat())
+    put_json_to_s3(get_checkpoint_key(song_id), checkpoints)
+    print(f"Checkpoint saved: {stage}")
+    return checkpoints
+
+
+def stage_done(checkpoints: dict, stage: str, **inputs) -> bool:
+    """True if `stage` completed with the same `inputs` it would run with now."""
+    done = checkpoints.get(stage)
+    return done is not None and all(done.get(name) == value for name, value in inputs.items())
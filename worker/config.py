@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 
 def get_redis_url() -> str:
@@ -7,7 +8,8 @@ def get_redis_url() -> str:
 
 
 def get_queue_names() -> list[str]:
-    return [q.strip() for q in os.getenv("RQ_QUEUES", "audio,default").split(",") if q.strip()]
+    # Listed in priority order: short re-render jobs first
+    return [q.strip() for q in os.getenv("RQ_QUEUES", "render,audio,default").split(",") if q.strip()]
 
 
 def get_job_timeout_seconds() -> int:
@@ -15,3 +17,79 @@ def get_job_timeout_seconds() -> int:
     return int(os.getenv("RQ_JOB_TIMEOUT", "3600"))
 
 
+def get_job_max_retries() -> int:
+    return int(os.getenv("RQ_JOB_MAX_RETRIES", "3"))
+
+
+def get_job_retry_intervals() -> list[int]:
+    # Backoff between attempts in seconds; the last value repeats
+    return [int(v) for v in os.getenv("RQ_JOB_RETRY_INTERVALS", "30,120,600").split(",") if v.strip()]
+
+
+# Names registered in worker.pitch.PITCH_ESTIMATORS and worker.quantize.GRIDS, for
+# code that must not import the analysis stack (the API validates job options with them)
+PITCH_ESTIMATOR_NAMES = ("piptrack", "yin", "autocorr")
+QUANTIZE_GRID_NAMES = ("1/8", "1/16", "1/32")
+
+
+def get_pitch_estimator_name() -> str:
+    # Default backend from worker.pitch.PITCH_ESTIMATORS; jobs may override it
+    return os.getenv("PITCH_ESTIMATOR", "piptrack")
+
+
+def get_quantize_grid() -> str:
+    # Default grid from worker.quantize.GRIDS; jobs may override it
+    return os.getenv("QUANTIZE_GRID", "1/16")
+
+
+def get_quantize_swing() -> float:
+    # 0 = straight; 1/3 = triplet swing
+    return float(os.getenv("QUANTIZE_SWING", "0"))
+
+
+def get_resample_mode() -> str:
+    # worker.decode.RESAMPLE_MODES: "polyphase" (fast) or "librosa" (high quality)
+    return os.getenv("RESAMPLE_MODE", "polyphase")
+
+
+def get_silence_gate_db() -> float:
+    # Frames quieter than this many dB below the loudest frame skip pitch analysis; 0 = off
+    return float(os.getenv("SILENCE_GATE_DB", "60"))
+
+
+def get_admission_limits() -> dict:
+    # Max queued uploads per duration class ("short=200,medium=100,long=20"); missing or 0 = unlimited
+    limits = {}
+    for item in os.getenv("ADMISSION_MAX_QUEUED", "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+
+def get_profile_sample_percent() -> float:
+    # Share of uploads profiled when the upload does not say (see worker/profiling.py); 0 = none
+    return float(os.getenv("PROFILE_SAMPLE_PERCENT", "0"))
+
+
+def get_spool_dir() -> str:
+    # Shared by the API (uploads) and workers (inputs and temporaries)
+    return os.getenv("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "audiogen_uploads"))
+
+
+def get_spool_quota_bytes() -> int:
+    return int(os.getenv("SPOOL_QUOTA_BYTES", str(2 * 1024 ** 3)))
+
+
+def get_spool_ttl_seconds() -> int:
+    # Entries older than this are removed even if their job never finished
+    return int(os.getenv("SPOOL_TTL_SECONDS", str(24 * 3600)))
+
+
+def get_publish_batch_size() -> int:
+    # Transcriptions uploaded and written to Postgres per publisher batch
+    return int(os.getenv("PUBLISH_BATCH_SIZE", "50"))
+
+
+def get_publish_threads() -> int:
+    return int(os.getenv("PUBLISH_THREADS", "8"))
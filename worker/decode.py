@@ -0,0 +1,126 @@
+"""Audio decoding, resampling and metadata probing.
+
+WAV, FLAC and OGG (and MP3 with libsndfile >= 1.1) are decoded natively by
+soundfile; anything it cannot open, such as M4A, falls back to audioread
+(ffmpeg). Samples are downmixed block by block straight to float32 mono, then
+resampled with the selected mode from ``RESAMPLE_MODES``.
+"""
+from math import gcd
+
+import numpy as np
+
+from worker.config import get_resample_mode
+
+BLOCK_FRAMES = 1 << 18  # Frames per block when decoding natively
+
+
+def _resample_polyphase(y, orig_sr, target_sr):
+    from scipy.signal import resample_poly
+
+    divisor = gcd(orig_sr, target_sr)
+    return resample_poly(y, target_sr // divisor, orig_sr // divisor).astype(np.float32, copy=False)
+
+
+def _resample_librosa(y, orig_sr, target_sr):
+    import librosa
+
+    # librosa's default high-quality resampler (the old librosa.load behaviour)
+    return librosa.resample(y, orig_sr=orig_sr, target_sr=target_sr).astype(np.float32, copy=False)
+
+
+# Resampling mode name -> fn(y, orig_sr, target_sr)
+RESAMPLE_MODES = {
+    "polyphase": _resample_polyphase,
+    "librosa": _resample_librosa,
+}
+
+
+def get_resampler(mode=None):
+    """Look up a resampler by name (None = RESAMPLE_MODE from the environment)."""
+    mode = mode or get_resample_mode()
+    try:
+        return RESAMPLE_MODES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown resample mode '{mode}'. Available: {', '.join(sorted(RESAMPLE_MODES))}") from None
+
+
+def probe_audio(audio_path: str) -> dict:
+    """Read duration and format from the file header without decoding samples.
+
+    Args:
+        audio_path: Path to the audio file
+
+    Returns:
+        Dict with duration (seconds), sample_rate, channels and format
+    """
+    import soundfile
+
+    try:
+        info = soundfile.info(audio_path)
+        return {
+            "duration": float(info.duration),
+            "sample_rate": int(info.samplerate),
+            "channels": int(info.channels),
+            "format": info.format,
+        }
+    except RuntimeError:
+        pass
+
+    import audioread
+
+    # Opening only reads the container header; no samples are pulled
+    with audioread.audio_open(audio_path) as f:
+        return {
+            "duration": float(f.duration),
+            "sample_rate": int(f.samplerate),
+            "channels": int(f.channels),
+            "format": type(f).__name__,
+        }
+
+
+def _decode_native(audio_path):
+    import soundfile
+
+    blocks = []
+    with soundfile.SoundFile(audio_path) as f:
+        sample_rate = f.samplerate
+        for block in f.blocks(blocksize=BLOCK_FRAMES, dtype="float32", always_2d=True):
+            blocks.append(block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0].copy())
+    return blocks, sample_rate
+
+
+def _decode_audioread(audio_path):
+    import audioread
+
+    blocks = []
+    with audioread.audio_open(audio_path) as f:
+        sample_rate, channels = f.samplerate, f.channels
+        for buffer in f:
+            # Signed 16-bit little-endian PCM, interleaved
+            block = np.frombuffer(buffer, dtype="<i2").astype(np.float32) / 32768.0
+            blocks.append(block.reshape(-1, channels).mean(axis=1, dtype=np.float32) if channels > 1 else block)
+    return blocks, sample_rate
+
+
+def decode_audio(audio_path: str, sample_rate=22050, resample=None):
+    """Decode an audio file to float32 mono samples at `sample_rate`.
+
+    Args:
+        audio_path: Path to the audio file
+        sample_rate: Target sample rate (None = keep the file's rate)
+        resample: Resampling mode from RESAMPLE_MODES (None = RESAMPLE_MODE default)
+
+    Returns:
+        (samples, sample_rate) with samples as a 1-D float32 array
+    """
+    resampler = get_resampler(resample)
+    try:
+        blocks, native_sr = _decode_native(audio_path)
+    except RuntimeError:
+        # Not a format libsndfile understands (e.g. M4A)
+        blocks, native_sr = _decode_audioread(audio_path)
+
+    y = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    if sample_rate is None or sample_rate == native_sr:
+        return y, native_sr
+    return resampler(y, native_sr, sample_rate), sample_rate
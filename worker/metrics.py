@@ -0,0 +1,209 @@
+"""Queue, throughput and processing-time metrics for autoscaling.
+
+Workers record events as they run jobs (see MetricsWorker in worker.worker):
+
+    - started/finished/failed counts per queue in one-minute buckets
+      (``audiogen:metrics:<event>:<queue>:<minute>``, expiring after an hour
+      and two minutes, the longest window plus the current bucket)
+    - the processing time of the last PROCESSING_SAMPLES successful jobs per
+      duration class (``audiogen:metrics:processing:<class>``)
+    - their processing seconds per second of audio
+      (``audiogen:metrics:processing_rate``, used for upload ETAs)
+
+collect_metrics() reads those plus queue depth, oldest-job age, registry sizes
+and worker counts in two pipelined round trips, with no per-job scans, so it
+is cheap enough to scrape every few seconds.
+"""
+import time
+from datetime import datetime
+
+from rq.job import Job
+from rq.utils import utcparse
+from rq.worker_registration import REDIS_WORKER_KEYS, WORKERS_BY_QUEUE_KEY
+
+METRICS_PREFIX = "audiogen:metrics"
+EVENTS = ("started", "finished", "failed")
+BUCKET_SECONDS = 60
+BUCKET_TTL = 3600 + 2 * BUCKET_SECONDS
+PROCESSING_SAMPLES = 100
+PROCESSING_RATE_KEY = f"{METRICS_PREFIX}:processing_rate"
+
+# Duration class -> upper bound on audio length in seconds (None = unbounded)
+DURATION_CLASSES = {
+    "short": 60,
+    "medium": 300,
+    "long": None,
+}
+# Jobs without audio (re-renders) and jobs whose audio length is unknown
+OTHER_CLASSES = ("render", "unknown")
+
+
+def duration_class(audio_seconds) -> str:
+    """Duration class name for an audio length (None = "unknown")."""
+    if audio_seconds is None:
+        return "unknown"
+    for name, limit in DURATION_CLASSES.items():
+        if limit is None or audio_seconds < limit:
+            return name
+
+
+def job_duration_class(job) -> str:
+    if job.func_name == "worker.tasks.rerender_musicxml":
+        return "render"
+    return duration_class(job.meta.get("audio_seconds"))
+
+
+def _event_key(event, queue_name, bucket):
+    return f"{METRICS_PREFIX}:{event}:{queue_name}:{bucket}"
+
+
+def _processing_key(name):
+    return f"{METRICS_PREFIX}:processing:{name}"
+
+
+def record_event(connection, queue_name: str, event: str, now=None) -> None:
+    """Count a job event in the current minute bucket."""
+    bucket = int((time.time() if now is None else now) // BUCKET_SECONDS)
+    key = _event_key(event, queue_name, bucket)
+    with connection.pipeline() as pipeline:
+        pipeline.incr(key)
+        pipeline.expire(key, BUCKET_TTL)
+        pipeline.execute()
+
+
+def record_processing_time(connection, job) -> None:
+    """Add a finished job's processing time (and rate per second of audio) to the samples."""
+    if not job.started_at or not job.ended_at:
+        return
+    seconds = (job.ended_at - job.started_at).total_seconds()
+    key = _processing_key(job_duration_class(job))
+    audio_seconds = job.meta.get("audio_seconds")
+    with connection.pipeline() as pipeline:
+        pipeline.lpush(key, f"{seconds:.3f}")
+        pipeline.ltrim(key, 0, PROCESSING_SAMPLES - 1)
+        if audio_seconds and job_duration_class(job) != "render":
+            pipeline.lpush(PROCESSING_RATE_KEY, f"{seconds / audio_seconds:.4f}")
+            pipeline.ltrim(PROCESSING_RATE_KEY, 0, PROCESSING_SAMPLES - 1)
+        pipeline.execute()
+
+
+def collect_metrics(connection, queues, window_minutes: int = 5, now=None) -> dict:
+    """Snapshot of queue depth, throughput and processing time.
+
+    Args:
+        connection: Redis connection
+        queues: RQ queues to report on
+        window_minutes: Complete minutes of event buckets averaged into the rates
+        now: Current time as a Unix timestamp (None = time.time())
+
+    Returns:
+        Dict with per-queue depth, oldest job age, registry sizes, workers and
+        per-minute event rates, total worker count, and moving averages of
+        processing time per duration class
+    """
+    now = time.time() if now is None else now
+    current = int(now // BUCKET_SECONDS)
+    # Complete buckets only: a few seconds of the current minute would make short windows jumpy
+    buckets = range(current - window_minutes, current)
+    window_seconds = window_minutes * BUCKET_SECONDS
+    classes = list(DURATION_CLASSES) + list(OTHER_CLASSES)
+
+    with connection.pipeline(transaction=False) as pipeline:
+        for queue in queues:
+            pipeline.llen(queue.key)
+            pipeline.lindex(queue.key, 0)
+            pipeline.zcard(queue.started_job_registry.key)
+            pipeline.zcard(queue.scheduled_job_registry.key)
+            pipeline.zcard(queue.failed_job_registry.key)
+            pipeline.scard(WORKERS_BY_QUEUE_KEY % queue.name)
+            for event in EVENTS:
+                pipeline.mget([_event_key(event, queue.name, bucket) for bucket in buckets])
+        pipeline.scard(REDIS_WORKER_KEYS)
+        for name in classes:
+            pipeline.lrange(_processing_key(name), 0, -1)
+        pipeline.lrange(PROCESSING_RATE_KEY, 0, -1)
+        replies = iter(pipeline.execute())
+
+    report = {}
+    heads = {}
+    for queue in queues:
+        depth, head, started, scheduled, failed, workers = (next(replies) for _ in range(6))
+        rates = {}
+        for event in EVENTS:
+            count = sum(int(value) for value in next(replies) if value)
+            rates[f"{event}_per_minute"] = count * 60.0 / window_seconds
+        if head:
+            heads[queue.name] = head.decode() if isinstance(head, bytes) else head
+        report[queue.name] = {
+            "depth": depth,
+            "oldest_job_age_seconds": None,
+            "started": started,
+            "scheduled": scheduled,
+            "failed": failed,
+            "workers": workers,
+            **rates,
+        }
+    total_workers = next(replies)
+    processing = {}
+    for name in classes:
+        samples = [float(value) for value in next(replies)]
+        processing[name] = {
+            "samples": len(samples),
+            "avg_seconds": sum(samples) / len(samples) if samples else None,
+            "last_seconds": samples[0] if samples else None,
+        }
+    rates = [float(value) for value in next(replies)]
+
+    # Second round trip: enqueue time of each queue's head job
+    if heads:
+        with connection.pipeline(transaction=False) as pipeline:
+            for job_id in heads.values():
+                pipeline.hget(Job.key_for(job_id), "enqueued_at")
+            enqueued = pipeline.execute()
+        utc_now = datetime.utcfromtimestamp(now)
+        for name, value in zip(heads, enqueued):
+            if value:
+                age = (utc_now - utcparse(value.decode() if isinstance(value, bytes) else value)).total_seconds()
+                report[name]["oldest_job_age_seconds"] = max(0.0, age)
+
+    return {
+        "timestamp": now,
+        "window_minutes": window_minutes,
+        "workers": total_workers,
+        "queues": report,
+        "processing_time": processing,
+        # Processing seconds per second of audio
+        "processing_rate": {
+            "samples": len(rates),
+            "avg": sum(rates) / len(rates) if rates else None,
+        },
+    }
+
+
+def to_prometheus(metrics: dict) -> str:
+    """Render collect_metrics() output in the Prometheus text exposition format."""
+    lines = [
+        "# TYPE audiogen_workers gauge",
+        f"audiogen_workers {metrics['workers']}",
+    ]
+    queue_gauges = [
+        ("queue_depth", "depth"),
+        ("queue_oldest_job_age_seconds", "oldest_job_age_seconds"),
+        ("queue_started_jobs", "started"),
+        ("queue_scheduled_jobs", "scheduled"),
+        ("queue_failed_jobs", "failed"),
+        ("queue_workers", "workers"),
+    ] + [(f"queue_{event}_per_minute", f"{event}_per_minute") for event in EVENTS]
+    for metric, field in queue_gauges:
+        lines.append(f"# TYPE audiogen_{metric} gauge")
+        for name, queue in metrics["queues"].items():
+            value = queue[field]
+            lines.append(f'audiogen_{metric}{{queue="{name}"}} {0 if value is None else value}')
+    lines.append("# TYPE audiogen_processing_seconds_avg gauge")
+    for name, stats in metrics["processing_time"].items():
+        if stats["avg_seconds"] is not None:
+            lines.append(f'audiogen_processing_seconds_avg{{duration_class="{name}"}} {stats["avg_seconds"]:.3f}')
+    if metrics["processing_rate"]["avg"] is not None:
+        lines.append("# TYPE audiogen_processing_seconds_per_audio_second gauge")
+        lines.append(f"audiogen_processing_seconds_per_audio_second {metrics['processing_rate']['avg']:.4f}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,315 @@
+"""Render detected notes as MusicXML.
+
+Notes are placed on the quantization grid at the sequence tempo and laid out
+in 4/4 measures. The divisions per quarter note follow the grid and swing
+(see worker.quantize.get_divisions), so 1/32 grids and swung positions are
+kept; swung positions that fall on thirds of a subdivision are notated as
+triplets. Notes that cross a barline or have no single notated value are
+split into tied pieces; gaps become rests.
+"""
+from fractions import Fraction
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from worker.quantize import get_divisions
+from worker.score_index import BEATS_PER_MEASURE, empty_measure_xml
+
+# Notated values, longest first: (length in quarter notes, type, dotted)
+NOTE_VALUES = [
+    (Fraction(4), "whole", False),
+    (Fraction(3), "half", True),
+    (Fraction(2), "half", False),
+    (Fraction(3, 2), "quarter", True),
+    (Fraction(1), "quarter", False),
+    (Fraction(3, 4), "eighth", True),
+    (Fraction(1, 2), "eighth", False),
+    (Fraction(3, 8), "16th", True),
+    (Fraction(1, 4), "16th", False),
+    (Fraction(3, 16), "32nd", True),
+    (Fraction(1, 8), "32nd", False),
+    (Fraction(1, 16), "64th", False),
+    (Fraction(1, 32), "128th", False),
+]
+# (actual, normal) notes of a triplet
+TRIPLET = (3, 2)
+
+# General MIDI drum pitch -> (name, display step, display octave, notehead)
+DRUM_KIT = {
+    36: ("Kick", "F", 4, ""),
+    38: ("Snare", "C", 5, ""),
+    42: ("Closed Hi-Hat", "G", 5, "x"),
+}
+
+PITCH_NAMES = [
+    ("C", 0), ("C", 1), ("D", 0), ("D", 1), ("E", 0), ("F", 0),
+    ("F", 1), ("G", 0), ("G", 1), ("A", 0), ("A", 1), ("B", 0),
+]
+
+
+@lru_cache(maxsize=None)
+def _note_values(divisions):
+    """(length in divisions, type, dotted, tuplet) of every value notatable at `divisions`, longest first."""
+    values = [(length, note_type, dotted, None) for length, note_type, dotted in NOTE_VALUES]
+    actual, normal = TRIPLET
+    values += [
+        (length * normal / actual, note_type, False, TRIPLET)
+        for length, note_type, dotted in NOTE_VALUES if not dotted
+    ]
+    values = [
+        (int(length * divisions), note_type, dotted, tuplet)
+        for length, note_type, dotted, tuplet in values
+        if (length * divisions).denominator == 1
+    ]
+    # Stable: plain values come before triplets of the same length
+    return sorted(values, key=lambda value: -value[0])
+
+
+def _split_value(steps, divisions):
+    """Split a length in divisions into notatable values, longest first."""
+    pieces = []
+    while steps > 0:
+        for value in _note_values(divisions):
+            if value[0] <= steps:
+                pieces.append(value)
+                steps -= value[0]
+                break
+        else:
+            raise ValueError(f"No notated value fits {steps}/{divisions} of a quarter note")
+    return pieces
+
+
+def _to_events(notes, qpm, divisions, sustain_steps=0):
+    """Group a NoteTable into grid events: (start_step, length_steps, [pitches]).
+
+    Steps are 1/`divisions` of a quarter note. Notes starting on the same
+    step form a chord; each event is cut off at the next event's start so the
+    part stays a single voice. With `sustain_steps`, events are instead held
+    until the next event, up to that many steps (drum hits have no meaningful
+    length of their own).
+    """
+    if not len(notes):
+        return []
+    step_seconds = 60.0 / qpm / divisions
+    starts = np.rint(notes.start / step_seconds).astype(np.int64)
+    ends = np.maximum(starts + 1, np.rint(notes.end / step_seconds).astype(np.int64))
+
+    order = np.lexsort((notes.pitch, starts))
+    starts, ends, pitches = starts[order], ends[order], notes.pitch[order]
+    chord_starts, first = np.unique(starts, return_index=True)
+    chord_ends = np.minimum.reduceat(ends, first)
+    if sustain_steps:
+        chord_ends = np.maximum(chord_ends, chord_starts + sustain_steps)
+    chord_ends[:-1] = np.minimum(chord_ends[:-1], chord_starts[1:])
+
+    # Drop repeated pitches within a chord (rows are sorted by start, then pitch)
+    keep = np.ones(len(pitches), dtype=bool)
+    keep[1:] = (starts[1:] != starts[:-1]) | (pitches[1:] != pitches[:-1])
+    bounds = np.cumsum(keep)[np.append(first[1:], len(keep)) - 1].tolist()
+    pitch_list = pitches[keep].tolist()
+
+    events = []
+    lower = 0
+    for start, end, upper in zip(chord_starts.tolist(), chord_ends.tolist(), bounds):
+        events.append((start, end - start, pitch_list[lower:upper]))
+        lower = upper
+    return events
+
+
+def _pitch_xml(pitch):
+    step, alter = PITCH_NAMES[int(pitch) % 12]
+    octave = int(pitch) // 12 - 1
+    alter_xml = f"<alter>{alter}</alter>" if alter else ""
+    return f"<pitch><step>{step}</step>{alter_xml}<octave>{octave}</octave></pitch>"
+
+
+def _time_modification_xml(tuplet):
+    if tuplet is None:
+        return ""
+    actual, normal = tuplet
+    return f"<time-modification><actual-notes>{actual}</actual-notes><normal-notes>{normal}</normal-notes></time-modification>"
+
+
+def _note_xml(head, length, note_type, dotted, tuplet=None, chord=False, tie_stop=False, tie_start=False,
+              instrument="", notehead=""):
+    parts = ["<note>"]
+    if chord:
+        parts.append("<chord/>")
+    parts.append(head)
+    parts.append(f"<duration>{length}</duration>")
+    if tie_stop:
+        parts.append('<tie type="stop"/>')
+    if tie_start:
+        parts.append('<tie type="start"/>')
+    parts.append(instrument)
+    parts.append("<voice>1</voice>")
+    parts.append(f"<type>{note_type}</type>")
+    if dotted:
+        parts.append("<dot/>")
+    parts.append(_time_modification_xml(tuplet))
+    parts.append(notehead)
+    if tie_stop or tie_start:
+        tied = ('<tied type="stop"/>' if tie_stop else "") + ('<tied type="start"/>' if tie_start else "")
+        parts.append(f"<notations>{tied}</notations>")
+    parts.append("</note>")
+    return "".join(parts)
+
+
+def _rest_xml(steps, divisions):
+    return "".join(
+        f"<note><rest/><duration>{length}</duration><voice>1</voice>"
+        f"<type>{note_type}</type>{'<dot/>' if dotted else ''}{_time_modification_xml(tuplet)}</note>"
+        for length, note_type, dotted, tuplet in _split_value(steps, divisions)
+    )
+
+
+def _render_measures(events, head_for, attributes_xml, divisions):
+    """Lay grid events out as <measure> elements.
+
+    Args:
+        events: (start_step, length_steps, pitches) tuples, sorted and non-overlapping
+        head_for: Callable returning (head_xml, instrument_xml, notehead_xml) for one pitch
+        attributes_xml: <attributes> block for the first measure
+        divisions: Steps per quarter note
+
+    Returns:
+        List of <measure> XML strings (at least one)
+    """
+    steps_per_measure = BEATS_PER_MEASURE * divisions
+    total_steps = max((start + length for start, length, _ in events), default=0)
+    n_measures = max(1, -(-total_steps // steps_per_measure))
+    measures = [[] for _ in range(n_measures)]
+    cursors = [0] * n_measures
+
+    for start, length, pitches in events:
+        position = start
+        remaining = length
+        while remaining > 0:
+            index = position // steps_per_measure
+            offset = position % steps_per_measure
+            if offset > cursors[index]:
+                measures[index].append(_rest_xml(offset - cursors[index], divisions))
+            span = min(remaining, steps_per_measure - offset)
+            pieces = _split_value(span, divisions)
+            for piece, note_type, dotted, tuplet in pieces:
+                tie_stop = position > start
+                tie_start = remaining - piece > 0
+                for chord_index, pitch in enumerate(pitches):
+                    head, instrument, notehead = head_for(pitch)
+                    measures[index].append(_note_xml(
+                        head, piece, note_type, dotted, tuplet=tuplet, chord=chord_index > 0,
+                        tie_stop=tie_stop, tie_start=tie_start, instrument=instrument, notehead=notehead
+                    ))
+                position += piece
+                remaining -= piece
+            cursors[index] = offset + span
+
+    xml = []
+    for index, content in enumerate(measures):
+        if cursors[index] < steps_per_measure:
+            content.append(_rest_xml(steps_per_measure - cursors[index], divisions))
+        attributes = attributes_xml if index == 0 else ""
+        xml.append(f'<measure number="{index + 1}">{attributes}{"".join(content)}</measure>')
+    return xml
+
+
+def _tempo_xml(qpm):
+    return (
+        f'<direction placement="above"><direction-type><metronome><beat-unit>quarter</beat-unit>'
+        f"<per-minute>{qpm:g}</per-minute></metronome></direction-type>"
+        f'<sound tempo="{qpm:g}"/></direction>'
+    )
+
+
+def _melody_part(part_id, notes, qpm, divisions):
+    attributes = (
+        f"<attributes><divisions>{divisions}</divisions><key><fifths>0</fifths></key>"
+        "<time><beats>4</beats><beat-type>4</beat-type></time>"
+        "<clef><sign>G</sign><line>2</line></clef></attributes>"
+        + _tempo_xml(qpm)
+    )
+    measures = _render_measures(
+        _to_events(notes, qpm, divisions), lambda pitch: (_pitch_xml(pitch), "", ""), attributes, divisions
+    )
+    score_part = f'<score-part id="{part_id}"><part-name>Melody</part-name></score-part>'
+    return score_part, measures
+
+
+def _drum_part(part_id, hits, qpm, divisions):
+    hits = hits.select(np.isin(hits.pitch, list(DRUM_KIT)))
+    used = np.unique(hits.pitch).tolist()
+    instruments = "".join(
+        f'<score-instrument id="{part_id}-I{pitch}"><instrument-name>{DRUM_KIT[pitch][0]}</instrument-name></score-instrument>'
+        for pitch in used
+    ) + "".join(
+        # midi-unpitched is 1-based
+        f'<midi-instrument id="{part_id}-I{pitch}"><midi-channel>10</midi-channel>'
+        f"<midi-unpitched>{pitch + 1}</midi-unpitched></midi-instrument>"
+        for pitch in used
+    )
+    score_part = (
+        f'<score-part id="{part_id}"><part-name>Drum Set</part-name>{instruments}</score-part>'
+    )
+
+    def head_for(pitch):
+        _, step, octave, notehead = DRUM_KIT[int(pitch)]
+        head = f"<unpitched><display-step>{step}</display-step><display-octave>{octave}</display-octave></unpitched>"
+        notehead_xml = f"<notehead>{notehead}</notehead>" if notehead else ""
+        return head, f'<instrument id="{part_id}-I{int(pitch)}"/>', notehead_xml
+
+    attributes = (
+        f"<attributes><divisions>{divisions}</divisions>"
+        "<time><beats>4</beats><beat-type>4</beat-type></time>"
+        "<clef><sign>percussion</sign><line>2</line></clef>"
+        "<staff-details><staff-lines>5</staff-lines></staff-details></attributes>"
+        + _tempo_xml(qpm)
+    )
+    # Hits ring for up to a quarter note
+    events = _to_events(hits, qpm, divisions, sustain_steps=divisions)
+    return score_part, _render_measures(events, head_for, attributes, divisions)
+
+
+def notes_to_musicxml(notes, title, qpm=120.0, drums=None, grid="1/16", swing=0.0):
+    """Render detected notes as a MusicXML score.
+
+    Args:
+        notes: NoteTable of pitched notes
+        title: Work title
+        qpm: Tempo in quarter notes per minute used to map seconds to beats
+        drums: Optional NoteTable of drum hits with General MIDI drum pitches;
+            rendered as a percussion part ahead of the melody
+        grid: Grid name the notes were quantized to (see worker.quantize.GRIDS)
+        swing: Swing amount they were quantized with
+
+    Returns:
+        MusicXML string
+    """
+    divisions = get_divisions(grid, swing)
+    parts = []
+    if drums is not None:
+        parts.append(_drum_part(f"P{len(parts) + 1}", drums, qpm, divisions))
+    if notes or not parts:
+        parts.append(_melody_part(f"P{len(parts) + 1}", notes, qpm, divisions))
+
+    # Parts are laid out from their own notes; pad them to a common length as readers expect
+    n_measures = max(len(measures) for _, measures in parts)
+    for _, measures in parts:
+        measures.extend(empty_measure_xml(number, divisions) for number in range(len(measures) + 1, n_measures + 1))
+
+    part_list = "".join(score_part for score_part, _ in parts)
+    body = "\n".join(
+        f'  <part id="P{index + 1}">\n    ' + "\n    ".join(measures) + "\n  </part>"
+        for index, (_, measures) in enumerate(parts)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!DOCTYPE score-partwise PUBLIC\n'
+        '  "-//Recordare//DTD MusicXML 3.1 Partwise//EN"\n'
+        '  "http://www.musicxml.org/dtds/partwise.dtd">\n'
+        '<score-partwise version="3.1">\n'
+        f"  <work><work-title>{escape(title)}</work-title></work>\n"
+        f"  <part-list>{part_list}</part-list>\n"
+        f"{body}\n"
+        "</score-partwise>\n"
+    )
@@ -0,0 +1,109 @@
+"""Columnar note table: the pipeline's internal note format.
+
+Detected notes and drum hits are kept as parallel NumPy columns (start, end,
+pitch, velocity, instrument) so quantization and rendering work on whole
+arrays. NoteSequence protobufs and tuple lists are only built at the edges
+that need them (MIDI export, debugging output) via the bulk converters here.
+"""
+import numpy as np
+
+DRUM_INSTRUMENT = 9  # General MIDI percussion channel (0-based)
+
+COLUMNS = ("start", "end", "pitch", "velocity", "instrument")
+
+
+class NoteTable:
+    """Notes as parallel arrays; times in seconds, pitch/velocity/instrument as int."""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, start=(), end=(), pitch=(), velocity=(), instrument=None):
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.pitch = np.asarray(pitch, dtype=np.int16)
+        self.velocity = np.asarray(velocity, dtype=np.int16)
+        if instrument is None or np.ndim(instrument) == 0:
+            instrument = np.full(len(self.start), instrument or 0, dtype=np.int16)
+        self.instrument = np.asarray(instrument, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __repr__(self):
+        return f"NoteTable({len(self)} notes)"
+
+    @classmethod
+    def from_tuples(cls, notes, instrument=0):
+        """Build a table from (start_time, end_time, pitch, velocity) tuples."""
+        rows = np.asarray(list(notes), dtype=np.float64).reshape(-1, 4)
+        return cls(rows[:, 0], rows[:, 1], np.rint(rows[:, 2]), np.rint(rows[:, 3]), instrument)
+
+    @classmethod
+    def from_dict(cls, columns):
+        """Inverse of to_dict (also accepts a plain list of note tuples)."""
+        if isinstance(columns, list):
+            return cls.from_tuples(columns)
+        return cls(*(columns[name] for name in COLUMNS))
+
+    @classmethod
+    def from_note_sequence(cls, ns):
+        """Bulk conversion from a note_seq NoteSequence."""
+        notes = ns.notes
+        rows = np.array(
+            [(n.start_time, n.end_time, n.pitch, n.velocity, n.instrument) for n in notes], dtype=np.float64
+        ).reshape(-1, 5)
+        return cls(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4])
+
+    @classmethod
+    def concat(cls, tables):
+        tables = list(tables)
+        if not tables:
+            return cls()
+        return cls(*(np.concatenate([getattr(table, name) for table in tables]) for name in COLUMNS))
+
+    def with_times(self, start, end):
+        """Copy of the table with new start/end columns (other columns shared)."""
+        return NoteTable(start, end, self.pitch, self.velocity, self.instrument)
+
+    def select(self, mask):
+        """Rows where `mask` (boolean array or index array) selects."""
+        return NoteTable(*(getattr(self, name)[mask] for name in COLUMNS))
+
+    def sorted(self):
+        """Rows ordered by start time, then pitch."""
+        return self.select(np.lexsort((self.pitch, self.start)))
+
+    def to_tuples(self):
+        """(start_time, end_time, pitch, velocity) tuples with Python scalars."""
+        return list(zip(self.start.tolist(), self.end.tolist(), self.pitch.tolist(), self.velocity.tolist()))
+
+    def to_dict(self):
+        """JSON-serializable columns."""
+        return {name: getattr(self, name).tolist() for name in COLUMNS}
+
+    def to_note_sequence(self, qpm=120.0, time_signature=(4, 4)):
+        """Bulk conversion to a note_seq NoteSequence (only for MIDI edges).
+
+        Args:
+            qpm: Tempo written to the sequence
+            time_signature: (numerator, denominator), or None for none
+
+        Returns:
+            NoteSequence with one note per row; rows on DRUM_INSTRUMENT are drums
+        """
+        import note_seq
+
+        ns = note_seq.NoteSequence()
+        ns.tempos.add(time=0, qpm=qpm)
+        if time_signature:
+            ns.time_signatures.add(time=0, numerator=time_signature[0], denominator=time_signature[1])
+
+        add = ns.notes.add
+        instruments = self.instrument.tolist()
+        for start, end, pitch, velocity, instrument in zip(
+            self.start.tolist(), self.end.tolist(), self.pitch.tolist(), self.velocity.tolist(), instruments
+        ):
+            add(start_time=start, end_time=end, pitch=pitch, velocity=velocity,
+                instrument=instrument, is_drum=instrument == DRUM_INSTRUMENT)
+        ns.total_time = float(self.end.max()) if len(self) else 0.0
+        return ns
@@ -0,0 +1,395 @@
+"""Pitch estimators and the registry the transcription pipeline picks them from.
+
+Every estimator shares one signature and frame grid (centered frames of
+``n_fft`` samples every ``hop_length``), so they are interchangeable:
+
+    estimator(y, sr, fmin, fmax, n_fft=2048, hop_length=512, relaxed=False)
+        -> (pitch_track, confidence)
+
+``pitch_track`` holds one frequency in Hz per frame (0.0 where unvoiced).
+``relaxed=True`` lowers the voicing requirements; it is used for the retry
+over the harmonic component when too few frames are voiced.
+"""
+import numpy as np
+from scipy.signal import get_window
+
+from worker.config import get_pitch_estimator_name
+
+PITCH_ESTIMATORS = {}
+
+
+def register_pitch_estimator(name):
+    """Decorator adding an estimator to ``PITCH_ESTIMATORS`` under `name`."""
+    def decorator(fn):
+        PITCH_ESTIMATORS[name] = fn
+        return fn
+    return decorator
+
+
+def get_pitch_estimator(name=None):
+    """Look up an estimator by name, falling back to the configured default.
+
+    Raises:
+        ValueError: If no estimator is registered under the name
+    """
+    name = name or get_pitch_estimator_name()
+    try:
+        return PITCH_ESTIMATORS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown pitch estimator '{name}'. Available: {', '.join(sorted(PITCH_ESTIMATORS))}"
+        ) from None
+
+
+def frame_signal(y, n_fft=2048, hop_length=512):
+    """Centered, reflect-padded frames of `y` as a read-only strided view.
+
+    Matches the framing of ``librosa.stft`` in the pinned librosa 0.7.2
+    (``pad_mode="reflect"``) without copying samples. librosa 0.10+ pads with
+    zeros by default; reflect padding is kept on purpose so the analysis does
+    not change with the librosa version. The two only differ in the first and
+    last ``n_fft // (2 * hop_length)`` or so frames.
+
+    Returns:
+        Array of shape (n_frames, n_fft); n_frames may be 0
+    """
+    y = np.ascontiguousarray(y, dtype=np.float32)
+    y_pad = np.pad(y, n_fft // 2, mode="reflect")
+    n_frames = max(0, 1 + (len(y_pad) - n_fft) // hop_length)
+    return np.lib.stride_tricks.as_strided(
+        y_pad,
+        shape=(n_frames, n_fft),
+        strides=(y_pad.strides[0] * hop_length, y_pad.strides[0]),
+        writeable=False,
+    )
+
+
+def stft_magnitude_batches(y, n_fft=2048, hop_length=512, batch_frames=128):
+    """Yield STFT magnitude blocks of at most `batch_frames` frames.
+
+    Framing matches ``librosa.stft(y, pad_mode="reflect")`` (centered, periodic
+    Hann window; see frame_signal), so concatenating the blocks gives its
+    magnitude.
+    Only one ``(n_fft/2+1) x batch_frames`` block is alive at a time.
+
+    Args:
+        y: Mono audio samples
+        n_fft: FFT frame length
+        hop_length: Hop length between frames
+        batch_frames: Number of frames per yielded block
+
+    Yields:
+        (first_frame_index, magnitude_block) tuples
+    """
+    frames = frame_signal(y, n_fft=n_fft, hop_length=hop_length)
+    window = get_window("hann", n_fft, fftbins=True).astype(np.float32)
+    for start in range(0, len(frames), batch_frames):
+        block = frames[start:start + batch_frames] * window
+        magnitude = np.abs(np.fft.rfft(block, axis=1)).astype(np.float32, copy=False)
+        yield start, magnitude.T
+
+
+def _n_frames(n_samples, n_fft, hop_length):
+    return max(0, 1 + (n_samples + 2 * (n_fft // 2) - n_fft) // hop_length)
+
+
+def frame_rms(y, n_fft=2048, hop_length=512):
+    """RMS of every frame on the estimator frame grid, in O(len(y)).
+
+    Uses a running sum of squares over the same reflect-padded signal as
+    ``frame_signal`` instead of touching every frame's samples.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n_frames = _n_frames(len(y), n_fft, hop_length)
+    if n_frames == 0 or len(y) <= n_fft // 2:
+        return np.sqrt(np.mean(frame_signal(y, n_fft, hop_length).astype(np.float64) ** 2, axis=1))
+    y_pad = np.pad(y, n_fft // 2, mode="reflect")
+    energy = np.concatenate(([0.0], np.cumsum(y_pad * y_pad)))
+    offsets = np.arange(n_frames) * hop_length
+    return np.sqrt(np.maximum(energy[offsets + n_fft] - energy[offsets], 0.0) / n_fft)
+
+
+def active_regions(y, sr, n_fft=2048, hop_length=512, top_db=60.0, min_gap=0.5, pad=0.25):
+    """Frame ranges that hold audible content, for skipping silence before pitch analysis.
+
+    A frame is active when its RMS is within `top_db` of the loudest frame.
+    Active frames are widened by `pad` seconds on each side (to keep soft
+    attacks and decays) and gaps shorter than `min_gap` seconds are bridged.
+
+    Args:
+        y: Mono audio samples
+        sr: Sample rate of audio
+        n_fft: FFT frame length
+        hop_length: Hop length between frames
+        top_db: Threshold below the loudest frame, in dB (None or 0 = no gating)
+        min_gap: Shortest silence, in seconds, that splits two regions
+        pad: Seconds kept on each side of active frames
+
+    Returns:
+        (regions, n_frames): list of (first_frame, end_frame) ranges and the
+        total number of frames
+    """
+    rms = frame_rms(y, n_fft=n_fft, hop_length=hop_length)
+    n_frames = len(rms)
+    if not top_db:
+        return ([(0, n_frames)] if n_frames else []), n_frames
+    peak = rms.max() if n_frames else 0.0
+    if peak <= 0:
+        return [], n_frames
+
+    active = rms > peak * 10.0 ** (-top_db / 20.0)
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], active, [False])).astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+
+    pad_frames = int(round(pad * sr / hop_length))
+    gap_frames = int(round(min_gap * sr / hop_length))
+    starts = np.maximum(starts - pad_frames, 0)
+    ends = np.minimum(ends + pad_frames, n_frames)
+    # A region starts wherever the gap to the previous one is long enough
+    keep = np.concatenate(([True], starts[1:] - ends[:-1] >= gap_frames))
+    region_ends = np.concatenate((ends[np.flatnonzero(keep)[1:] - 1], ends[-1:]))
+    return list(zip(starts[keep].tolist(), region_ends.tolist())), n_frames
+
+
+def run_on_regions(fn, y, regions, n_frames, n_fft=2048, hop_length=512):
+    """Run a per-frame analysis on active regions only, in absolute frame positions.
+
+    Each region is analysed with enough real samples around it that its
+    frames see exactly the samples they would in a full-length run; frames
+    outside every region are left at 0.
+
+    Args:
+        fn: Callable taking a sample segment and returning a tuple of per-frame arrays
+            on the estimator frame grid (e.g. ``lambda seg: estimate(seg, sr, ...)``)
+        y: Mono audio samples
+        regions: (first_frame, end_frame) ranges from ``active_regions``
+        n_frames: Total number of frames of `y`
+        n_fft: FFT frame length
+        hop_length: Hop length between frames
+
+    Returns:
+        Tuple of arrays of length `n_frames`, one per array returned by `fn`
+    """
+    context = -(-(n_fft // 2) // hop_length)
+    tracks = None
+    for first, end in regions:
+        lead = min(first, context)
+        segment = y[(first - lead) * hop_length:min(len(y), (end - 1 + context) * hop_length + 1)]
+        results = fn(segment)
+        if tracks is None:
+            tracks = tuple(np.zeros(n_frames, dtype=np.float64) for _ in results)
+        for track, values in zip(tracks, results):
+            track[first:end] = values[lead:lead + end - first]
+    if tracks is None:
+        # Nothing to analyse; still return the shape fn would have produced
+        tracks = tuple(np.zeros(n_frames, dtype=np.float64) for _ in range(2))
+    return tracks
+
+
+def _pick_peaks(S, lo, hi, sr, n_fft, threshold):
+    """Best parabolic-interpolated peak per column of a magnitude block.
+
+    Reproduces ``librosa.piptrack`` followed by a per-frame argmax over
+    magnitudes, restricted to bins ``lo:hi`` (the fmin/fmax band).
+    """
+    ref = threshold * S.max(axis=0)
+    # Rows lo-1..hi are needed as neighbours for the local-max test and interpolation
+    window = S[lo - 1:hi + 1]
+    thresholded = window * (window > ref)
+
+    center = window[1:-1]
+    above = window[2:]
+    below = window[:-2]
+    avg = 0.5 * (above - below)
+    shift = 2 * center - above - below
+    shift = avg / (shift + (np.abs(shift) < np.finfo(shift.dtype).tiny))
+
+    t_center = thresholded[1:-1]
+    is_peak = (t_center > thresholded[:-2]) & (t_center >= thresholded[2:])
+
+    bins = np.arange(lo, hi, dtype=np.float32)[:, None]
+    pitches = (bins + shift) * float(sr) / n_fft
+    mags = center + 0.5 * avg * shift
+
+    candidates = is_peak & (pitches > 0)
+    masked = np.where(candidates, mags, -np.inf)
+    best = np.argmax(masked, axis=0)
+    cols = np.arange(S.shape[1])
+    has_pitch = candidates[best, cols]
+
+    pitch = np.where(has_pitch, pitches[best, cols], 0.0)
+    magnitude = np.where(has_pitch, mags[best, cols], 0.0)
+    return pitch, magnitude
+
+
+def track_pitch(y, sr, fmin, fmax, threshold=0.1, n_fft=2048, hop_length=512, batch_frames=128):
+    """Per-frame dominant pitch without materializing the piptrack matrices.
+
+    Numerically equivalent (up to float32 rounding) to running
+    ``librosa.piptrack(..., pad_mode="reflect")`` and taking the
+    highest-magnitude positive pitch in each frame, but peak memory is
+    O(frames) plus one STFT block instead of two dense
+    ``(n_fft/2+1) x n_frames`` arrays.
+
+    Args:
+        y: Mono audio samples
+        sr: Sample rate of audio
+        fmin: Lowest frequency (Hz) considered
+        fmax: Highest frequency (Hz) considered (exclusive)
+        threshold: Peaks below ``threshold * max(frame)`` are ignored
+        n_fft: FFT frame length
+        hop_length: Hop length between frames
+        batch_frames: Number of frames analysed per STFT block
+
+    Returns:
+        (pitch_track, magnitude_track) arrays of length n_frames; frames
+        without a peak have pitch 0.0
+    """
+    fmin = max(fmin, 0)
+    fmax = min(fmax, float(sr) / 2)
+    fft_freqs = np.linspace(0, float(sr) / 2, 1 + n_fft // 2)
+    band = np.flatnonzero((fmin <= fft_freqs) & (fft_freqs < fmax))
+
+    n_frames = _n_frames(len(y), n_fft, hop_length)
+    pitch_track = np.zeros(n_frames, dtype=np.float64)
+    magnitude_track = np.zeros(n_frames, dtype=np.float64)
+    if len(band) == 0:
+        return pitch_track, magnitude_track
+
+    # Bin 0 can never be a local max, so the band always has a lower neighbour
+    lo = max(int(band[0]), 1)
+    hi = int(band[-1]) + 1
+    for start, S in stft_magnitude_batches(y, n_fft=n_fft, hop_length=hop_length, batch_frames=batch_frames):
+        pitch, magnitude = _pick_peaks(S, lo, hi, sr, n_fft, threshold)
+        pitch_track[start:start + len(pitch)] = pitch
+        magnitude_track[start:start + len(magnitude)] = magnitude
+    return pitch_track, magnitude_track
+
+
+def _period_range(sr, fmin, fmax, n_fft):
+    """Lag search range in samples, leaving room for one neighbour on each side."""
+    min_period = max(1, int(np.floor(sr / fmax)))
+    max_period = min(int(np.ceil(sr / fmin)), n_fft - 2)
+    return min_period, max_period
+
+
+def _fft_size(n_fft, max_period):
+    """FFT length large enough that autocorrelation up to `max_period` does not wrap."""
+    return 1 << int(np.ceil(np.log2(n_fft + max_period + 1)))
+
+
+def _refine(values, best, rows):
+    """Parabolic offset (in lags) of the extremum at `best` within each row of `values`."""
+    left = values[rows, best - 1]
+    center = values[rows, best]
+    right = values[rows, best + 1]
+    denom = left - 2 * center + right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.where(np.abs(denom) > 0, 0.5 * (left - right) / denom, 0.0)
+    return np.clip(offset, -1.0, 1.0)
+
+
+@register_pitch_estimator("piptrack")
+def piptrack_estimator(y, sr, fmin, fmax, n_fft=2048, hop_length=512, relaxed=False):
+    """librosa.piptrack-equivalent peak picking (see ``track_pitch``).
+
+    Confidence is the interpolated peak magnitude.
+    """
+    return track_pitch(
+        y, sr, fmin, fmax,
+        threshold=0.05 if relaxed else 0.1,
+        n_fft=n_fft,
+        hop_length=hop_length
+    )
+
+
+@register_pitch_estimator("yin")
+def yin_estimator(y, sr, fmin, fmax, n_fft=2048, hop_length=512, relaxed=False, batch_frames=256):
+    """YIN (de Cheveigne & Kawahara, 2002) vectorized over frame batches.
+
+    The difference function comes from an FFT autocorrelation plus cumulative
+    energies; the first trough of the cumulative mean normalized difference
+    below the threshold gives the period. Frames without such a trough are
+    unvoiced. Confidence is ``1 - d'(period)``.
+    """
+    trough_threshold = 0.2 if relaxed else 0.1
+    min_period, max_period = _period_range(sr, fmin, fmax, n_fft)
+    n_fft_acf = _fft_size(n_fft, max_period)
+    lags = np.arange(max_period + 2)
+
+    frames = frame_signal(y, n_fft=n_fft, hop_length=hop_length)
+    pitch_track = np.zeros(len(frames), dtype=np.float64)
+    confidence = np.zeros(len(frames), dtype=np.float64)
+    for start in range(0, len(frames), batch_frames):
+        x = frames[start:start + batch_frames].astype(np.float64)
+        rows = np.arange(len(x))
+
+        spectrum = np.fft.rfft(x, n_fft_acf, axis=1)
+        acf = np.fft.irfft(spectrum * np.conj(spectrum), n_fft_acf, axis=1)[:, :max_period + 2]
+
+        # d(k) = sum_{j < N-k} (x_j - x_{j+k})^2 = E[:N-k] + E[k:] - 2 acf(k)
+        energy = np.zeros((len(x), n_fft + 1))
+        np.cumsum(x * x, axis=1, out=energy[:, 1:])
+        diff = energy[:, n_fft - lags] + (energy[:, -1:] - energy[:, lags]) - 2 * acf
+        diff[:, 0] = 0
+
+        # Cumulative mean normalized difference d'(k) = d(k) * k / sum_{j<=k} d(j)
+        cmnd = np.ones_like(diff)
+        cumulative = np.cumsum(diff[:, 1:], axis=1)
+        cmnd[:, 1:] = diff[:, 1:] * lags[1:] / (cumulative + np.finfo(np.float64).tiny)
+
+        search = cmnd[:, min_period:max_period + 1]
+        is_trough = (search <= cmnd[:, min_period - 1:max_period]) & (search < cmnd[:, min_period + 1:max_period + 2])
+        candidates = is_trough & (search < trough_threshold)
+        first = np.argmax(candidates, axis=1)
+        voiced = candidates[rows, first]
+
+        best = first + min_period
+        period = best + _refine(cmnd, best, rows)
+        pitch_track[start:start + len(x)] = np.where(voiced, sr / period, 0.0)
+        confidence[start:start + len(x)] = np.where(voiced, np.clip(1 - cmnd[rows, best], 0.0, 1.0), 0.0)
+    return pitch_track, confidence
+
+
+@register_pitch_estimator("autocorr")
+def autocorr_estimator(y, sr, fmin, fmax, n_fft=2048, hop_length=512, relaxed=False, batch_frames=256):
+    """Normalized FFT autocorrelation with window correction (Boersma, 1993).
+
+    The shortest lag whose autocorrelation peak is within 10% of the frame's
+    best peak is taken as the period, which avoids most sub-octave errors.
+    Frames whose peak falls below the voicing threshold are unvoiced.
+    Confidence is the normalized autocorrelation at the period.
+    """
+    voicing_threshold = 0.3 if relaxed else 0.5
+    min_period, max_period = _period_range(sr, fmin, fmax, n_fft)
+    n_fft_acf = _fft_size(n_fft, max_period)
+
+    window = get_window("hann", n_fft, fftbins=True)
+    window_spectrum = np.fft.rfft(window, n_fft_acf)
+    window_acf = np.fft.irfft(np.abs(window_spectrum) ** 2, n_fft_acf)[:max_period + 2]
+    window_acf = window_acf / window_acf[0]
+
+    frames = frame_signal(y, n_fft=n_fft, hop_length=hop_length)
+    pitch_track = np.zeros(len(frames), dtype=np.float64)
+    confidence = np.zeros(len(frames), dtype=np.float64)
+    for start in range(0, len(frames), batch_frames):
+        x = frames[start:start + batch_frames].astype(np.float64)
+        rows = np.arange(len(x))
+        x = (x - x.mean(axis=1, keepdims=True)) * window
+
+        spectrum = np.fft.rfft(x, n_fft_acf, axis=1)
+        acf = np.fft.irfft(np.abs(spectrum) ** 2, n_fft_acf, axis=1)[:, :max_period + 2]
+        acf = acf / (acf[:, :1] + np.finfo(np.float64).tiny) / window_acf
+
+        search = acf[:, min_period:max_period + 1]
+        is_peak = (search > acf[:, min_period - 1:max_period]) & (search >= acf[:, min_period + 1:max_period + 2])
+        strongest = np.max(np.where(is_peak, search, -np.inf), axis=1, keepdims=True)
+        candidates = is_peak & (search >= 0.9 * strongest) & (search >= voicing_threshold)
+        first = np.argmax(candidates, axis=1)
+        voiced = candidates[rows, first]
+
+        best = first + min_period
+        period = best + _refine(acf, best, rows)
+        pitch_track[start:start + len(x)] = np.where(voiced, sr / period, 0.0)
+        confidence[start:start + len(x)] = np.where(voiced, np.clip(acf[rows, best], 0.0, 1.0), 0.0)
+    return pitch_track, confidence
@@ -0,0 +1,112 @@
+"""Opt-in per-job profiling.
+
+A job is profiled when its upload asks for it (the ``profile`` form field) or
+when the API samples it (PROFILE_SAMPLE_PERCENT). A profiled job runs under
+cProfile and stores its profile next to the transcription in S3:
+
+    transcriptions/{song_id}/profiles/{profile_id}.prof   pstats dump (pstats, snakeviz)
+    transcriptions/{song_id}/profiles/{profile_id}.txt    top functions by cumulative time
+
+The profile is saved even when the job fails or times out, which is when it
+is most useful. Unprofiled jobs never import this module.
+
+Redis keys:
+    audiogen:profiles   recent profiles, newest first (JSON)
+"""
+import cProfile
+import io
+import json
+import pstats
+import random
+import time
+from datetime import datetime
+
+from rq import get_current_job
+
+from worker.config import get_profile_sample_percent
+from worker.s3_client import describe_artifact, get_profile_key, upload_file_to_s3
+from worker.spool import get_spool
+
+RECENT_PROFILES_KEY = "audiogen:profiles"
+RECENT_PROFILES_MAX_LENGTH = 1000
+TOP_FUNCTIONS = 50
+
+
+def should_profile(requested=None) -> bool:
+    """Whether to profile a new job: as requested, else sampled at PROFILE_SAMPLE_PERCENT."""
+    if requested is not None:
+        return requested
+    return random.random() * 100 < get_profile_sample_percent()
+
+
+def _summary(profiler, title: str) -> str:
+    out = io.StringIO()
+    out.write(f"{title}\n\n")
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+def save_profile(profiler, song_id: str, profile_id: str, title: str) -> dict:
+    """Upload a profile and its text summary. Returns the .prof artifact descriptor."""
+    spool = get_spool()
+    dump = spool.temp_path(".prof")
+    summary = spool.temp_path(".txt")
+    try:
+        profiler.dump_stats(str(dump))
+        summary.write_text(_summary(profiler, title))
+        key = upload_file_to_s3(str(dump), get_profile_key(song_id, profile_id, ".prof"))
+        upload_file_to_s3(str(summary), get_profile_key(song_id, profile_id, ".txt"))
+    finally:
+        spool.release(dump)
+        spool.release(summary)
+    return describe_artifact(key, "pstats")
+
+
+def run_profiled(fn, song_id: str, *args, **kwargs):
+    """Call fn(*args, **kwargs) under cProfile and store the profile with the song's outputs.
+
+    A dict result with "artifacts" (see worker.tasks.describe_outputs) gets a
+    "profile" descriptor added. Saving problems are logged, never raised.
+    """
+    job = get_current_job()
+    started_at = datetime.utcnow()
+    profile_id = started_at.strftime("%Y%m%dT%H%M%SZ") + (f"-{job.id}" if job is not None else "")
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    outcome = "failed"
+    descriptor = None
+    try:
+        result = profiler.runcall(fn, *args, **kwargs)
+        outcome = "finished"
+    finally:
+        seconds = time.perf_counter() - started
+        title = f"{getattr(fn, '__name__', fn)} for song {song_id}: {outcome} after {seconds:.1f}s"
+        try:
+            descriptor = save_profile(profiler, song_id, profile_id, title)
+            print(f"Profile saved to {descriptor['key']}")
+            if job is not None:
+                entry = {
+                    "profile_id": profile_id,
+                    "song_id": song_id,
+                    "job_id": job.id,
+                    "outcome": outcome,
+                    "seconds": round(seconds, 3),
+                    "key": descriptor["key"],
+                    "created_at": started_at.isoformat(),
+                }
+                with job.connection.pipeline() as pipeline:
+                    pipeline.lpush(RECENT_PROFILES_KEY, json.dumps(entry))
+                    pipeline.ltrim(RECENT_PROFILES_KEY, 0, RECENT_PROFILES_MAX_LENGTH - 1)
+                    pipeline.execute()
+        except Exception as e:
+            print(f"Failed to save profile for song {song_id}: {e}")
+
+    if descriptor is not None and isinstance(result, dict) and "artifacts" in result:
+        result["artifacts"]["profile"] = descriptor
+    return result
+
+
+def recent_profiles(connection, limit: int = 50) -> list:
+    """The newest `limit` profiles recorded by run_profiled."""
+    return [json.loads(raw) for raw in connection.lrange(RECENT_PROFILES_KEY, 0, limit - 1)]
@@ -0,0 +1,301 @@
+"""Background publishing of finished transcriptions.
+
+Analysis jobs hand their rendered MusicXML to the publisher instead of
+uploading it and updating Postgres themselves, so a CPU-heavy worker slot is
+free as soon as rendering is done. The publisher (``python -m worker.publisher``)
+drains the hand-off list in batches: uploads and render checkpoints run on a
+small thread pool, then every song in the batch is pointed at its
+transcription in one transaction.
+
+Items are taken with LMOVE onto the publisher's own processing list and only
+dropped from it once the whole batch is handled (published, scheduled for a
+retry or failed for good), so a publisher that dies mid-batch loses nothing:
+its list is moved back onto the hand-off list when a publisher starts, or once
+its heartbeat expires. Publishing is idempotent, so a recovered item that was
+already published is simply published again.
+
+Each job's publish state lives in its RQ meta ("publish": pending, done or
+failed, plus "publish_error"), which the API folds into the job status.
+Transient failures are retried with the job retry intervals; items that run
+out of retries are marked failed and pushed onto the dead-letter list.
+
+Redis keys:
+    audiogen:publish                 list of pending items (JSON)
+    audiogen:publish:delayed         sorted set of items waiting to retry, by due time
+    audiogen:publish:payload:<job>   rendered MusicXML, until published
+    audiogen:publish:processing:<p>  items taken by publisher <p>, until handled
+    audiogen:publish:publishers      set of publisher names (to find orphaned processing lists)
+    audiogen:publish:alive:<p>       heartbeat of publisher <p>
+"""
+import json
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from uuid import UUID
+
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+backend_dir = os.path.join(os.path.dirname(__file__), '..', 'backend')
+sys.path.insert(0, os.path.abspath(root_dir))
+sys.path.insert(0, os.path.abspath(backend_dir))
+
+from rq.job import Job
+from sqlalchemy import bindparam, update
+
+from backend.app.database import get_db_session
+from backend.app.models import Song
+from worker.checkpoints import load_checkpoints, save_checkpoint
+from worker.config import get_job_max_retries, get_job_retry_intervals, get_publish_batch_size, get_publish_threads
+from worker.queues import get_redis_connection
+from worker.retry import DEAD_LETTER_KEY, DEAD_LETTER_MAX_LENGTH
+from worker.s3_client import save_transcription_to_s3
+
+PUBLISH_QUEUE_KEY = "audiogen:publish"
+PUBLISH_DELAYED_KEY = "audiogen:publish:delayed"
+PAYLOAD_KEY_PREFIX = "audiogen:publish:payload:"
+PROCESSING_KEY_PREFIX = "audiogen:publish:processing:"
+PUBLISHERS_KEY = "audiogen:publish:publishers"
+ALIVE_KEY_PREFIX = "audiogen:publish:alive:"
+PAYLOAD_TTL = 7 * 24 * 3600
+POLL_SECONDS = 1
+# A publisher silent for this long is presumed dead and its items are recovered
+HEARTBEAT_TTL = 120
+
+# Move retries that are due back onto the hand-off list (atomic, so concurrent publishers cannot lose or double them)
+_RELEASE_DUE_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], 0, ARGV[1])
+for _, raw in ipairs(due) do
+    redis.call("ZREM", KEYS[1], raw)
+    redis.call("RPUSH", KEYS[2], raw)
+end
+return #due
+"""
+
+
+def submit_publish(job, song_id: str, song_name: str, musicxml=None, render=None, url=None) -> None:
+    """Hand a job's transcription to the publisher.
+
+    Args:
+        job: The running RQ job (its meta tracks the publish state)
+        song_id: UUID of the song record
+        song_name: Name of the song
+        musicxml: Rendered MusicXML to upload (None = already uploaded)
+        render: Render checkpoint inputs (grid, swing, analysis), saved after the upload
+        url: Transcription URL when nothing needs uploading
+    """
+    # Meta first: the publisher may finish before this job does
+    job.meta["publish"] = "pending"
+    job.save_meta()
+    item = {"job_id": job.id, "song_id": song_id, "song_name": song_name, "render": render, "url": url,
+            "attempts": 0}
+    with job.connection.pipeline() as pipeline:
+        if musicxml is not None:
+            pipeline.set(PAYLOAD_KEY_PREFIX + job.id, musicxml, ex=PAYLOAD_TTL)
+        pipeline.rpush(PUBLISH_QUEUE_KEY, json.dumps(item))
+        pipeline.execute()
+    print(f"Handed song {song_id} to the publisher")
+
+
+_UPDATE_TRANSCRIPTION_URL = (
+    update(Song.__table__)
+    .where(Song.__table__.c.id == bindparam("song_uuid"))
+    .values(transcription_url=bindparam("url"))
+)
+
+
+def update_transcription_urls(results) -> list:
+    """Point songs at their transcriptions in one transaction.
+
+    Songs deleted since their job was queued are skipped; the rest of the
+    batch is still written.
+
+    Args:
+        results: Dicts with song_id and transcription_url
+
+    Returns:
+        song_ids of the songs that no longer exist
+    """
+    missing = []
+    if not results:
+        return missing
+    with get_db_session() as db:
+        for result in results:
+            updated = db.execute(_UPDATE_TRANSCRIPTION_URL, {
+                "song_uuid": UUID(result["song_id"]), "url": result["transcription_url"],
+            })
+            if updated.rowcount == 0:
+                missing.append(result["song_id"])
+    return missing
+
+
+def get_publisher_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def take_batch(connection, processing_key: str, batch_size: int, timeout: int = POLL_SECONDS) -> list:
+    """Up to `batch_size` pending items, waiting up to `timeout` seconds for the first.
+
+    The items stay on `processing_key` until the caller acknowledges the batch
+    with ack_batch().
+    """
+    # Items whose retry is due go back on the list first
+    connection.eval(_RELEASE_DUE_SCRIPT, 2, PUBLISH_DELAYED_KEY, PUBLISH_QUEUE_KEY, time.time())
+
+    first = connection.blmove(PUBLISH_QUEUE_KEY, processing_key, timeout, "LEFT", "RIGHT")
+    if first is None:
+        return []
+    rest = []
+    if batch_size > 1:
+        with connection.pipeline(transaction=False) as pipeline:
+            for _ in range(batch_size - 1):
+                pipeline.lmove(PUBLISH_QUEUE_KEY, processing_key, "LEFT", "RIGHT")
+            rest = [raw for raw in pipeline.execute() if raw is not None]
+    return [json.loads(raw) for raw in [first] + rest]
+
+
+def ack_batch(connection, processing_key: str) -> None:
+    """Drop a handled batch from the processing list."""
+    connection.delete(processing_key)
+
+
+def heartbeat(connection, name: str) -> None:
+    with connection.pipeline() as pipeline:
+        pipeline.sadd(PUBLISHERS_KEY, name)
+        pipeline.set(ALIVE_KEY_PREFIX + name, int(time.time()), ex=HEARTBEAT_TTL)
+        pipeline.execute()
+
+
+def recover_items(connection, name: str) -> int:
+    """Put items taken by dead publishers (and by an earlier run under `name`) back on the list.
+
+    Returns:
+        Number of items recovered
+    """
+    recovered = 0
+    for other in connection.smembers(PUBLISHERS_KEY):
+        other = other.decode()
+        if other != name and connection.exists(ALIVE_KEY_PREFIX + other):
+            continue
+        key = PROCESSING_KEY_PREFIX + other
+        # Right to left keeps their order at the head of the list
+        while connection.lmove(key, PUBLISH_QUEUE_KEY, "RIGHT", "LEFT") is not None:
+            recovered += 1
+        if other != name:
+            connection.srem(PUBLISHERS_KEY, other)
+    if recovered:
+        print(f"Recovered {recovered} unfinished publish items")
+    return recovered
+
+
+def _set_publish_state(connection, items, state, **fields):
+    jobs = Job.fetch_many([item["job_id"] for item in items], connection=connection)
+    for job in jobs:
+        # Expired jobs are skipped; save_meta would recreate them without a TTL
+        if job is not None:
+            job.meta.update(fields, publish=state)
+            job.save_meta()
+
+
+def _upload(connection, item) -> str:
+    """Upload one item's MusicXML and checkpoint the render. Returns the transcription URL."""
+    if item["url"]:
+        return item["url"]
+    musicxml = connection.get(PAYLOAD_KEY_PREFIX + item["job_id"])
+    if musicxml is None:
+        raise RuntimeError("MusicXML payload expired before it was published")
+    url = save_transcription_to_s3(musicxml.decode("utf-8"), item["song_id"], item["song_name"])
+    if url is None:
+        raise RuntimeError(f"Failed to save transcription for song {item['song_id']} to S3")
+    save_checkpoint(load_checkpoints(item["song_id"]), item["song_id"], "render", url=url, **item["render"])
+    return url
+
+
+def _retry_or_fail(connection, item, error: str) -> None:
+    item["attempts"] += 1
+    if item["attempts"] <= get_job_max_retries():
+        intervals = get_job_retry_intervals() or [0]
+        delay = intervals[min(item["attempts"], len(intervals)) - 1]
+        connection.zadd(PUBLISH_DELAYED_KEY, {json.dumps(item): time.time() + delay})
+        print(f"Publishing song {item['song_id']} failed ({error}); retry {item['attempts']} in {delay}s")
+        return
+    _fail(connection, item, error)
+
+
+def _fail(connection, item, error: str) -> None:
+    """Mark an item failed for good and dead-letter it."""
+    _set_publish_state(connection, [item], "failed", publish_error=error)
+    entry = {
+        "job_id": item["job_id"],
+        "func": "worker.publisher",
+        "queue": PUBLISH_QUEUE_KEY,
+        "error": error,
+        "failed_at": datetime.utcnow().isoformat(),
+    }
+    with connection.pipeline() as pipeline:
+        pipeline.lpush(DEAD_LETTER_KEY, json.dumps(entry))
+        pipeline.ltrim(DEAD_LETTER_KEY, 0, DEAD_LETTER_MAX_LENGTH - 1)
+        pipeline.delete(PAYLOAD_KEY_PREFIX + item["job_id"])
+        pipeline.execute()
+    print(f"Publishing song {item['song_id']} failed for good: {error}")
+
+
+def publish_batch(connection, items, executor) -> int:
+    """Upload a batch in parallel, then update all its songs at once. Returns items published."""
+    futures = [executor.submit(_upload, connection, item) for item in items]
+    uploaded = []
+    for item, future in zip(items, futures):
+        try:
+            uploaded.append((item, future.result()))
+        except Exception as e:
+            _retry_or_fail(connection, item, f"{type(e).__name__}: {e}")
+    if not uploaded:
+        return 0
+
+    try:
+        missing = set(update_transcription_urls([
+            {"song_id": item["song_id"], "transcription_url": url} for item, url in uploaded
+        ]))
+    except Exception as e:
+        # Uploads are idempotent, so the whole batch simply goes round again
+        for item, _ in uploaded:
+            _retry_or_fail(connection, item, f"{type(e).__name__}: {e}")
+        return 0
+
+    published = 0
+    for item, url in uploaded:
+        if item["song_id"] in missing:
+            # Deleted while its job ran: retrying cannot help
+            _fail(connection, item, f"Song {item['song_id']} no longer exists")
+        else:
+            _set_publish_state(connection, [item], "done", publish_url=url)
+            published += 1
+    connection.delete(*[PAYLOAD_KEY_PREFIX + item["job_id"] for item, _ in uploaded])
+    return published
+
+
+def main() -> None:
+    connection = get_redis_connection()
+    batch_size = get_publish_batch_size()
+    name = get_publisher_name()
+    processing_key = PROCESSING_KEY_PREFIX + name
+    heartbeat(connection, name)
+    recover_items(connection, name)
+    last_recovery = time.time()
+    print(f"Publisher {name} listening on {PUBLISH_QUEUE_KEY} (batches of up to {batch_size})")
+    with ThreadPoolExecutor(max_workers=get_publish_threads()) as executor:
+        while True:
+            heartbeat(connection, name)
+            if time.time() - last_recovery > HEARTBEAT_TTL:
+                recover_items(connection, name)
+                last_recovery = time.time()
+            items = take_batch(connection, processing_key, batch_size)
+            if items:
+                published = publish_batch(connection, items, executor)
+                ack_batch(connection, processing_key)
+                print(f"Published {published}/{len(items)} transcriptions")
+
+
+if __name__ == "__main__":
+    main()
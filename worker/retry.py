@@ -0,0 +1,77 @@
+"""Retry policy and dead-letter handling for RQ jobs.
+
+Transient failures (S3/DB/network errors, timeouts, evicted workers) are
+retried with backoff; the stage checkpoints in worker.checkpoints make each
+retry resume where the last attempt stopped. Errors that retrying cannot fix
+are "poison": the job skips its remaining retries. Jobs that fail for good
+are recorded on a dead-letter list for inspection and manual requeue.
+
+Dead-lettering runs from the worker's handle_job_failure (see
+worker.worker.MetricsWorker), which RQ calls both when a job raises and when
+its work-horse is killed; exception handlers and on_failure callbacks only see
+the first case.
+"""
+import json
+from datetime import datetime
+
+from rq import Retry
+from rq.job import JobStatus
+
+from worker.config import get_job_max_retries, get_job_retry_intervals
+from worker.spool import get_spool
+
+# Bad input or code errors: the same job would fail the same way again
+POISON_ERRORS = (FileNotFoundError, ValueError, TypeError, KeyError)
+
+DEAD_LETTER_KEY = "audiogen:dead-letter"
+DEAD_LETTER_MAX_LENGTH = 10000
+
+
+def get_job_retry() -> Retry:
+    """RQ retry policy for analysis jobs (RQ_JOB_MAX_RETRIES / RQ_JOB_RETRY_INTERVALS)."""
+    return Retry(max=get_job_max_retries(), interval=get_job_retry_intervals())
+
+
+def on_job_failure(job, connection, exc_type, exc_value, traceback):
+    """RQ on_failure callback: poison errors use up the job's remaining retries.
+
+    Runs before RQ decides whether to retry, so clearing `retries_left` here
+    sends the job straight to the failed registry (and the dead-letter list).
+    """
+    if issubclass(exc_type, POISON_ERRORS) and job.retries_left:
+        print(f"Job {job.id} failed with {exc_type.__name__}; not retrying")
+        job.retries_left = 0
+
+
+def dead_letter(connection, job, exc_string: str) -> bool:
+    """Push a job that failed for good onto the dead-letter list and release its upload.
+
+    Args:
+        connection: Redis connection
+        job: Job whose failure RQ has just handled
+        exc_string: Traceback, or RQ's message for a killed work-horse
+
+    Returns:
+        True if the job was dead-lettered, False if a retry is scheduled
+    """
+    if job.get_status(refresh=False) != JobStatus.FAILED:
+        # Retry scheduled (or stopped by a user)
+        return False
+    lines = exc_string.strip().splitlines()
+    entry = {
+        "job_id": job.id,
+        "func": job.func_name,
+        "queue": job.origin,
+        "error": lines[-1] if lines else "unknown error",
+        "failed_at": datetime.utcnow().isoformat(),
+    }
+    with connection.pipeline() as pipeline:
+        pipeline.lpush(DEAD_LETTER_KEY, json.dumps(entry))
+        pipeline.ltrim(DEAD_LETTER_KEY, 0, DEAD_LETTER_MAX_LENGTH - 1)
+        pipeline.execute()
+    print(f"Job {job.id} moved to dead-letter list: {entry['error']}")
+
+    # Terminal state: drop the spooled upload (the source copy, if any, stays in S3)
+    if job.func_name == "worker.tasks.audio_to_musicxml" and job.args:
+        get_spool().release(job.args[0])
+    return True
@@ -1,9 +1,12 @@
+import json
 import os
 import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError
 from typing import Optional
 
+from worker.score_index import measure_index
+
 
 def get_s3_client():
     """Create and return an S3-compatible client (MinIO) configured from environment variables."""
@@ -41,6 +44,14 @@ def get_s3_client():
     return s3_client, bucket
 
 
+def get_transcription_key(song_id: str, song_name: str) -> str:
+    """Object key of a song's MusicXML: transcriptions/{song_id}/{song_name}.musicxml"""
+    # Sanitize song_name for filesystem compatibility
+    safe_song_name = "".join(c for c in song_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    safe_song_name = safe_song_name.replace(' ', '_')
+    return f"transcriptions/{song_id}/{safe_song_name}.musicxml"
+
+
 def save_transcription_to_s3(content: str, song_id: str, song_name: str) -> Optional[str]:
     """Save MusicXML transcription content to S3/MinIO and return the object key.
     
@@ -54,20 +65,19 @@ def save_transcription_to_s3(content: str, song_id: str, song_name: str) -> Opti
     """
     try:
         s3_client, bucket = get_s3_client()
-        # Generate object key: transcriptions/{song_id}/{song_name}.musicxml
-        # Sanitize song_name for filesystem compatibility
-        safe_song_name = "".join(c for c in song_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        safe_song_name = safe_song_name.replace(' ', '_')
-        object_key = f"transcriptions/{song_id}/{safe_song_name}.musicxml"
+        object_key = get_transcription_key(song_id, song_name)
         print(f"Object key: {object_key}")
         
         # Upload content to S3
-        s3_client.put_object(
+        response = s3_client.put_object(
             Bucket=bucket,
             Key=object_key,
             Body=content.encode('utf-8'),
             ContentType='application/xml'
         )
+        # Sidecar measure offsets for partial fetches (see worker.scores), written after the score and
+        # tied to its ETag: a reader that sees another ETag falls back to the whole document
+        put_json_to_s3(get_measure_index_key(song_id), measure_index(content, etag=response['ETag']))
         
         # Construct URL (for MinIO, this will be the endpoint URL + bucket + key)
         endpoint = os.getenv("S3_ENDPOINT", "http://minio:9000")
@@ -91,11 +101,184 @@ def get_transcription_from_s3(song_id: str, song_name: str) -> Optional[str]:
     """
     try:
         s3_client, bucket = get_s3_client()
-        safe_song_name = "".join(c for c in song_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        safe_song_name = safe_song_name.replace(' ', '_')
-        object_key = f"transcriptions/{song_id}/{safe_song_name}.musicxml"
+        object_key = get_transcription_key(song_id, song_name)
         response = s3_client.get_object(Bucket=bucket, Key=object_key)
         return response['Body'].read().decode('utf-8')
     except Exception as e:
         print(f"Error getting transcription from S3: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+def get_note_table_key(song_id: str) -> str:
+    """Object key of a song's note table, stored next to its MusicXML."""
+    return f"transcriptions/{song_id}/notes.json"
+
+
+def get_measure_index_key(song_id: str) -> str:
+    """Object key of the measure byte-offset index of a song's MusicXML."""
+    return f"transcriptions/{song_id}/measures.json"
+
+
+def get_profile_prefix(song_id: str) -> str:
+    """Key prefix of a song's job profiles: transcriptions/{song_id}/profiles/"""
+    return f"transcriptions/{song_id}/profiles/"
+
+
+def get_profile_key(song_id: str, profile_id: str, suffix: str = ".prof") -> str:
+    """Object key of a job profile: transcriptions/{song_id}/profiles/{profile_id}{suffix}"""
+    return f"{get_profile_prefix(song_id)}{profile_id}{suffix}"
+
+
+def get_range_from_s3(object_key: str, first_byte: int, last_byte: int):
+    """Download bytes `first_byte`..`last_byte` (inclusive) of an object; errors propagate.
+    
+    Returns:
+        (data, ETag of the object the bytes came from)
+    """
+    s3_client, bucket = get_s3_client()
+    response = s3_client.get_object(Bucket=bucket, Key=object_key, Range=f"bytes={first_byte}-{last_byte}")
+    return response['Body'].read(), response['ETag']
+
+
+def get_object_from_s3(object_key: str):
+    """Download a whole object; errors propagate.
+    
+    Returns:
+        (data, ETag), or None if the object does not exist
+    """
+    s3_client, bucket = get_s3_client()
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=object_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    return response['Body'].read(), response['ETag']
+
+
+def put_json_to_s3(object_key: str, obj) -> str:
+    """Upload a JSON document; errors propagate so callers can retry.
+    
+    Returns:
+        URL of the stored object
+    """
+    s3_client, bucket = get_s3_client()
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=object_key,
+        Body=json.dumps(obj).encode('utf-8'),
+        ContentType='application/json'
+    )
+    endpoint = os.getenv("S3_ENDPOINT", "http://minio:9000")
+    return f"{endpoint}/{bucket}/{object_key}"
+
+
+def get_json_from_s3(object_key: str):
+    """Download a JSON document, or None if the object does not exist."""
+    s3_client, bucket = get_s3_client()
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=object_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+
+def describe_artifact(object_key: str, artifact_format: str, size: Optional[int] = None) -> dict:
+    """Small descriptor of a stored artifact (HEAD only, no download).
+    
+    Args:
+        object_key: Key of the artifact
+        artifact_format: Format name reported to clients
+        size: Size in bytes when already known (skips the HEAD request)
+    
+    Returns:
+        Dict with key, url, size (bytes, None if missing) and format
+    """
+    s3_client, bucket = get_s3_client()
+    if size is None:
+        try:
+            size = s3_client.head_object(Bucket=bucket, Key=object_key)['ContentLength']
+        except ClientError:
+            size = None
+    endpoint = os.getenv("S3_ENDPOINT", "http://minio:9000")
+    return {
+        "key": object_key,
+        "url": f"{endpoint}/{bucket}/{object_key}",
+        "size": size,
+        "format": artifact_format,
+    }
+
+
+def upload_file_to_s3(path: str, object_key: str) -> str:
+    """Upload a local file under `object_key`; errors propagate."""
+    s3_client, bucket = get_s3_client()
+    s3_client.upload_file(path, bucket, object_key)
+    return object_key
+
+
+def get_size_from_s3(object_key: str) -> int:
+    """Size in bytes of `object_key` (HEAD only); errors propagate."""
+    s3_client, bucket = get_s3_client()
+    return s3_client.head_object(Bucket=bucket, Key=object_key)['ContentLength']
+
+
+def download_file_from_s3(object_key: str, path: str) -> str:
+    """Download `object_key` to a local path; errors propagate."""
+    s3_client, bucket = get_s3_client()
+    s3_client.download_file(bucket, object_key, path)
+    return path
+
+
+def list_objects_in_s3(prefix: str) -> list:
+    """Every object under `prefix` as dicts with key, url, size and last_modified."""
+    s3_client, bucket = get_s3_client()
+    endpoint = os.getenv("S3_ENDPOINT", "http://minio:9000")
+    objects = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents') or []:
+            objects.append({
+                "key": obj['Key'],
+                "url": f"{endpoint}/{bucket}/{obj['Key']}",
+                "size": obj['Size'],
+                "last_modified": obj['LastModified'].isoformat(),
+            })
+    return objects
+
+
+def find_object_key(prefix: str) -> Optional[str]:
+    """First object key starting with `prefix`, or None if there is none."""
+    s3_client, bucket = get_s3_client()
+    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=1)
+    contents = response.get('Contents') or []
+    return contents[0]['Key'] if contents else None
+
+
+def save_note_table_to_s3(note_table: dict, song_id: str) -> Optional[str]:
+    """Save the unquantized note table of a song to S3/MinIO.
+    
+    Args:
+        note_table: JSON-serializable note table
+        song_id: UUID of the song
+    
+    Returns:
+        URL of the stored object, or None if upload failed
+    """
+    try:
+        return put_json_to_s3(get_note_table_key(song_id), note_table)
+    except Exception as e:
+        print(f"Error saving note table to S3: {str(e)}")
+        return None
+
+
+def get_note_table_from_s3(song_id: str) -> Optional[dict]:
+    """Load a song's note table from S3/MinIO.
+    
+    Args:
+        song_id: UUID of the song
+    
+    Returns:
+        Note table dict, or None if it does not exist
+    """
+    return get_json_from_s3(get_note_table_key(song_id))
@@ -0,0 +1,108 @@
+"""Measure index of a stored MusicXML score, for fetching ranges of measures.
+
+The index records the byte offset of every measure of every part, so a
+reader can cut any range of measures out of the stored document with ranged
+GETs and wrap it in the score header (see worker.scores). Only the standard
+library is used so the API can import it without the analysis stack.
+"""
+import re
+
+# 2: measures counts the longest part (parts may have different lengths)
+# 3: etag of the indexed score
+MEASURE_INDEX_VERSION = 3
+BEATS_PER_MEASURE = 4  # 4/4, as written by worker.musicxml
+
+_PART_RE = re.compile(rb'<part id="([^"]+)">')
+_DIVISIONS_RE = re.compile(r"<divisions>(\d+)</divisions>")
+_MEASURE_RE = re.compile(rb'<measure number="\d+">')
+_MEASURE_END = b"</measure>"
+
+
+def empty_measure_xml(number, divisions):
+    """A measure holding a whole-measure rest (pads parts shorter than the score)."""
+    return (
+        f'<measure number="{number}"><note><rest/><duration>{BEATS_PER_MEASURE * divisions}</duration>'
+        f"<voice>1</voice><type>whole</type></note></measure>"
+    )
+
+
+def measure_index(musicxml, etag=None):
+    """Byte offsets of every measure of a score from worker.musicxml.notes_to_musicxml.
+
+    Stored next to the score so a reader can fetch a range of measures with
+    ranged GETs instead of downloading the whole document (see score_excerpt).
+
+    Args:
+        musicxml: MusicXML string
+        etag: ETag of the stored score, checked by readers of ranges
+
+    Returns:
+        Dict with version, etag, size (bytes), measures (of the longest part), header (the
+        document up to the first part) and parts: id, offsets (start byte of
+        every measure, then the end of the last one), prelude (the first
+        measure's attributes and tempo, repeated at the top of excerpts) and
+        divisions (per quarter note)
+    """
+    data = musicxml.encode("utf-8")
+    parts = []
+    for match in _PART_RE.finditer(data):
+        part_end = data.index(b"</part>", match.end())
+        starts = [m.start() for m in _MEASURE_RE.finditer(data, match.end(), part_end)]
+        last_end = data.rindex(_MEASURE_END, match.end(), part_end) + len(_MEASURE_END)
+        first_open = _MEASURE_RE.search(data, match.end(), part_end).end()
+        first_note = data.find(b"<note>", first_open, starts[1] if len(starts) > 1 else last_end)
+        prelude = data[first_open:first_note if first_note >= 0 else first_open].decode("utf-8")
+        divisions = _DIVISIONS_RE.search(prelude)
+        parts.append({
+            "id": match.group(1).decode(),
+            "offsets": starts + [last_end],
+            "prelude": prelude,
+            "divisions": int(divisions.group(1)) if divisions else 1,
+        })
+    first_part = _PART_RE.search(data)
+    return {
+        "version": MEASURE_INDEX_VERSION,
+        "etag": etag,
+        "size": len(data),
+        "measures": max((len(part["offsets"]) - 1 for part in parts), default=0),
+        "header": data[:first_part.start() if first_part else 0].decode("utf-8"),
+        "parts": parts,
+    }
+
+
+def part_byte_range(part, start, end):
+    """Bytes [first, stop) of measures `start`..`end` of one part, clipped to the part's own
+    measures, or None if the part ends before `start`."""
+    count = len(part["offsets"]) - 1
+    if start > count:
+        return None
+    return part["offsets"][start - 1], part["offsets"][min(end, count)]
+
+
+def score_excerpt(index, chunks, start, end):
+    """Assemble a standalone score from a range of measures.
+
+    Args:
+        index: measure_index of the full score
+        chunks: Per part, the bytes of part_byte_range(part, start, end) (b"" if None)
+        start: First measure number
+        end: Last measure number
+
+    Returns:
+        MusicXML string with the full header and measures `start`..`end` of every part;
+        parts shorter than the range are filled with whole-measure rests
+    """
+    body = []
+    for part, chunk in zip(index["parts"], chunks):
+        count = len(part["offsets"]) - 1
+        measures = [chunk.decode("utf-8")] if chunk else []
+        measures += [
+            empty_measure_xml(number, part["divisions"]) for number in range(max(start, count + 1), end + 1)
+        ]
+        measures = "\n    ".join(measures)
+        if start > 1:
+            # Clef, time signature and tempo only appear in measure 1
+            open_end = measures.index(">") + 1
+            measures = measures[:open_end] + part["prelude"] + measures[open_end:]
+        body.append(f'<part id="{part["id"]}">\n    {measures}\n  </part>')
+    return index["header"] + "\n  ".join(body) + "\n</score-partwise>\n"
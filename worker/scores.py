@@ -0,0 +1,87 @@
+"""Partial score fetches: a range of measures without downloading the whole score.
+
+Every stored MusicXML has a sidecar measure index (worker.score_index.measure_index,
+written by save_transcription_to_s3 after the score). A range request reads the
+index, then issues one ranged GET per part for exactly the requested measures,
+so the cost of the first page does not grow with the length of the song.
+
+The index records the ETag of the score it was built from. Score and index are
+two separate writes, so a ranged read whose ETag differs (the score was
+replaced, possibly by one of the same size) falls back to the whole document
+and re-indexes it.
+"""
+from worker.score_index import MEASURE_INDEX_VERSION, measure_index, part_byte_range, score_excerpt
+from worker.s3_client import (
+    get_json_from_s3,
+    get_measure_index_key,
+    get_object_from_s3,
+    get_range_from_s3,
+    get_transcription_key,
+    put_json_to_s3,
+)
+
+
+def _from_document(song_id, song_name):
+    """Index and bytes of the full score, storing the index if it was missing or stale."""
+    stored = get_object_from_s3(get_transcription_key(song_id, song_name))
+    if stored is None:
+        return None, None
+    document, etag = stored
+    index = measure_index(document.decode("utf-8"), etag=etag)
+    put_json_to_s3(get_measure_index_key(song_id), index)
+    return index, document
+
+
+def _measure_range(index, start, count):
+    total = index["measures"]
+    if start > total:
+        raise ValueError(f"Measure {start} is past the end of the score ({total} measures)")
+    return min(total, start + count - 1)
+
+
+def _excerpt(index, chunks, start, end):
+    return {"measures": index["measures"], "start": start, "end": end,
+            "musicxml": score_excerpt(index, chunks, start, end)}
+
+
+def get_measure_range(song_id: str, song_name: str, start: int = 1, count: int = 16):
+    """Measures `start`..`start + count - 1` of a song's score as standalone MusicXML.
+
+    Args:
+        song_id: UUID of the song
+        song_name: Name of the song (used in the score's object key)
+        start: First measure, 1-based
+        count: Number of measures (clipped at the end of the score)
+
+    Returns:
+        Dict with measures (total), start, end and musicxml, or None if the
+        song has no transcription. Raises ValueError if `start` is past the end.
+    """
+    index = get_json_from_s3(get_measure_index_key(song_id))
+    if index is not None and index.get("version") == MEASURE_INDEX_VERSION:
+        end = _measure_range(index, start, count)
+        key = get_transcription_key(song_id, song_name)
+        chunks = []
+        for part in index["parts"]:
+            byte_range = part_byte_range(part, start, end)
+            if byte_range is None:
+                chunks.append(b"")
+                continue
+            data, etag = get_range_from_s3(key, byte_range[0], byte_range[1] - 1)
+            if etag != index["etag"]:
+                # The score was replaced after its index was written
+                break
+            chunks.append(data)
+        else:
+            return _excerpt(index, chunks, start, end)
+
+    # No index (scores stored before indexes existed), an old index version or a stale one: read the whole score once
+    index, document = _from_document(song_id, song_name)
+    if index is None:
+        return None
+    end = _measure_range(index, start, count)
+    chunks = []
+    for part in index["parts"]:
+        byte_range = part_byte_range(part, start, end)
+        chunks.append(document[byte_range[0]:byte_range[1]] if byte_range else b"")
+    return _excerpt(index, chunks, start, end)
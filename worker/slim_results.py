@@ -0,0 +1,98 @@
+"""One-off cleanup: slim RQ job results that still hold full MusicXML.
+
+Older transcription jobs returned the whole MusicXML string, which RQ keeps
+in Redis (in the job hash, or the rq:results:<id> stream on Redis >= 5).
+This rewrites those results as artifact descriptors and optionally puts a TTL
+on finished job hashes that have none.
+
+Usage:
+    python -m worker.slim_results [--dry-run] [--ttl 86400]
+"""
+import argparse
+import os
+import sys
+
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.abspath(root_dir))
+
+from rq.job import Job, JobStatus
+from rq.results import Result
+
+from worker.queues import get_redis_connection
+
+# Results at least this large (in characters) are replaced
+MIN_SIZE = 1024
+
+
+def slim_result(job: Job, value) -> dict:
+    """Descriptor for a legacy MusicXML result: where it lives and how big it was."""
+    descriptor = {"format": "musicxml", "size": len(value), "slimmed": True}
+    if job.func_name == "worker.tasks.audio_to_musicxml" and len(job.args) >= 3:
+        from worker.s3_client import get_transcription_key
+
+        _, song_name, song_id = job.args[:3]
+        descriptor["key"] = get_transcription_key(song_id, song_name)
+        return {"song_id": song_id, "artifacts": {"musicxml": descriptor}}
+    return {"artifacts": {"musicxml": descriptor}}
+
+
+def _is_large(value) -> bool:
+    return isinstance(value, (str, bytes)) and len(value) >= MIN_SIZE
+
+
+def slim_job(connection, job_id: str, dry_run=False, ttl=None) -> int:
+    """Slim one job. Returns the number of results rewritten."""
+    try:
+        job = Job.fetch(job_id, connection=connection)
+    except Exception:
+        return 0
+    rewritten = 0
+
+    # Results stream (Redis >= 5)
+    results_key = Result.get_key(job.id)
+    results = Result.all(job) if connection.exists(results_key) else []
+    if any(result.type == Result.Type.SUCCESSFUL and _is_large(result.return_value) for result in results):
+        latest = next(r for r in results if r.type == Result.Type.SUCCESSFUL)
+        remaining = connection.ttl(results_key)
+        if not dry_run:
+            Result.delete_all(job)
+            Result.create(job, Result.Type.SUCCESSFUL, ttl=remaining if remaining > 0 else ttl,
+                          return_value=slim_result(job, latest.return_value))
+        rewritten += 1
+
+    # Legacy location: 'result' field of the job hash
+    raw = connection.hget(job.key, "result")
+    if raw is not None and len(raw) >= MIN_SIZE:
+        value = job.serializer.loads(raw)
+        if _is_large(value):
+            if not dry_run:
+                connection.hset(job.key, "result", job.serializer.dumps(slim_result(job, value)))
+            rewritten += 1
+
+    if ttl and not dry_run and job.get_status() == JobStatus.FINISHED and connection.ttl(job.key) < 0:
+        connection.expire(job.key, ttl)
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replace stored MusicXML job results with artifact descriptors")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--ttl", type=int, help="Also expire finished job hashes that never expire")
+    args = parser.parse_args()
+
+    connection = get_redis_connection()
+    scanned = slimmed = 0
+    for key in connection.scan_iter(match="rq:job:*", count=1000):
+        key = key.decode()
+        job_id = key[len("rq:job:"):]
+        if ":" in job_id:
+            # rq:job:<id>:dependents and similar
+            continue
+        scanned += 1
+        slimmed += slim_job(connection, job_id, dry_run=args.dry_run, ttl=args.ttl)
+    verb = "Would slim" if args.dry_run else "Slimmed"
+    print(f"Scanned {scanned} jobs. {verb} {slimmed} results.")
+
+
+if __name__ == "__main__":
+    main()
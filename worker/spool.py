@@ -0,0 +1,219 @@
+"""Managed local spool for uploads and worker temporaries.
+
+The API writes uploads here and workers read them (and keep their own
+temporary files here), so both sides share one directory and one policy:
+
+    - a byte quota (SPOOL_QUOTA_BYTES): writes evict least recently used
+      entries until the new file fits
+    - a per-file TTL (SPOOL_TTL_SECONDS): older entries are removed on every
+      cleanup pass
+    - inputs are released as soon as their job reaches a terminal state
+
+Uploads are pinned while their job is queued or running: pinned entries are
+never evicted to make room, so a backed-up queue cannot lose its inputs, but
+they still expire with the TTL, so a pin whose job never reports back (a
+killed work-horse, a deleted job) cannot hold space forever. A pin is a
+marker file under .pins/ (shared by every process on the spool) and is dropped
+by release() or when its entry expires. Writes that cannot fit beside the
+pinned entries fail with SpoolFullError.
+
+Recency is the file mtime, refreshed with touch() whenever an entry is used,
+since atime is unreliable on noatime mounts. Several processes can share a
+spool; losing a race to delete a file is harmless.
+"""
+import os
+import time
+import uuid
+from pathlib import Path
+
+from worker.config import get_spool_dir, get_spool_quota_bytes, get_spool_ttl_seconds
+
+TEMP_PREFIX = "tmp-"
+PARTIAL_SUFFIX = ".partial"
+PIN_DIR = ".pins"
+
+
+class SpoolFullError(Exception):
+    """A write cannot fit in the spool quota even after eviction."""
+
+
+class Spool:
+    def __init__(self, directory=None, quota_bytes=None, ttl_seconds=None):
+        self.directory = Path(directory or get_spool_dir())
+        self.quota_bytes = get_spool_quota_bytes() if quota_bytes is None else quota_bytes
+        self.ttl_seconds = get_spool_ttl_seconds() if ttl_seconds is None else ttl_seconds
+        self.pin_directory = self.directory / PIN_DIR
+        self.pin_directory.mkdir(parents=True, exist_ok=True)
+        # Per-process counters for metrics
+        self.stats = {"expired": 0, "evicted": 0, "released": 0, "freed_bytes": 0}
+
+    def path(self, name: str) -> Path:
+        return self.directory / name
+
+    def temp_path(self, suffix: str = "") -> Path:
+        """A fresh path for a worker temporary (remove it with release())."""
+        return self.path(f"{TEMP_PREFIX}{uuid.uuid4().hex}{suffix}")
+
+    def contains(self, path) -> bool:
+        try:
+            return Path(path).resolve().parent == self.directory.resolve()
+        except OSError:
+            return False
+
+    def entries(self):
+        """(path, size, mtime) of every file in the spool, least recently used first."""
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        found.append((Path(entry.path), stat.st_size, stat.st_mtime))
+                except FileNotFoundError:
+                    continue
+        found.sort(key=lambda item: item[2])
+        return found
+
+    def pin(self, path) -> None:
+        """Keep an entry until release() or the TTL, whatever the quota."""
+        (self.pin_directory / Path(path).name).touch()
+
+    def unpin(self, path) -> None:
+        try:
+            os.unlink(self.pin_directory / Path(path).name)
+        except FileNotFoundError:
+            pass
+
+    def pinned(self) -> set:
+        """Names of the pinned entries."""
+        return set(os.listdir(self.pin_directory))
+
+    def _remove(self, path, size, reason):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return False
+        self.stats[reason] += 1
+        self.stats["freed_bytes"] += size
+        return True
+
+    def cleanup(self, reserve_bytes: int = 0, now=None) -> dict:
+        """Drop expired entries, then evict unpinned LRU entries until `reserve_bytes` more fit.
+
+        Returns:
+            Dict with counts of expired and evicted files, bytes freed by this
+            pass and bytes still used
+        """
+        now = time.time() if now is None else now
+        expired = evicted = freed = 0
+        pinned = self.pinned()
+        live = []
+        for path, size, mtime in self.entries():
+            if self.ttl_seconds and now - mtime > self.ttl_seconds:
+                # Pinned or not: a job that has not touched its input for a whole TTL is not coming back for it
+                if self._remove(path, size, "expired"):
+                    expired += 1
+                    freed += size
+                self.unpin(path)
+            else:
+                live.append((path, size, mtime))
+        self._drop_orphaned_pins(pinned, live, now)
+
+        used = sum(size for _, size, _ in live)
+        for path, size, _ in live:
+            if used + reserve_bytes <= self.quota_bytes:
+                break
+            if path.name.endswith(PARTIAL_SUFFIX) or path.name in pinned:
+                # Another process is still writing it, or its job still needs it
+                continue
+            if self._remove(path, size, "evicted"):
+                evicted += 1
+                freed += size
+                used -= size
+        if expired or evicted:
+            print(f"Spool cleanup: {expired} expired, {evicted} evicted, {freed} bytes freed")
+        return {"expired": expired, "evicted": evicted, "freed_bytes": freed, "used_bytes": used}
+
+    def _drop_orphaned_pins(self, pinned, live, now):
+        """Remove pins older than the TTL whose entry is gone (deleted by hand, or lost a race)."""
+        present = {path.name for path, _, _ in live}
+        for name in pinned - present:
+            marker = self.pin_directory / name
+            try:
+                if self.ttl_seconds and now - marker.stat().st_mtime > self.ttl_seconds:
+                    marker.unlink()
+            except FileNotFoundError:
+                continue
+
+    def reserve(self, nbytes: int) -> None:
+        """Make room for `nbytes`, raising SpoolFullError if it cannot be freed."""
+        if nbytes > self.quota_bytes:
+            raise SpoolFullError(f"{nbytes} bytes exceeds the spool quota of {self.quota_bytes} bytes")
+        used = self.cleanup(reserve_bytes=nbytes)["used_bytes"]
+        if used + nbytes > self.quota_bytes:
+            raise SpoolFullError(
+                f"{nbytes} bytes do not fit: {used} of {self.quota_bytes} bytes are held by pinned or in-progress entries"
+            )
+
+    def write(self, name: str, data: bytes, pin: bool = False) -> Path:
+        """Atomically write `data` as spool entry `name` within the quota.
+
+        Args:
+            pin: Pin the entry (job inputs) so cleanup does not evict it before release()
+        """
+        self.reserve(len(data))
+        path = self.path(name)
+        partial = path.with_name(path.name + PARTIAL_SUFFIX)
+        with open(partial, "wb") as f:
+            f.write(data)
+        if pin:
+            # Pinned before it appears under its final name
+            self.pin(path)
+        os.replace(partial, path)
+        return path
+
+    def touch(self, path) -> None:
+        """Mark an entry as recently used."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def release(self, path) -> bool:
+        """Unpin and delete a spool entry (paths outside the spool are left alone)."""
+        if not path or not self.contains(path):
+            return False
+        self.unpin(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        return self._remove(path, size, "released")
+
+    def usage(self) -> dict:
+        """Spool usage metrics."""
+        entries = self.entries()
+        used = sum(size for _, size, _ in entries)
+        pinned = self.pinned()
+        return {
+            "directory": str(self.directory),
+            "files": len(entries),
+            "pinned_files": sum(1 for path, _, _ in entries if path.name in pinned),
+            "bytes": used,
+            "quota_bytes": self.quota_bytes,
+            "utilization": used / self.quota_bytes if self.quota_bytes else None,
+            "ttl_seconds": self.ttl_seconds,
+            "oldest_seconds": time.time() - entries[0][2] if entries else None,
+            **self.stats,
+        }
+
+
+_spool = None
+
+
+def get_spool() -> Spool:
+    """Process-wide spool configured from the environment."""
+    global _spool
+    if _spool is None:
+        _spool = Spool()
+    return _spool
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from pathlib import Path
 import os
 import sys
+from typing import Optional
 from uuid import UUID
 
+from rq import get_current_job
+
 # Add parent directory to path to import backend models
 # This allows the worker to import from backend module
 root_dir = os.path.join(os.path.dirname(__file__), '..')
@@ -14,160 +18,371 @@ sys.path.insert(0, os.path.abspath(backend_dir))
 
 from backend.app.database import get_db_session
 from backend.app.models import Song
-from worker.s3_client import save_transcription_to_s3
+from worker.checkpoints import (
+    find_source_audio_key,
+    get_source_audio_key,
+    load_checkpoints,
+    save_checkpoint,
+    stage_done,
+)
+from worker.config import get_pitch_estimator_name, get_quantize_grid, get_quantize_swing
+from worker.drums import HOP_LENGTH, band_features, transcribe_drums
+from worker.musicxml import notes_to_musicxml
+from worker.notetable import NoteTable
+from worker.pitch import get_pitch_estimator
+from worker.publisher import submit_publish
+from worker.quantize import estimate_beats, get_subdivisions, quantize_notes
+from worker.s3_client import (
+    describe_artifact,
+    download_file_from_s3,
+    get_note_table_from_s3,
+    get_note_table_key,
+    get_size_from_s3,
+    get_transcription_key,
+    save_note_table_to_s3,
+    save_transcription_to_s3,
+    upload_file_to_s3,
+)
+from worker.spool import get_spool
+from worker.transcribe import SAMPLE_RATE, detect_notes, load_audio
+
+
+# 1: notes/drums as lists of (start, end, pitch, velocity) rows
+# 2: notes/drums as NoteTable columns
+NOTE_TABLE_VERSION = 2
 
+# Bump when the analysis output changes; checkpointed analyses from an older
+# version are redone (see worker.backfill for re-running the whole catalog)
+ANALYSIS_VERSION = 2
 
-def audio_to_musicxml(audio_path: str, songName: str, song_id: str) -> str:
-    """Convert an audio file to MusicXML drum tabs and save to database.
+
+def render_musicxml(note_table: dict, songName: str, grid: str, swing: float) -> str:
+    """Quantize a stored note table and render it as MusicXML.
 
     Args:
-        audio_path: Path to the audio file
-        songName: Name of the song
-        song_id: UUID of the song record in database
+        note_table: Note table as built by audio_to_musicxml
+        songName: Work title
+        grid: Quantization grid name
+        swing: Swing amount
 
     Returns:
         MusicXML string
     """
-    # Validate input path exists early to fail fast
-    if not Path(audio_path).exists():
-        raise FileNotFoundError(f"Audio file not found: {audio_path}")
+    bpm = note_table["bpm"]
+    beats = note_table["beats"]
+    notes = quantize_notes(NoteTable.from_dict(note_table["notes"]), beats, bpm, grid=grid, swing=swing)
+    drum_hits = quantize_notes(NoteTable.from_dict(note_table["drums"]), beats, bpm, grid=grid, swing=swing)
 
-    print(f"Processing audio file: {audio_path}")
-    print(f"Song name: {songName}")
-    print(f"Song ID: {song_id}")
-    
-    # TODO: load model, perform inference, generate MusicXML
-    # Placeholder minimal MusicXML structure
-    musicxml = f"""
-<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE score-partwise PUBLIC
-  "-//Recordare//DTD MusicXML 3.1 Partwise//EN"
-  "http://www.musicxml.org/dtds/partwise.dtd">
-
-<score-partwise version="3.1">
-  <work><work-title>{songName}</work-title></work>
-
-  <part-list>
-    <score-part id="P1">
-      <part-name>Drum Set</part-name>
-
-      <!-- Force 5 lines at the part-definition level -->
-      <staff-details>
-        <staff-lines>5</staff-lines>
-      </staff-details>
-
-      <score-instrument id="P1-I1"><instrument-name>Kick</instrument-name></score-instrument>
-      <score-instrument id="P1-I2"><instrument-name>Snare</instrument-name></score-instrument>
-
-      <midi-instrument id="P1-I1"/>
-      <midi-instrument id="P1-I2"/>
-    </score-part>
-  </part-list>
-
-  <part id="P1">
-    <measure number="1">
-      <attributes>
-        <divisions>4</divisions>
-
-        <!-- also set staff-lines here -->
-        <staff-details>
-          <staff-lines>5</staff-lines>
-        </staff-details>
-
-        <time><beats>4</beats><beat-type>4</beat-type></time>
-
-        <clef>
-          <sign>percussion</sign>
-          <line>2</line>
-        </clef>
-      </attributes>
-
-      <!-- Kick - beat 1 (moved lower: C2) -->
-      <note>
-        <unpitched>
-          <step>C</step>
-          <octave>2</octave>
-          <display-step>C</display-step>
-          <display-octave>2</display-octave>
-        </unpitched>
-        <duration>4</duration>
-        <type>quarter</type>
-        <instrument id="P1-I1"/>
-        <voice>1</voice>
-        <staff>1</staff>
-      </note>
-
-      <!-- Kick - beat 2 (C2) -->
-      <note>
-        <unpitched>
-          <step>C</step>
-          <octave>2</octave>
-        </unpitched>
-        <duration>4</duration>
-        <type>quarter</type>
-        <instrument id="P1-I1"/>
-        <voice>1</voice>
-        <staff>1</staff>
-      </note>
-
-      <!-- Kick - beat 3 (C2) -->
-      <note>
-        <unpitched>
-          <step>C</step>
-          <octave>2</octave>
-        </unpitched>
-        <duration>4</duration>
-        <type>quarter</type>
-        <instrument id="P1-I1"/>
-        <voice>1</voice>
-        <staff>1</staff>
-      </note>
-
-      <!-- Snare - beat 4 (unchanged) -->
-      <note>
-        <unpitched>
-          <step>C</step>
-          <octave>5</octave>
-          <display-step>C</display-step>
-          <display-octave>5</display-octave>
-        </unpitched>
-        <duration>4</duration>
-        <type>quarter</type>
-        <instrument id="P1-I2"/>
-        <voice>1</voice>
-        <staff>1</staff>
-      </note>
-
-    </measure>
-  </part>
-</score-partwise>
-"""
-    print(f"MusicXML: {musicxml}")
-    
+    musicxml = notes_to_musicxml(notes, songName, qpm=bpm, drums=drum_hits, grid=grid, swing=swing)
+    print(f"MusicXML: {len(musicxml)} characters, {len(drum_hits)} drum hits, {len(notes)} notes")
+    return musicxml
+
+
+def describe_outputs(songName: str, song_id: str, musicxml_size: Optional[int] = None) -> dict:
+    """Job result: descriptors of the stored artifacts, never their content.
+
+    RQ keeps results in Redis and the API returns them on every status poll,
+    so they stay small (see RQ_RESULT_TTL for how long they are kept).
+    `musicxml_size` is passed when the MusicXML may still be on its way to S3.
+    """
+    return {
+        "song_id": song_id,
+        "artifacts": {
+            "musicxml": describe_artifact(get_transcription_key(song_id, songName), "musicxml", size=musicxml_size),
+            "notes": describe_artifact(get_note_table_key(song_id), "note-table+json"),
+        },
+    }
+
+
+def update_song_transcription(song_id: str, transcription_url: str) -> None:
+    """Point the song record at its transcription.
+
+    Database errors propagate so the job is retried; a missing song is a
+    ValueError, which is not retried.
+    """
+    with get_db_session() as db:
+        # Convert song_id string to UUID if needed
+        song_uuid = UUID(song_id) if isinstance(song_id, str) else song_id
+        
+        # Find the song by ID
+        song = db.query(Song).filter(Song.id == song_uuid).first()
+        if not song:
+            raise ValueError(f"Song with ID {song_id} not found in database")
+        
+        # Update song with transcription URL
+        song.transcription_url = transcription_url
+        # get_db_session context manager will commit on successful exit
+    print(f"Transcription URL saved to database for song {song_id}: {transcription_url}")
+
+
+def save_transcription(musicxml: str, songName: str, song_id: str) -> str:
+    """Upload MusicXML to MinIO/S3 and point the song record at it.
+
+    Returns:
+        Transcription URL
+    """
     # Save transcription to MinIO/S3
     transcription_url = save_transcription_to_s3(musicxml, song_id, songName)
+    if transcription_url is None:
+        raise RuntimeError(f"Failed to save transcription for song {song_id} to S3")
     print(f"Transcription URL: {transcription_url}")
     
-    # Update song record with transcription URL
+    update_song_transcription(song_id, transcription_url)
+    return transcription_url
+
+
+@contextmanager
+def local_audio(audio_path: Optional[str], source_key: str):
+    """Yield a readable path for the job's audio.
+
+    The upload path is used when this worker can see it; otherwise (another
+    node, the spool was cleaned, or a backfill with no upload) the
+    checkpointed copy is fetched from S3.
+    """
+    spool = get_spool()
+    if audio_path and Path(audio_path).exists():
+        spool.touch(audio_path)
+        yield audio_path
+        return
+    print(f"{audio_path or 'Upload'} not available locally; fetching {source_key}")
+    spool.reserve(get_size_from_s3(source_key))
+    path = spool.temp_path(Path(source_key).suffix)
     try:
-        with get_db_session() as db:
-            # Convert song_id string to UUID if needed
-            song_uuid = UUID(song_id) if isinstance(song_id, str) else song_id
-            
-            # Find the song by ID
-            song = db.query(Song).filter(Song.id == song_uuid).first()
-            if not song:
-                raise ValueError(f"Song with ID {song_id} not found in database")
-            
-            # Update song with transcription URL
-            song.transcription_url = transcription_url
-            # get_db_session context manager will commit on successful exit
-            print(f"Transcription URL saved to database for song {song_id}: {transcription_url}")
-    except Exception as e:
-        print(f"Error saving transcription URL to database: {str(e)}")
-        # Continue even if database update fails - still return the musicxml
-        # You might want to handle this differently in production
-    
-    return musicxml
+        yield download_file_from_s3(source_key, str(path))
+    finally:
+        spool.release(path)
+
+
+def analyze_audio(audio_path: str, pitch_estimator: str) -> dict:
+    """Decode audio and run drum, pitch and beat analysis.
+
+    Returns:
+        Unquantized note table (tempo, beat map, notes, drum hits)
+    """
+    audio_samples = load_audio(audio_path)
+    features = band_features(audio_samples, SAMPLE_RATE)
+    drum_hits = transcribe_drums(audio_samples, SAMPLE_RATE, features=features)
+    print(f"Detected {len(drum_hits)} drum hits")
+    notes = detect_notes(audio_samples, SAMPLE_RATE, estimator=pitch_estimator)
+
+    # The summed band flux doubles as the onset envelope for beat tracking
+    bpm, beats = estimate_beats(features[0].sum(axis=0), SAMPLE_RATE, HOP_LENGTH)
+    print(f"Tempo: {bpm:.1f} BPM, {len(beats)} beats")
+
+    return {
+        "version": NOTE_TABLE_VERSION,
+        "duration": len(audio_samples) / SAMPLE_RATE,
+        "pitch_estimator": pitch_estimator,
+        "bpm": bpm,
+        "beats": beats.tolist(),
+        "notes": notes.to_dict(),
+        "drums": drum_hits.to_dict(),
+    }
+
+
+def run_analysis(checkpoints: dict, audio_path: Optional[str], source_key: str, song_id: str, pitch_estimator: str) -> dict:
+    """Analysis stage: build the note table, store it and checkpoint it."""
+    with local_audio(audio_path, source_key) as path:
+        note_table = analyze_audio(path, pitch_estimator)
+    if save_note_table_to_s3(note_table, song_id) is None:
+        raise RuntimeError(f"Failed to save note table for song {song_id} to S3")
+    save_checkpoint(checkpoints, song_id, "analysis", key=get_note_table_key(song_id),
+                    pitch_estimator=pitch_estimator, version=ANALYSIS_VERSION, duration=note_table["duration"])
+    return note_table
+
+
+def run_stages(
+    checkpoints: dict, audio_path: Optional[str], songName: str, song_id: str,
+    pitch_estimator: str, grid: str, swing: float, publish=None,
+) -> dict:
+    """Run or resume the source, analysis and render stages of a transcription.
+
+    Args:
+        checkpoints: Manifest from load_checkpoints (updated in place)
+        audio_path: Local upload, or None when the source is already checkpointed in S3
+        publish: fn(musicxml, render) that uploads and checkpoints the render
+            elsewhere (see worker.publisher); None = upload here
+
+    Returns:
+        The updated manifest; checkpoints["render"]["url"] is the MusicXML URL
+        unless the render was handed to `publish`
+    """
+    # Stage 1: keep a copy of the upload in S3 so a retry on any worker can read it
+    if not stage_done(checkpoints, "source"):
+        # Validate input path exists early to fail fast
+        if not audio_path or not Path(audio_path).exists():
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+        source_key = upload_file_to_s3(audio_path, get_source_audio_key(song_id, Path(audio_path).suffix))
+        save_checkpoint(checkpoints, song_id, "source", key=source_key)
+    source_key = checkpoints["source"]["key"]
+
+    # Stage 2: analysis -> note table
+    note_table = None
+    if not stage_done(checkpoints, "analysis", pitch_estimator=pitch_estimator, version=ANALYSIS_VERSION):
+        note_table = run_analysis(checkpoints, audio_path, source_key, song_id, pitch_estimator)
+    else:
+        print("Analysis checkpoint found; skipping audio analysis")
+
+    # Audio length picks the duration class for processing-time metrics. Saved
+    # before the render is handed off: the publisher owns the meta from then on
+    job = get_current_job()
+    if job is not None:
+        job.meta["audio_seconds"] = checkpoints["analysis"].get("duration")
+        job.save_meta()
+
+    # Stage 3: render and upload
+    # Tied to the analysis run, so a re-analysis always re-renders
+    analysis_run = checkpoints["analysis"]["completed_at"]
+    if not stage_done(checkpoints, "render", grid=grid, swing=swing, analysis=analysis_run):
+        if note_table is None:
+            note_table = get_note_table_from_s3(song_id)
+        if note_table is None:
+            # Checkpointed table went missing; redo the analysis
+            note_table = run_analysis(checkpoints, audio_path, source_key, song_id, pitch_estimator)
+            analysis_run = checkpoints["analysis"]["completed_at"]
+        musicxml = render_musicxml(note_table, songName, grid, swing)
+        render = {"grid": grid, "swing": swing, "analysis": analysis_run}
+        if publish is not None:
+            publish(musicxml, render)
+        else:
+            transcription_url = save_transcription_to_s3(musicxml, song_id, songName)
+            if transcription_url is None:
+                raise RuntimeError(f"Failed to save transcription for song {song_id} to S3")
+            save_checkpoint(checkpoints, song_id, "render", url=transcription_url, **render)
+    else:
+        print("Render checkpoint found; skipping render")
+    return checkpoints
+
+
+def audio_to_musicxml(
+    audio_path: str,
+    songName: str,
+    song_id: str,
+    pitch_estimator: Optional[str] = None,
+    grid: Optional[str] = None,
+    swing: Optional[float] = None,
+    profile: bool = False,
+) -> dict:
+    """Convert an audio file to MusicXML drum tabs (plus melody) and save to database.
+
+    Resumable: completed stages (source upload, analysis, render) are
+    checkpointed per song (see worker.checkpoints) and skipped on retry.
+    Under RQ the MusicXML upload and database update are handed to
+    worker.publisher, so the job ends as soon as rendering is done.
+
+    Args:
+        audio_path: Path to the audio file
+        songName: Name of the song
+        song_id: UUID of the song record in database
+        pitch_estimator: Pitch estimator backend for this job (None = PITCH_ESTIMATOR default)
+        grid: Quantization grid, "1/8", "1/16" or "1/32" (None = QUANTIZE_GRID default)
+        swing: Swing amount, 0 = straight (None = QUANTIZE_SWING default)
+        profile: Run under cProfile and store the profile with the outputs (see worker.profiling)
+
+    Returns:
+        Artifact descriptors (see describe_outputs)
+    """
+    if profile:
+        from worker.profiling import run_profiled
+        return run_profiled(audio_to_musicxml, song_id, audio_path, songName, song_id,
+                            pitch_estimator=pitch_estimator, grid=grid, swing=swing)
+
+    # Unknown backends and grids fail the job before any analysis runs
+    get_pitch_estimator(pitch_estimator)
+    pitch_estimator = pitch_estimator or get_pitch_estimator_name()
+    grid = grid or get_quantize_grid()
+    swing = get_quantize_swing() if swing is None else swing
+    get_subdivisions(grid)
+
+    print(f"Processing audio file: {audio_path}")
+    print(f"Song name: {songName}")
+    print(f"Song ID: {song_id}")
+    print(f"Pitch estimator: {pitch_estimator}")
+
+    # Expire stale spool entries, keeping this job's input
+    spool = get_spool()
+    spool.touch(audio_path)
+    spool.cleanup()
+
+    checkpoints = load_checkpoints(song_id)
+    if checkpoints:
+        print(f"Resuming; completed stages: {', '.join(checkpoints)}")
+
+    job = get_current_job()
+    published = {}
+    if job is not None:
+        def publish(musicxml, render):
+            submit_publish(job, song_id, songName, musicxml=musicxml, render=render)
+            published["size"] = len(musicxml.encode("utf-8"))
+        run_stages(checkpoints, audio_path, songName, song_id, pitch_estimator, grid, swing, publish=publish)
+        if not published:
+            # Render was checkpointed earlier; only the database update is left
+            submit_publish(job, song_id, songName, url=checkpoints["render"]["url"])
+    else:
+        # Called directly (no worker): publish inline
+        run_stages(checkpoints, audio_path, songName, song_id, pitch_estimator, grid, swing)
+        update_song_transcription(song_id, checkpoints["render"]["url"])
+
+    # Terminal state: the spooled upload is no longer needed (S3 keeps the source copy)
+    spool.release(audio_path)
+    return describe_outputs(songName, song_id, musicxml_size=published.get("size"))
+
+
+def backfill_transcription(
+    songName: str,
+    song_id: str,
+    pitch_estimator: Optional[str] = None,
+    grid: Optional[str] = None,
+    swing: Optional[float] = None,
+) -> dict:
+    """Re-transcribe a song from its source audio in S3 (see worker.backfill).
+
+    Analyses made by the current ANALYSIS_VERSION with the same estimator are
+    reused, so re-running a backfill only redoes what changed. The database is
+    not touched; the caller updates transcription_url in batches.
+
+    Returns:
+        {"song_id", "transcription_url"}
+    """
+    get_pitch_estimator(pitch_estimator)
+    pitch_estimator = pitch_estimator or get_pitch_estimator_name()
+    grid = grid or get_quantize_grid()
+    swing = get_quantize_swing() if swing is None else swing
+    get_subdivisions(grid)
+
+    checkpoints = load_checkpoints(song_id)
+    if not stage_done(checkpoints, "source"):
+        source_key = find_source_audio_key(song_id)
+        if source_key is None:
+            raise FileNotFoundError(f"No source audio stored for song {song_id}")
+        save_checkpoint(checkpoints, song_id, "source", key=source_key)
+    print(f"Backfilling song {song_id} ({songName}) from {checkpoints['source']['key']}")
+
+    run_stages(checkpoints, None, songName, song_id, pitch_estimator, grid, swing)
+    return {"song_id": song_id, "transcription_url": checkpoints["render"]["url"]}
+
+
+def rerender_musicxml(songName: str, song_id: str, grid: Optional[str] = None, swing: Optional[float] = None) -> dict:
+    """Rebuild a song's MusicXML from its stored note table, without re-analysing audio.
+
+    Args:
+        songName: Name of the song
+        song_id: UUID of the song record in database
+        grid: Quantization grid, "1/8", "1/16" or "1/32" (None = QUANTIZE_GRID default)
+        swing: Swing amount, 0 = straight (None = QUANTIZE_SWING default)
+
+    Returns:
+        Artifact descriptors (see describe_outputs)
+    """
+    grid = grid or get_quantize_grid()
+    swing = get_quantize_swing() if swing is None else swing
+    get_subdivisions(grid)
 
+    note_table = get_note_table_from_s3(song_id)
+    if note_table is None:
+        raise FileNotFoundError(f"No note table stored for song {song_id}; transcribe the audio first")
+    print(f"Re-rendering song {song_id} ({songName}): grid {grid}, swing {swing:g}")
 
+    musicxml = render_musicxml(note_table, songName, grid, swing)
+    save_transcription(musicxml, songName, song_id)
+    return describe_outputs(songName, song_id)
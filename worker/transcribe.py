@@ -1,16 +1,28 @@
 import os
 import sys
+import glob
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
 import numpy as np
 
-import magenta
-import note_seq
-import tensorflow as tf
-
 # Add parent directory to path to access audio files
 root_dir = os.path.join(os.path.dirname(__file__), '..')
 sys.path.insert(0, os.path.abspath(root_dir))
 
+from worker.config import get_pitch_estimator_name, get_quantize_grid, get_quantize_swing, get_silence_gate_db
+from worker.decode import decode_audio
+from worker.drums import HOP_LENGTH as ONSET_HOP_LENGTH, band_features
+from worker.notetable import NoteTable
+from worker.pitch import active_regions, get_pitch_estimator, run_on_regions
+from worker.quantize import estimate_beats, quantize_notes
+
+SAMPLE_RATE = 22050
+
+# Same formats the upload API accepts
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".m4a", ".ogg")
+
 
 def hz_to_midi_pitch(freq):
     """Convert frequency in Hz to MIDI pitch number."""
@@ -94,11 +106,194 @@ def detect_notes_from_pitch(pitches, times, frame_length=2048, hop_length=512, s
     return notes
 
 
-def transcribe_audio_to_midi(audio_path: str):
+def extract_pitch_track(audio_samples, sample_rate, estimator=None, hop_length=512, frame_length=2048, top_db=None):
+    """Extract one pitch per frame with the selected pitch estimator.
+    
+    Silent stretches (intros, outros, gaps between takes) are found with a
+    cheap RMS gate first and skipped, so the cost follows the amount of
+    audible audio rather than the file length; skipped frames are unvoiced.
+    
+    Falls back to the harmonic component (HPSS) with relaxed voicing when
+    fewer than 10% of the analysed frames are voiced.
+    
+    Args:
+        audio_samples: Mono audio samples
+        sample_rate: Sample rate of audio
+        estimator: Name of a registered pitch estimator (None = configured default)
+        hop_length: Hop length between frames
+        frame_length: FFT frame length
+        top_db: Silence gate threshold below the loudest frame in dB, 0 = off
+            (None = SILENCE_GATE_DB default)
+    
+    Returns:
+        (pitch_track, times) arrays; unvoiced frames have pitch 0.0
+    """
+    import librosa
+    
+    estimate = get_pitch_estimator(estimator)
+    fmin = librosa.note_to_hz('C2')  # C2 (~65 Hz)
+    fmax = librosa.note_to_hz('C7')  # C7 (~2093 Hz)
+    
+    top_db = get_silence_gate_db() if top_db is None else top_db
+    regions, n_frames = active_regions(
+        audio_samples, sample_rate, n_fft=frame_length, hop_length=hop_length, top_db=top_db
+    )
+    active_frames = sum(end - first for first, end in regions)
+    if n_frames > 0:
+        print(f"Silence gate: skipped {n_frames - active_frames} of {n_frames} frames "
+              f"({100 * (n_frames - active_frames) / n_frames:.1f}%), {len(regions)} active regions")
+    
+    def run(fn):
+        return run_on_regions(fn, audio_samples, regions, n_frames, n_fft=frame_length, hop_length=hop_length)[0]
+    
+    print(f"Detecting pitch using {estimator or get_pitch_estimator_name()} estimator...")
+    pitch_track = run(lambda segment: estimate(
+        segment,
+        sample_rate,
+        fmin,
+        fmax,
+        n_fft=frame_length,
+        hop_length=hop_length
+    ))
+    times = librosa.frames_to_time(np.arange(len(pitch_track)), sr=sample_rate, hop_length=hop_length)
+    
+    print(f"Pitch track extracted: {len(pitch_track)} frames")
+    valid_pitch_count = np.sum(pitch_track > 0)
+    
+    # Check if pitch_track is empty to avoid division by zero
+    if active_frames > 0:
+        valid_percentage = 100 * valid_pitch_count / active_frames
+        print(f"Valid pitches detected: {valid_pitch_count} frames ({valid_percentage:.1f}% of active frames)")
+    else:
+        print(f"Valid pitches detected: {valid_pitch_count} frames (N/A - no active frames)")
+    
+    # If we don't have enough valid pitches, try a simpler approach.
+    # Measured against active frames: silence the gate skipped says nothing about voicing
+    if active_frames > 0 and valid_pitch_count < active_frames * 0.1:  # Less than 10% valid
+        print("Low pitch detection rate, trying alternative method...")
+        # Use harmonic-percussive separation and re-detect
+        try:
+            # Re-run pitch tracking on harmonic component with relaxed voicing
+            pitch_track2 = run(lambda segment: estimate(
+                librosa.effects.hpss(segment)[0],
+                sample_rate,
+                fmin,
+                fmax,
+                n_fft=frame_length,
+                hop_length=hop_length,
+                relaxed=True
+            ))
+            valid_count2 = np.sum(pitch_track2 > 0)
+            if valid_count2 > valid_pitch_count:
+                pitch_track = pitch_track2
+                print(f"Using harmonic-separated results: {valid_count2} valid pitches")
+        except Exception as e:
+            print(f"Alternative method failed: {e}, using original results")
+    
+    return pitch_track, times
+
+
+def load_audio(audio_path: str, sample_rate=SAMPLE_RATE, resample=None):
+    """Decode an audio file to mono float32 samples at `sample_rate`.
+    
+    Args:
+        audio_path: Path to the audio file
+        sample_rate: Target sample rate
+        resample: Resampling mode from worker.decode.RESAMPLE_MODES (None = RESAMPLE_MODE default)
+    
+    Returns:
+        Mono float32 samples
+    """
+    print(f"Loading audio file...")
+    
+    audio_samples, sr = decode_audio(audio_path, sample_rate=sample_rate, resample=resample)
+    
+    print(f"Audio loaded: {len(audio_samples)} samples at {sr} Hz")
+    print(f"Duration: {len(audio_samples) / sr:.2f} seconds")
+    return audio_samples
+
+
+def detect_notes(audio_samples, sample_rate=SAMPLE_RATE, estimator=None):
+    """Detect pitched notes in decoded audio.
+    
+    Args:
+        audio_samples: Mono audio samples
+        sample_rate: Sample rate of audio
+        estimator: Name of a registered pitch estimator (None = configured default)
+    
+    Returns:
+        NoteTable of detected notes
+    """
+    pitch_track, times = extract_pitch_track(audio_samples, sample_rate, estimator=estimator)
+    
+    # Detect notes from pitch track
+    print("Detecting notes from pitch track...")
+    detected_notes = detect_notes_from_pitch(pitch_track, times, frame_length=2048, hop_length=512, sample_rate=sample_rate)
+    
+    print(f"Detected {len(detected_notes)} notes")
+    return NoteTable.from_tuples(detected_notes)
+
+
+def transcribe_notes(audio_path: str, estimator=None):
+    """Load an audio file and detect notes from its pitch track.
+    
+    Args:
+        audio_path: Path to the audio file
+        estimator: Name of a registered pitch estimator (None = configured default)
+    
+    Returns:
+        NoteTable of detected notes
+    """
+    # Load audio at higher sample rate for better pitch detection
+    audio_samples = load_audio(audio_path)
+    return detect_notes(audio_samples, SAMPLE_RATE, estimator=estimator)
+
+
+def transcribe_table(audio_path: str, estimator=None, grid=None, swing=None) -> dict:
+    """Detect notes in an audio file and quantize them to its estimated beat grid.
+    
+    Args:
+        audio_path: Path to the audio file
+        estimator: Name of a registered pitch estimator (None = configured default)
+        grid: Quantization grid, "1/8", "1/16" or "1/32" (None = QUANTIZE_GRID default)
+        swing: Swing amount, 0 = straight (None = QUANTIZE_SWING default)
+    
+    Returns:
+        Dict with duration, pitch_estimator, bpm, beats, grid, swing and the
+        quantized notes as a NoteTable
+    """
+    audio_samples = load_audio(audio_path)
+    table = detect_notes(audio_samples, SAMPLE_RATE, estimator=estimator)
+    
+    # Beat grid from the onset envelope, then snap notes to it
+    flux, _ = band_features(audio_samples, SAMPLE_RATE)
+    bpm, beats = estimate_beats(flux.sum(axis=0), SAMPLE_RATE, ONSET_HOP_LENGTH)
+    grid = grid or get_quantize_grid()
+    swing = get_quantize_swing() if swing is None else swing
+    print(f"Tempo: {bpm:.1f} BPM, quantizing to {grid} (swing {swing:g})")
+    return {
+        "duration": len(audio_samples) / SAMPLE_RATE,
+        "pitch_estimator": estimator or get_pitch_estimator_name(),
+        "bpm": float(bpm),
+        "beats": np.asarray(beats).tolist(),
+        "grid": grid,
+        "swing": swing,
+        "notes": quantize_notes(table, beats, bpm, grid=grid, swing=swing),
+    }
+
+
+def transcribe_audio_to_midi(audio_path: str, estimator=None, grid=None, swing=None):
     """Transcribe an audio file to MIDI using pitch detection.
     
+    Notes are quantized to a beat grid and the sequence gets the estimated
+    tempo and a 4/4 time signature. The pipeline works on a NoteTable; the
+    NoteSequence is only built once, at the end.
+    
     Args:
         audio_path: Path to the audio file (mp3, wav, mid, etc.)
+        estimator: Name of a registered pitch estimator (None = configured default)
+        grid: Quantization grid, "1/8", "1/16" or "1/32" (None = QUANTIZE_GRID default)
+        swing: Swing amount, 0 = straight (None = QUANTIZE_SWING default)
     
     Returns:
         NoteSequence object representing the MIDI transcription
@@ -111,147 +306,33 @@ def transcribe_audio_to_midi(audio_path: str):
     print(f"Loading file: {audio_path}")
     
     # Check if it's already a MIDI file
+    ns = None
     if audio_path.lower().endswith(('.mid', '.midi')):
         print("File is MIDI, loading directly...")
+        import note_seq
+
         ns = note_seq.midi_file_to_note_sequence(audio_path)
+        table = NoteTable.from_note_sequence(ns)
     else:
         # For audio files, we need to use transcription
+        bpm = 120.0
         try:
-            import librosa
-            
-            print(f"Loading audio file with librosa...")
-            print(f"librosa imported from: {librosa.__file__}")
-            
-            # Load audio at higher sample rate for better pitch detection
-            sample_rate = 22050
-            audio_samples, sr = librosa.load(audio_path, sr=sample_rate)
-            
-            print(f"Audio loaded: {len(audio_samples)} samples at {sr} Hz")
-            print(f"Duration: {len(audio_samples) / sr:.2f} seconds")
-            
-            # Detect pitch using librosa's piptrack algorithm
-            print("Detecting pitch using piptrack...")
-            
-            hop_length = 512
-            frame_length = 2048
-            
-            # Use piptrack for pitch detection
-            pitches, magnitudes = librosa.piptrack(
-                y=audio_samples,
-                sr=sample_rate,
-                threshold=0.1,
-                fmin=librosa.note_to_hz('C2'),  # C2 (~65 Hz)
-                fmax=librosa.note_to_hz('C7'),  # C7 (~2093 Hz)
-                hop_length=hop_length,
-                n_fft=frame_length
-            )
-            
-            # Extract the most prominent pitch at each time frame
-            pitch_track = []
-            times = librosa.frames_to_time(np.arange(pitches.shape[1]), sr=sample_rate, hop_length=hop_length)
-            
-            for t in range(pitches.shape[1]):
-                # Find the pitch with the highest magnitude in this frame
-                pitch_values = pitches[:, t]
-                magnitude_values = magnitudes[:, t]
-                
-                # Filter out zero pitches
-                valid_indices = pitch_values > 0
-                if np.any(valid_indices):
-                    # Get the pitch with maximum magnitude
-                    valid_magnitudes = magnitude_values[valid_indices]
-                    valid_pitches = pitch_values[valid_indices]
-                    max_idx = np.argmax(valid_magnitudes)
-                    pitch = valid_pitches[max_idx]
-                    pitch_track.append(float(pitch))
-                else:
-                    pitch_track.append(0.0)
-            
-            # Convert to numpy array
-            pitch_track = np.array(pitch_track)
-            
-            print(f"Pitch track extracted: {len(pitch_track)} frames")
-            valid_pitch_count = np.sum(pitch_track > 0)
-            
-            # Check if pitch_track is empty to avoid division by zero
-            if len(pitch_track) > 0:
-                valid_percentage = 100 * valid_pitch_count / len(pitch_track)
-                print(f"Valid pitches detected: {valid_pitch_count} frames ({valid_percentage:.1f}%)")
-            else:
-                print(f"Valid pitches detected: {valid_pitch_count} frames (N/A - empty pitch track)")
-            
-            # If we don't have enough valid pitches, try a simpler approach
-            if len(pitch_track) > 0 and valid_pitch_count < len(pitch_track) * 0.1:  # Less than 10% valid
-                print("Low pitch detection rate, trying alternative method...")
-                # Use harmonic-percussive separation and re-detect
-                try:
-                    y_harmonic, y_percussive = librosa.effects.hpss(audio_samples)
-                    # Re-run piptrack on harmonic component
-                    pitches2, magnitudes2 = librosa.piptrack(
-                        y=y_harmonic,
-                        sr=sample_rate,
-                        threshold=0.05,  # Lower threshold
-                        fmin=librosa.note_to_hz('C2'),
-                        fmax=librosa.note_to_hz('C7'),
-                        hop_length=hop_length,
-                        n_fft=frame_length
-                    )
-                    
-                    # Extract pitches again
-                    pitch_track2 = []
-                    for t in range(pitches2.shape[1]):
-                        pitch_values = pitches2[:, t]
-                        magnitude_values = magnitudes2[:, t]
-                        valid_indices = pitch_values > 0
-                        if np.any(valid_indices):
-                            valid_magnitudes = magnitude_values[valid_indices]
-                            valid_pitches = pitch_values[valid_indices]
-                            max_idx = np.argmax(valid_magnitudes)
-                            pitch_track2.append(float(valid_pitches[max_idx]))
-                        else:
-                            pitch_track2.append(0.0)
-                    
-                    pitch_track2 = np.array(pitch_track2)
-                    valid_count2 = np.sum(pitch_track2 > 0)
-                    if valid_count2 > valid_pitch_count:
-                        pitch_track = pitch_track2
-                        print(f"Using harmonic-separated results: {valid_count2} valid pitches")
-                except Exception as e:
-                    print(f"Alternative method failed: {e}, using original results")
-            
-            # Detect notes from pitch track
-            print("Detecting notes from pitch track...")
-            detected_notes = detect_notes_from_pitch(pitch_track, times, frame_length=2048, hop_length=512, sample_rate=sample_rate)
-            
-            print(f"Detected {len(detected_notes)} notes")
-            
-            # Create NoteSequence
-            ns = note_seq.NoteSequence()
-            ns.tempos.add(time=0, qpm=120.0)
-            
-            # Add detected notes to NoteSequence
-            for start_time, end_time, pitch, velocity in detected_notes:
-                note = ns.notes.add()
-                note.pitch = int(pitch)
-                note.start_time = start_time
-                note.end_time = end_time
-                note.velocity = velocity
-                note.instrument = 0
-            
-            print(f"Created NoteSequence with {len(ns.notes)} notes")
-            
+            result = transcribe_table(audio_path, estimator=estimator, grid=grid, swing=swing)
+            table, bpm = result["notes"], result["bpm"]
         except ImportError as e:
             print(f"Error importing librosa: {e}")
             print("Creating empty NoteSequence structure...")
-            ns = note_seq.NoteSequence()
-            ns.tempos.add(time=0, qpm=120.0)
+            table = NoteTable()
         except Exception as e:
             print(f"Error during transcription: {e}")
             import traceback
             traceback.print_exc()
             print("Creating empty NoteSequence structure...")
-            ns = note_seq.NoteSequence()
-            ns.tempos.add(time=0, qpm=120.0)
+            table = NoteTable()
+        
+        # Bulk conversion at the MIDI edge
+        ns = table.to_note_sequence(qpm=bpm, time_signature=(4, 4) if len(table) else None)
+        print(f"Created NoteSequence with {len(ns.notes)} notes")
     
     # Print the MIDI transcription
     print("\n" + "="*60)
@@ -264,12 +345,13 @@ def transcribe_audio_to_midi(audio_path: str):
     for tempo in ns.tempos:
         print(f"  - Time: {tempo.time:.2f}s, QPM: {tempo.qpm}")
     
-    print(f"\nNotes: {len(ns.notes)}")
-    for i, note in enumerate(ns.notes[:10]):  # Show first 10 notes
-        print(f"  Note {i+1}: pitch={note.pitch}, start={note.start_time:.2f}s, "
-              f"end={note.end_time:.2f}s, velocity={note.velocity}")
-    if len(ns.notes) > 10:
-        print(f"  ... and {len(ns.notes) - 10} more notes")
+    # Note listings come from the table columns rather than the protobuf
+    print(f"\nNotes: {len(table)}")
+    for i, (start_time, end_time, pitch, velocity) in enumerate(table.select(slice(0, 10)).to_tuples()):  # Show first 10 notes
+        print(f"  Note {i+1}: pitch={pitch}, start={start_time:.2f}s, "
+              f"end={end_time:.2f}s, velocity={velocity}")
+    if len(table) > 10:
+        print(f"  ... and {len(table) - 10} more notes")
     
     print(f"\nTime signatures: {len(ns.time_signatures)}")
     for ts in ns.time_signatures:
@@ -279,19 +361,22 @@ def transcribe_audio_to_midi(audio_path: str):
     print("\n" + "="*60)
     print("MIDI TRANSCRIPTION (JSON)")
     print("="*60)
+    columns = table.to_dict()
     print(json.dumps({
         'total_time': ns.total_time,
         'tempos': [{'time': t.time, 'qpm': t.qpm} for t in ns.tempos],
         'time_signatures': [{'time': ts.time, 'numerator': ts.numerator, 'denominator': ts.denominator} 
                            for ts in ns.time_signatures],
         'notes': [{
-            'pitch': n.pitch,
-            'start_time': n.start_time,
-            'end_time': n.end_time,
-            'velocity': n.velocity,
-            'instrument': n.instrument
-        } for n in ns.notes],
-        'total_notes': len(ns.notes)
+            'pitch': pitch,
+            'start_time': start_time,
+            'end_time': end_time,
+            'velocity': velocity,
+            'instrument': instrument
+        } for start_time, end_time, pitch, velocity, instrument in zip(
+            columns['start'], columns['end'], columns['pitch'], columns['velocity'], columns['instrument']
+        )],
+        'total_notes': len(table)
     }, indent=2))
     
     # Also print the NoteSequence string representation
@@ -303,22 +388,235 @@ def transcribe_audio_to_midi(audio_path: str):
     return ns
 
 
+def find_audio_files(inputs):
+    """Expand files, directories (recursively) and glob patterns to audio files.
+    
+    Args:
+        inputs: Paths, directories or glob patterns
+    
+    Returns:
+        (files, missing): absolute paths of audio files in input order without
+        duplicates, and the inputs that matched nothing
+    """
+    files, missing, seen = [], [], set()
+    
+    def add(path):
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            files.append(path)
+    
+    for pattern in inputs:
+        found = len(files)
+        if os.path.isdir(pattern):
+            for dirpath, dirnames, filenames in os.walk(pattern):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        add(os.path.join(dirpath, name))
+        elif os.path.isfile(pattern):
+            add(pattern)
+        else:
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS):
+                    add(path)
+        if len(files) == found:
+            missing.append(pattern)
+    return files, missing
+
+
+def output_paths(audio_path: str) -> dict:
+    """MIDI and note-table paths written next to an input file."""
+    stem = os.path.splitext(audio_path)[0]
+    return {"midi": f"{stem}.mid", "notes": f"{stem}.notes.json"}
+
+
+def is_up_to_date(audio_path: str, options=None) -> bool:
+    """Whether every output of `audio_path` exists, is newer than it and was made with `options`.
+
+    Args:
+        audio_path: Input file
+        options: Dict of pitch_estimator, grid and swing the outputs must have
+            been written with (as recorded in the note-table JSON); None = any
+    """
+    outputs = output_paths(audio_path)
+    try:
+        source_mtime = os.path.getmtime(audio_path)
+        if not all(os.path.getmtime(path) >= source_mtime for path in outputs.values()):
+            return False
+        if options is None:
+            return True
+        with open(outputs["notes"]) as f:
+            written = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return all(written.get(name) == value for name, value in options.items())
+
+
+def write_outputs(audio_path: str, result: dict) -> dict:
+    """Write a transcribe_table() result as MIDI and note-table JSON next to the input."""
+    # MIDI edge only: the up-to-date checks and analysis work without note_seq
+    import note_seq
+
+    outputs = output_paths(audio_path)
+    table = result["notes"]
+    ns = table.to_note_sequence(qpm=result["bpm"], time_signature=(4, 4) if len(table) else None)
+    # Written atomically so an interrupted batch never leaves an output that looks up to date
+    partial = outputs["midi"] + ".partial"
+    note_seq.sequence_proto_to_midi_file(ns, partial)
+    os.replace(partial, outputs["midi"])
+    partial = outputs["notes"] + ".partial"
+    with open(partial, "w") as f:
+        json.dump({**result, "notes": table.to_dict()}, f)
+    os.replace(partial, outputs["notes"])
+    return outputs
+
+
+def transcribe_file(audio_path: str, estimator=None, grid=None, swing=None, verbose=False) -> dict:
+    """Transcribe one file of a batch and write its outputs (runs in a pool process).
+    
+    Returns:
+        Summary entry with path, status ("ok" or "failed"), seconds and either
+        audio_seconds, notes and outputs or the error
+    """
+    started = time.perf_counter()
+    try:
+        # The per-stage progress output is noise when thousands of files run in parallel
+        with open(os.devnull, "w") as devnull, redirect_stdout(sys.stdout if verbose else devnull):
+            result = transcribe_table(audio_path, estimator=estimator, grid=grid, swing=swing)
+            outputs = write_outputs(audio_path, result)
+    except Exception as e:
+        return {"path": audio_path, "status": "failed", "seconds": time.perf_counter() - started,
+                "error": f"{type(e).__name__}: {e}"}
+    return {
+        "path": audio_path,
+        "status": "ok",
+        "seconds": time.perf_counter() - started,
+        "audio_seconds": result["duration"],
+        "notes": len(result["notes"]),
+        "outputs": outputs,
+    }
+
+
+def default_jobs() -> int:
+    """CPUs available to this process (respects container CPU sets where supported)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def transcribe_batch(files, jobs=None, estimator=None, grid=None, swing=None, force=False, verbose=False) -> dict:
+    """Transcribe many files on a process pool, skipping files whose outputs are up to date.
+
+    Outputs count as up to date when they are newer than the input and were
+    written with the same estimator, grid and swing.
+    
+    Args:
+        files: Audio file paths
+        jobs: Pool size (None = CPUs available)
+        estimator: Name of a registered pitch estimator (None = configured default)
+        grid: Quantization grid (None = QUANTIZE_GRID default)
+        swing: Swing amount (None = QUANTIZE_SWING default)
+        force: Re-transcribe files even if their outputs are up to date
+        verbose: Keep each file's progress output
+    
+    Returns:
+        Summary dict with counts, options, wall time and one entry per file
+    """
+    jobs = jobs or default_jobs()
+    # Resolved up front: outputs written with other options are stale
+    estimator = estimator or get_pitch_estimator_name()
+    grid = grid or get_quantize_grid()
+    swing = get_quantize_swing() if swing is None else swing
+    options = {"pitch_estimator": estimator, "grid": grid, "swing": swing}
+    started = time.perf_counter()
+    entries = {}
+    pending = []
+    for path in files:
+        if not force and is_up_to_date(path, options):
+            entries[path] = {"path": path, "status": "skipped", "outputs": output_paths(path)}
+        else:
+            pending.append(path)
+    print(f"{len(files)} files: {len(pending)} to transcribe, {len(entries)} up to date ({jobs} processes)")
+    
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as executor:
+            futures = {
+                executor.submit(transcribe_file, path, estimator, grid, swing, verbose): path
+                for path in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    # The pool process itself died (e.g. killed for using too much memory)
+                    entry = {"path": path, "status": "failed", "seconds": None, "error": f"{type(e).__name__}: {e}"}
+                entries[path] = entry
+                detail = f"{entry['seconds']:.1f}s" if entry["seconds"] is not None else "-"
+                if entry["status"] == "failed":
+                    detail += f", {entry['error']}"
+                print(f"[{done}/{len(pending)}] {entry['status']} {path} ({detail})")
+    
+    results = [entries[path] for path in files]
+    counts = {status: sum(entry["status"] == status for entry in results) for status in ("ok", "skipped", "failed")}
+    return {
+        "files": len(files),
+        "transcribed": counts["ok"],
+        "skipped": counts["skipped"],
+        "failed": counts["failed"],
+        "seconds": time.perf_counter() - started,
+        "jobs": jobs,
+        "options": {"estimator": estimator, "grid": grid, "swing": swing, "force": force},
+        "results": results,
+    }
+
+
 if __name__ == "__main__":
-    # Default to audio.mp3 in the root directory
-    audio_file = os.path.join(root_dir, "sample.mp3")
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Transcribe an audio file to MIDI")
+    # Default to sample.mp3 in the root directory
+    parser.add_argument("audio_file", nargs="*", default=[os.path.join(root_dir, "sample.mp3")],
+                        help="Audio file; with --batch, any number of files, directories and glob patterns")
+    parser.add_argument("--estimator", help="Pitch estimator backend (default: $PITCH_ESTIMATOR or piptrack)")
+    parser.add_argument("--grid", help="Quantization grid: 1/8, 1/16 or 1/32 (default: $QUANTIZE_GRID or 1/16)")
+    parser.add_argument("--swing", type=float, help="Swing amount, 0 = straight (default: $QUANTIZE_SWING or 0)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Transcribe every input in parallel, writing <name>.mid and <name>.notes.json next to it")
+    parser.add_argument("--jobs", type=int, help="Batch processes (default: CPUs available)")
+    parser.add_argument("--force", action="store_true", help="Batch: re-transcribe files whose outputs are up to date")
+    parser.add_argument("--summary", default="transcribe_summary.json", help="Batch: JSON summary path")
+    parser.add_argument("--verbose", action="store_true", help="Batch: keep per-file progress output")
+    args = parser.parse_args()
+    
+    if args.batch:
+        files, missing = find_audio_files(args.audio_file)
+        for pattern in missing:
+            print(f"No audio files match {pattern}")
+        summary = transcribe_batch(files, jobs=args.jobs, estimator=args.estimator, grid=args.grid,
+                                   swing=args.swing, force=args.force, verbose=args.verbose)
+        summary["missing"] = missing
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Transcribed {summary['transcribed']}, skipped {summary['skipped']}, failed {summary['failed']} "
+              f"in {summary['seconds']:.1f}s; summary written to {args.summary}")
+        sys.exit(1 if summary["failed"] or missing else 0)
+    
+    if len(args.audio_file) > 1:
+        parser.error("more than one input needs --batch")
     
-    # Allow command line argument for audio file path
-    if len(sys.argv) > 1:
-        audio_file = sys.argv[1]
+    import magenta
+    import tensorflow as tf
     
     print(f"Magenta version: {magenta.__version__}")
     print(f"TensorFlow version: {tf.__version__}")
     print()
     
     try:
-        ns = transcribe_audio_to_midi(audio_file)
+        ns = transcribe_audio_to_midi(args.audio_file[0], estimator=args.estimator, grid=args.grid, swing=args.swing)
         print("\n✅ Transcription complete!")
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
@@ -3,7 +3,38 @@ import os
 from redis import Redis
 from rq import Worker
 
+from worker.admission import untrack
+from worker.metrics import record_event, record_processing_time
 from worker.queues import get_queues
+from worker.retry import dead_letter
+
+
+class MetricsWorker(Worker):
+    """RQ worker that records job metrics (worker.metrics) and admission releases (worker.admission)."""
+
+    def _record(self, fn, *args):
+        # Metrics must never fail a job
+        try:
+            fn(self.connection, *args)
+        except Exception as e:
+            print(f"Failed to record metrics: {e}")
+
+    def prepare_job_execution(self, job, remove_from_intermediate_queue=False):
+        super().prepare_job_execution(job, remove_from_intermediate_queue)
+        self._record(record_event, job.origin, "started")
+        # No longer waiting, so no longer counted against admission limits
+        self._record(untrack, job.meta)
+
+    def handle_job_success(self, job, queue, started_job_registry):
+        super().handle_job_success(job, queue, started_job_registry)
+        self._record(record_event, job.origin, "finished")
+        self._record(record_processing_time, job)
+
+    def handle_job_failure(self, job, queue, started_job_registry=None, exc_string=""):
+        super().handle_job_failure(job, queue, started_job_registry=started_job_registry, exc_string=exc_string)
+        self._record(record_event, job.origin, "failed")
+        # Covers killed work-horses too, which never reach exception handlers
+        self._record(dead_letter, job, exc_string)
 
 
 def main() -> None:
@@ -13,7 +44,8 @@ def main() -> None:
     redis_conn = Redis.from_url(redis_url)
     # Ensure a connection is established for Worker via the first queue
     queues = get_queues(redis_conn)
-    Worker(queues, connection=redis_conn).work(with_scheduler=True)
+    # The scheduler also re-enqueues jobs waiting out a retry interval
+    MetricsWorker(queues, connection=redis_conn).work(with_scheduler=True)
 
 
 if __name__ == "__main__":